@@ -1,4 +1,5 @@
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -54,17 +55,48 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'RecruitingProject.wsgi.application'
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": "postgres",
-        "USER": os.environ.get("DATABASE_USER"),
-        "PASSWORD": os.environ.get("DATABASE_PASSWORD"),
-        "HOST": os.environ.get("DATABASE_HOST"),
-        "PORT": os.environ.get("DATABASE_PORT", "5432"),
-        "OPTIONS": {"sslmode": "require"},
+# DATABASE_BACKEND=sqlite: sviluppo locale / CI senza Supabase, vettori cercati in NumPy
+# (candidates.sqlite_vector); schema creato da "manage.py migrate"
+if os.environ.get("DATABASE_BACKEND", "postgres") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "candidates.sqlite_vector",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": "postgres",
+            "USER": os.environ.get("DATABASE_USER"),
+            "PASSWORD": os.environ.get("DATABASE_PASSWORD"),
+            "HOST": os.environ.get("DATABASE_HOST"),
+            "PORT": os.environ.get("DATABASE_PORT", "5432"),
+            "OPTIONS": {"sslmode": "require"},
+            # connessioni persistenti: niente handshake TLS verso Supabase a ogni richiesta;
+            # l'health check scarta quelle cadute prima di riusarle
+            "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", "600")),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+    # DATABASE_POOL=True: pool di psycopg 3 (psycopg[pool] in requirements) condiviso dai thread
+    # del worker; Django richiede CONN_MAX_AGE=0 con il pool
+    if os.environ.get("DATABASE_POOL") == "True":
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                'DATABASE_POOL=True richiede psycopg 3 con il pool: pip install "psycopg[binary,pool]"'
+            ) from exc
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10")),
+            "timeout": int(os.environ.get("DATABASE_POOL_TIMEOUT", "10")),
+        }
+
+DATABASE_ROUTERS = ["candidates.routers.VendorRouter"]
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
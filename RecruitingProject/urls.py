@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from candidates.views import ReadinessView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('candidates.urls')),
+    path('healthz/ready', ReadinessView.as_view(), name='healthz-ready'),
 ]
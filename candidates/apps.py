@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CandidatesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'candidates'
+
+    def ready(self):
+        # pgvector registrato una volta per connessione fisica, non a ogni richiesta
+        from django.db.backends.signals import connection_created
+
+        from .services.vector_index import register_vector_types
+
+        connection_created.connect(register_vector_types, dispatch_uid="candidates.register_vector_types")
+
+        from .services.warmup import defer_startup, start_background_services
+
+        # con gunicorn.conf.py i thread partono in ogni worker (post_worker_init), non nel master
+        if not defer_startup():
+            start_background_services()
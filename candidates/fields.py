@@ -0,0 +1,30 @@
+import json
+
+import numpy as np
+from django.db import models
+
+
+class VectorField(models.JSONField):
+    """
+    Colonna vector (pgvector su Postgres, blob float32 sul backend sqlite_vector).
+    Letta come lista di float, così i serializer la espongono come JSON.
+    """
+
+    def db_type(self, connection):
+        return "vector"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        if isinstance(value, np.ndarray):  # register_vector / converter "vector"
+            return value.tolist()
+        if isinstance(value, (bytes, memoryview)):
+            return np.frombuffer(value, dtype=np.float32).tolist()
+        return json.loads(value)  # formato testuale di pgvector: "[0.1,0.2,...]"
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is None:
+            return None
+        if connection.vendor == "postgresql":
+            return json.dumps([float(x) for x in value])  # '[...]' viene castato a vector
+        return np.asarray(value, dtype=np.float32)
@@ -0,0 +1,157 @@
+import multiprocessing
+import queue as queue_module
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from candidates.services.embedding_service import BACKENDS, get_embedding_model, get_model_name
+
+SAMPLE_TEXTS = [
+    "Hai esperienza con Docker e Kubernetes in produzione?",
+    "Ho guidato la migrazione di un monolite Django verso microservizi su AWS.",
+    "Il candidato ha esitato sulle domande relative al testing automatico.",
+    "Senior Python developer con 6 anni di esperienza su API REST e PostgreSQL.",
+    "Come gestisci il deploy e il monitoring di un servizio critico?",
+    "Conoscenza di CI/CD con GitHub Actions, code review e pair programming.",
+    "Ha lavorato su pipeline di machine learning con PyTorch e scikit-learn.",
+    "Esperienza in team distribuiti, metodologia Scrum, ruolo di tech lead.",
+    "Non ha mai usato sistemi di code come Kafka o RabbitMQ.",
+    "Laurea magistrale in Ingegneria Informatica, inglese fluente.",
+]
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return pages * resource.getpagesize() / 1024 / 1024
+    except (OSError, ImportError):
+        return None
+
+
+def _bench_backend(backend, texts, runs, queue):
+    """Eseguito in un processo separato: RSS e tempi di ogni backend non si sommano."""
+    try:
+        queue.put(_measure(backend, texts, runs))
+    except Exception as exc:
+        # es. sentence-transformers[onnx] non installato: il padre lo riporta come backend fallito
+        queue.put({"backend": backend, "error": f"{type(exc).__name__}: {exc}"})
+
+
+def _run_isolated(ctx, backend, texts, runs, timeout):
+    """Lancia il benchmark di un backend in un processo figlio; se muore o sfora timeout ritorna un errore."""
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_bench_backend, args=(backend, texts, runs, queue))
+    proc.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                # a piccoli passi: un figlio morto (OOM, segfault di onnxruntime) non scrive mai in coda
+                return queue.get(timeout=min(1.0, max(0.0, deadline - time.monotonic())))
+            except queue_module.Empty:
+                if not proc.is_alive():
+                    try:
+                        return queue.get(timeout=1.0)  # risultato scritto subito prima di uscire
+                    except queue_module.Empty:
+                        return {"backend": backend, "error": f"processo terminato (exitcode {proc.exitcode})"}
+                if time.monotonic() >= deadline:
+                    return {"backend": backend, "error": f"timeout dopo {timeout:.0f}s"}
+    finally:
+        if proc.is_alive():
+            proc.terminate()
+        proc.join()
+
+
+def _measure(backend, texts, runs):
+    rss_start = _rss_mb()
+    started = time.perf_counter()
+    model = get_embedding_model(get_model_name(), backend)
+    load_seconds = time.perf_counter() - started
+    model.encode(texts[:1], normalize_embeddings=True)  # warm-up
+
+    latencies = []
+    for _ in range(runs):
+        for text in texts[:20]:
+            t0 = time.perf_counter()
+            model.encode(text, normalize_embeddings=True)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    vectors = model.encode(texts, batch_size=32, normalize_embeddings=True)
+    batch_seconds = time.perf_counter() - t0
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "batch_texts_per_second": len(texts) / batch_seconds,
+        "rss_mb": _rss_mb(),
+        "rss_delta_mb": (_rss_mb() - rss_start) if rss_start is not None else None,
+        "vectors": np.asarray(vectors, dtype=np.float32),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Parity check e benchmark tra backend di embedding (default torch vs onnx-int8): "
+        "concordanza coseno dei vettori, latenza e RSS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--baseline", default="torch", choices=BACKENDS)
+        parser.add_argument("--candidate", default="onnx-int8", choices=BACKENDS)
+        parser.add_argument("--threshold", type=float, default=0.99,
+                            help="Coseno minimo richiesto tra i vettori dei due backend")
+        parser.add_argument("--from-db", type=int, default=0, metavar="N",
+                            help="Usa N chunk reali da CV_CHUNKS invece dei testi di esempio")
+        parser.add_argument("--runs", type=int, default=5, help="Ripetizioni per le misure di latenza")
+        parser.add_argument("--timeout", type=float, default=600,
+                            help="Secondi massimi per backend (caricamento + misure)")
+
+    def handle(self, *args, **options):
+        texts = SAMPLE_TEXTS
+        if options["from_db"]:
+            with connection.cursor() as cur:
+                cur.execute('SELECT content FROM "CV_CHUNKS" ORDER BY random() LIMIT %s', [options["from_db"]])
+                texts = [r[0] for r in cur.fetchall()] or SAMPLE_TEXTS
+            connection.close()  # non condividere la connessione con i processi figli
+
+        # fork: il figlio eredita Django già configurato
+        ctx = multiprocessing.get_context("fork")
+        results = {}
+        for backend in (options["baseline"], options["candidate"]):
+            results[backend] = _run_isolated(ctx, backend, texts, options["runs"], options["timeout"])
+
+        base, cand = results[options["baseline"]], results[options["candidate"]]
+
+        self.stdout.write(f"Modello {get_model_name()}, {len(texts)} testi\n")
+        self.stdout.write(f"{'backend':<10} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'batch/s':>9} {'RSS MB':>8} {'ΔRSS MB':>8}")
+        for r in (base, cand):
+            if "error" in r:
+                self.stdout.write(f"{r['backend']:<10} FALLITO: {r['error']}")
+                continue
+            self.stdout.write(
+                f"{r['backend']:<10} {r['load_seconds']:>7.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                f"{r['batch_texts_per_second']:>9.1f} {r['rss_mb'] or 0:>8.0f} {r['rss_delta_mb'] or 0:>8.0f}"
+            )
+
+        failed = [r["backend"] for r in (base, cand) if "error" in r]
+        if failed:
+            raise CommandError(f"Benchmark non completato per: {', '.join(failed)}")
+
+        cosines = np.sum(base["vectors"] * cand["vectors"], axis=1)
+        self.stdout.write(
+            f"\nCoseno {options['candidate']} vs {options['baseline']}: "
+            f"min {cosines.min():.4f}, media {cosines.mean():.4f} (soglia {options['threshold']})"
+        )
+
+        if cosines.min() < options["threshold"]:
+            raise CommandError("Parity check fallito: i vettori non sono intercambiabili con quelli esistenti")
+        self.stdout.write(self.style.SUCCESS("Parity check superato"))
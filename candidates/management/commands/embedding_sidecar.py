@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from candidates.services.embedding_service import get_backend, get_embedding_model, get_model_id
+from candidates.services.embedding_sidecar import serve
+from candidates.services.micro_batching import MicroBatchEncoder
+
+
+class Command(BaseCommand):
+    help = (
+        "Avvia il worker di embedding fuori processo: un solo modello in memoria condiviso da tutti "
+        "i worker dell'app (client: EMBEDDING_SIDECAR con lo stesso indirizzo)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--address", default=os.environ.get("EMBEDDING_SIDECAR") or "unix:/tmp/embedding.sock",
+                            help="unix:/percorso/socket oppure tcp:127.0.0.1:porta")
+        parser.add_argument("--max-batch-size", type=int,
+                            default=int(os.environ.get("EMBEDDING_MICROBATCH_MAX_SIZE", "64")),
+                            help="Testi massimi per forward pass")
+        parser.add_argument("--max-wait-ms", type=float,
+                            default=float(os.environ.get("EMBEDDING_MICROBATCH_WAIT_MS", "5")),
+                            help="Attesa massima per accorpare richieste concorrenti")
+
+    def handle(self, *args, **options):
+        # sempre il modello locale: qui get_encoder() rimanderebbe al sidecar stesso
+        t0 = time.perf_counter()
+        model = get_embedding_model()
+        model.encode(["warm-up"], normalize_embeddings=True)
+        self.stdout.write(f"Modello {get_model_id()} ({get_backend()}) pronto in {time.perf_counter() - t0:.2f}s")
+
+        # le richieste dei vari worker arrivano su thread diversi: un unico forward pass per batch
+        batcher = MicroBatchEncoder(
+            lambda texts, batch_size: model.encode(
+                texts, batch_size=batch_size or options["max_batch_size"], normalize_embeddings=True,
+            ),
+            max_batch_size=options["max_batch_size"],
+            max_wait_ms=options["max_wait_ms"],
+        )
+        serve(options["address"], batcher.encode, get_model_id(), log=self.stdout.write)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from candidates.services.embedding_service import get_model_name
+
+
+class Command(BaseCommand):
+    help = "Esporta il modello di embedding in ONNX e ne crea la versione quantizzata int8 (backend onnx-int8)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Cartella di destinazione (da usare come EMBEDDING_ONNX_PATH)")
+        parser.add_argument("--config", default="avx2", choices=["arm64", "avx2", "avx512", "avx512_vnni"],
+                            help="Profilo di quantizzazione per la CPU dei nodi API")
+
+    def handle(self, *args, **options):
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        model_name = get_model_name()
+        output = options["output"]
+
+        # backend="onnx" esporta il grafo fp32 se il modello non lo fornisce già
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save(output)
+        export_dynamic_quantized_onnx_model(model, options["config"], output)
+
+        kind = "quint8" if options["config"] == "avx2" else "qint8"
+        self.stdout.write(self.style.SUCCESS(f"Modello {model_name} esportato in {output}"))
+        self.stdout.write("Per usarlo:")
+        self.stdout.write("  EMBEDDING_BACKEND=onnx-int8")
+        self.stdout.write(f"  EMBEDDING_ONNX_PATH={output}")
+        self.stdout.write(f"  EMBEDDING_ONNX_INT8_FILE=onnx/model_{kind}_{options['config']}.onnx")
+        self.stdout.write("e verificare la parità con: manage.py embedding_benchmark")
@@ -0,0 +1,243 @@
+import os
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from candidates.services.cv_pipeline import (
+    _get_supabase,
+    chunk_text,
+    content_fingerprint,
+    cv_embedding_pooling,
+    embedding_batch_size,
+    encode_in_batches,
+    extract_pages_with_limits,
+    pool_chunk_embeddings,
+    sanitize_text,
+)
+from candidates.services.coverage import in_clause, refresh_coverage
+from candidates.services.embedding_service import get_cv_model_id, get_encoder, get_model_id
+
+# Namespace fisso: stesso file sorgente -> stesso storage path (serve per il resume)
+IMPORT_NAMESPACE = uuid.UUID("6f1c2d1e-4b7a-4f3e-9a51-3c8e0b7d2a90")
+
+
+def _parse_source(args):
+    """Eseguito nei processi del pool: apre il PDF (file o membro dello zip) e ne estrae le pagine."""
+    key, source, member = args
+    if member is None:
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        with zipfile.ZipFile(source) as zf:
+            data = zf.read(member)
+    try:
+        # già dentro un processo del pool: parsing nello stesso processo, senza figli per pagina
+        # (PDF_DOCUMENT_TIMEOUT controllato tra una pagina e l'altra)
+        pages, _ = extract_pages_with_limits(data, in_process=True)
+    except Exception as exc:
+        return key, data, None, f"{type(exc).__name__}: {exc}"
+    return key, data, pages, None
+
+
+def _upload(storage, item, data):
+    """Upload su Supabase Storage; ritorna l'errore invece di sollevarlo."""
+    try:
+        storage.upload(
+            path=item["storage_path"],
+            file=data,
+            file_options={"content-type": "application/pdf", "upsert": "true"},
+        )
+    except Exception as exc:
+        return f"upload: {type(exc).__name__}: {exc}"
+    return None
+
+
+class Command(BaseCommand):
+    help = "Importa in blocco i CV PDF da una cartella o da un archivio .zip (un candidato per file)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Cartella o file .zip contenente i PDF")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2,
+                            help="Processi per il parsing PDF")
+        parser.add_argument("--upload-workers", type=int, default=8,
+                            help="Thread per l'upload su Supabase Storage")
+        parser.add_argument("--batch-files", type=int, default=50,
+                            help="File per blocco di embedding + insert")
+
+    def handle(self, *args, **options):
+        source = Path(options["source"])
+        if not source.exists():
+            raise CommandError(f"{source} non esiste")
+
+        sources = self._discover(source)
+        bucket = os.environ.get("SUPABASE_BUCKET", "cvs")
+        supabase = _get_supabase()
+        storage = supabase.storage.from_(bucket)
+
+        for item in sources:
+            item["storage_path"] = f"imports/{uuid.uuid5(IMPORT_NAMESPACE, item['key'])}.pdf"
+            item["file_url"] = storage.get_public_url(item["storage_path"])
+
+        # ---- Resume: salta i file già presenti in CVS ----
+        already = self._already_ingested([s["file_url"] for s in sources])
+        todo = [s for s in sources if s["file_url"] not in already]
+        self.stdout.write(f"{len(sources)} PDF trovati, {len(sources) - len(todo)} già importati, {len(todo)} da importare")
+        if not todo:
+            return
+
+        model = get_encoder()
+        stats = {stage: {"seconds": 0.0, "items": 0} for stage in ("parse", "upload", "embed", "store")}
+        failed = []
+        batch_files = max(1, options["batch_files"])
+
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"])) as parse_pool, \
+                ThreadPoolExecutor(max_workers=max(1, options["upload_workers"])) as upload_pool:
+            for start in range(0, len(todo), batch_files):
+                group = todo[start:start + batch_files]
+                by_key = {s["key"]: s for s in group}
+
+                # ---- Parse (process pool) ----
+                t0 = time.perf_counter()
+                parsed = []
+                for key, data, pages, error in parse_pool.map(
+                        _parse_source, [(s["key"], s["source"], s["member"]) for s in group]):
+                    if error:
+                        failed.append((key, error))
+                        continue
+                    parsed.append((by_key[key], data, pages))
+                stats["parse"]["seconds"] += time.perf_counter() - t0
+                stats["parse"]["items"] += sum(len(pages) for _, _, pages in parsed)
+                if not parsed:
+                    continue
+
+                # ---- Upload storage (thread pool, idempotente grazie a upsert) ----
+                # un upload fallito esclude solo quel file (riprovato al prossimo run), non il blocco
+                t0 = time.perf_counter()
+                uploaded = []
+                for p, error in zip(parsed, upload_pool.map(lambda p: _upload(storage, p[0], p[1]), parsed)):
+                    if error:
+                        failed.append((p[0]["key"], error))
+                    else:
+                        uploaded.append(p)
+                parsed = uploaded
+                stats["upload"]["seconds"] += time.perf_counter() - t0
+                stats["upload"]["items"] += len(parsed)
+                if not parsed:
+                    continue
+
+                # ---- Embedding: un solo stage batched per tutto il blocco ----
+                t0 = time.perf_counter()
+                cv_rows, chunk_rows, texts = [], [], []
+                pooling = cv_embedding_pooling()
+                cv_chunk_spans = []
+                for item, data, pages in parsed:
+                    cv_id = str(uuid.uuid4())
+                    raw_text = sanitize_text("\n\n".join(t for _, t in pages)).strip()
+                    cv_rows.append([cv_id, str(uuid.uuid4()), item["full_name"], item["file_url"], raw_text,
+                                    content_fingerprint(data)])
+                    first = len(chunk_rows)
+                    for page_number, page_text in pages:
+                        for chunk_index, content in chunk_text(page_text):
+                            content = sanitize_text(content)
+                            chunk_rows.append([str(uuid.uuid4()), cv_id, content, page_number, chunk_index])
+                            texts.append(content or " ")
+                    cv_chunk_spans.append((first, len(chunk_rows)))
+
+                # il raw_text va encodato solo se non si può fare pooling dei chunk
+                text_encoded = [
+                    i for i, (first, last) in enumerate(cv_chunk_spans) if pooling == "text" or first == last
+                ]
+                texts.extend(cv_rows[i][4] or " " for i in text_encoded)
+
+                vecs = encode_in_batches(model, texts, batch_size=embedding_batch_size())
+                for row, vec in zip(chunk_rows, vecs[:len(chunk_rows)]):
+                    row.append(vec)
+                for i, vec in zip(text_encoded, vecs[len(chunk_rows):]):
+                    cv_rows[i].append(vec)
+                for row, (first, last) in zip(cv_rows, cv_chunk_spans):
+                    if len(row) == 6:
+                        row.append(pool_chunk_embeddings(
+                            vecs[first:last], [len(r[2]) for r in chunk_rows[first:last]], pooling,
+                        ))
+                stats["embed"]["seconds"] += time.perf_counter() - t0
+                stats["embed"]["items"] += len(texts)
+
+                # ---- Bulk insert ----
+                t0 = time.perf_counter()
+                self._store(cv_rows, chunk_rows)
+                stats["store"]["seconds"] += time.perf_counter() - t0
+                stats["store"]["items"] += len(cv_rows) + len(chunk_rows)
+
+                self.stdout.write(f"  {min(start + batch_files, len(todo))}/{len(todo)} file elaborati")
+
+        for key, error in failed:
+            self.stderr.write(f"  ERRORE {key}: {error}")
+
+        units = {"parse": "pagine", "upload": "file", "embed": "testi", "store": "righe"}
+        self.stdout.write(self.style.SUCCESS(f"Import completato (modello {get_model_id()}):"))
+        for stage, s in stats.items():
+            rate = s["items"] / s["seconds"] if s["seconds"] else 0.0
+            self.stdout.write(f"  {stage:<7} {s['items']:>7} {units[stage]:<6} in {s['seconds']:8.2f}s  ({rate:.1f}/s)")
+
+    def _discover(self, source: Path) -> list:
+        items = []
+        if source.is_dir():
+            for path in sorted(source.rglob("*")):
+                if path.is_file() and path.suffix.lower() == ".pdf":
+                    key = path.relative_to(source).as_posix()
+                    items.append({"key": key, "source": str(path), "member": None})
+        elif zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as zf:
+                for member in sorted(zf.namelist()):
+                    if member.lower().endswith(".pdf") and not member.endswith("/"):
+                        items.append({"key": member, "source": str(source), "member": member})
+        else:
+            raise CommandError(f"{source} non è né una cartella né un archivio .zip")
+
+        for item in items:
+            # "Mario_Rossi-CV.pdf" -> "Mario Rossi CV"
+            item["full_name"] = re.sub(r"[_\-\s]+", " ", Path(item["key"]).stem).strip()
+        return items
+
+    def _already_ingested(self, file_urls: list) -> set:
+        found = set()
+        with connection.cursor() as cur:
+            # IN a blocchi: niente array Postgres, parametri entro i limiti di ogni backend
+            for start in range(0, len(file_urls), 500):
+                condition, params = in_clause("file_url", file_urls[start:start + 500])
+                cur.execute(f'SELECT file_url FROM "CVS" WHERE {condition}', params)
+                found.update(r[0] for r in cur.fetchall())
+        return found
+
+    def _store(self, cv_rows: list, chunk_rows: list) -> None:
+        model_id = get_model_id()
+        with transaction.atomic():
+            # executemany del cursore Django: funziona con psycopg2, psycopg 3 (pipeline) e sqlite
+            with connection.cursor() as cur:
+                cur.executemany(
+                    'INSERT INTO "CANDIDATI" (id, full_name) VALUES (%s, %s)',
+                    [[row[1], row[2]] for row in cv_rows],
+                )
+                cur.executemany(
+                    """
+                    INSERT INTO "CVS"
+                    (id, candidate_id, file_url, raw_text, content_sha256, embedding, embedding_model, is_active)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, true)
+                    """,
+                    [[row[0], row[1], row[3], row[4], row[5], row[6], get_cv_model_id()] for row in cv_rows],
+                )
+                cur.executemany(
+                    """
+                    INSERT INTO "CV_CHUNKS" (id, cv_id, content, page_number, chunk_index, embedding, embedding_model)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    [row + [model_id] for row in chunk_rows],
+                )
+
+            refresh_coverage(cv_ids=[row[0] for row in cv_rows])
@@ -0,0 +1,28 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from candidates.models import EmbeddingCacheEntry
+from candidates.services.embedding_service import get_model_id
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina dal tier DB della cache embedding (EMBEDDING_CACHE) le righe più vecchie di "
+        "EMBEDDING_CACHE_DB_TTL_DAYS giorni e quelle calcolate con un modello diverso da quello corrente. "
+        "Da schedulare (cron) accanto al servizio."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=int(os.environ.get("EMBEDDING_CACHE_DB_TTL_DAYS", "30")),
+                            help="Età massima delle righe in giorni (default EMBEDDING_CACHE_DB_TTL_DAYS o 30)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=max(0, options["days"]))
+        deleted, _ = EmbeddingCacheEntry.objects.filter(
+            Q(created_at__lt=cutoff) | ~Q(model_id=get_model_id())
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"{deleted} righe eliminate da EMBEDDING_CACHE"))
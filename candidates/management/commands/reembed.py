@@ -0,0 +1,140 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from candidates.models import ReembedCheckpoint
+from candidates.services.coverage import in_clause, refresh_coverage
+from candidates.services.cv_pipeline import cv_embedding_pooling, encode_in_batches, pool_chunk_embeddings
+from candidates.services.embedding_service import get_cv_model_id, get_encoder, get_model_id
+
+# tabella -> colonna di testo da encodare. L'ordine conta: CVS dopo CV_CHUNKS (pooling dei chunk).
+TEXT_COLUMNS = {
+    "CV_CHUNKS": "content",
+    "CVS": "raw_text",
+    "JOB_DESCRIPTIONS": "description_text",
+    "INTERVIEW_QUESTIONS": "question_text",
+    "INTERVIEW_NOTES": "note_text",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricalcola gli embedding con il modello configurato (EMBEDDING_MODEL) tabella per tabella, "
+        "a batch con paginazione keyset e checkpoint ripristinabili."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tables", nargs="+", choices=list(TEXT_COLUMNS), default=list(TEXT_COLUMNS),
+                            help="Tabelle da ri-embeddare (default: tutte)")
+        parser.add_argument("--batch-size", type=int, default=256, help="Righe per batch")
+        parser.add_argument("--restart", action="store_true",
+                            help="Ignora i checkpoint interrotti e riparte dal primo id")
+
+    def handle(self, *args, **options):
+        model_id = get_model_id()
+        model = get_encoder()
+        batch_size = max(1, options["batch_size"])
+        self.stdout.write(f"Re-embedding con {model_id}")
+
+        for table in [t for t in TEXT_COLUMNS if t in options["tables"]]:
+            # CVS: l'id include il pooling (CV_EMBEDDING_POOLING), cambiarlo rende da rifare i CV
+            target_id = get_cv_model_id() if table == "CVS" else model_id
+            checkpoint, _ = ReembedCheckpoint.objects.get_or_create(table_name=table, model_id=target_id)
+            if options["restart"] or checkpoint.completed:
+                # passaggio concluso: si riparte dal primo id, ma _next_batch seleziona solo le righe
+                # con un altro modello (scritte dopo il passaggio o con un cambio A -> B -> A)
+                if checkpoint.completed:
+                    self.stdout.write(f"  {table}: passaggio precedente completato, ricontrollo le righe non aggiornate")
+                checkpoint.last_id, checkpoint.rows_done, checkpoint.completed = None, 0, False
+                checkpoint.save()
+
+            started = time.perf_counter()
+            while True:
+                rows = self._next_batch(table, checkpoint.last_id, target_id, batch_size)
+                if not rows:
+                    break
+
+                if table == "CVS":
+                    updates = self._cv_vectors(model, rows, model_id)
+                else:
+                    vecs = encode_in_batches(model, [text or " " for _, text in rows], batch_size=batch_size)
+                    updates = [(row_id, vec) for (row_id, _), vec in zip(rows, vecs)]
+
+                with transaction.atomic():
+                    self._write(table, updates, target_id)
+                    checkpoint.last_id = str(rows[-1][0])
+                    checkpoint.rows_done += len(rows)
+                    checkpoint.save()
+
+                rate = checkpoint.rows_done / (time.perf_counter() - started)
+                self.stdout.write(f"  {table}: {checkpoint.rows_done} righe ({rate:.1f}/s)")
+
+            checkpoint.completed = True
+            checkpoint.save()
+            self.stdout.write(self.style.SUCCESS(f"  {table}: completata ({checkpoint.rows_done} righe)"))
+
+        if {"CVS", "JOB_DESCRIPTIONS"} & set(options["tables"]):
+            # le coverage salvate col modello precedente non valgono più
+            rows = refresh_coverage()
+            self.stdout.write(f"  CV_JD_COVERAGE: {rows} coppie ricalcolate")
+
+        # ogni UPDATE riscrive il vettore: dopo un re-embed completo il grafo HNSW va ricostruito
+        self.stdout.write("Ricostruire gli indici ANN con: manage.py vector_indexes rebuild")
+
+    def _next_batch(self, table: str, last_id, model_id: str, batch_size: int) -> list:
+        # keyset su id: niente OFFSET, ogni batch parte dall'ultimo id del checkpoint
+        column = TEXT_COLUMNS[table]
+        where = ["(embedding_model IS NULL OR embedding_model <> %s)"]
+        params = [model_id]
+        if last_id:
+            where.append("id > %s")
+            params.append(last_id)
+        with connection.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT id, {column}
+                FROM "{table}"
+                WHERE {" AND ".join(where)}
+                ORDER BY id
+                LIMIT %s
+                """,
+                params + [batch_size],
+            )
+            return cur.fetchall()
+
+    def _cv_vectors(self, model, rows: list, model_id: str) -> list:
+        """Vettore CV-level come nella pipeline: pooling dei chunk (già ri-embeddati) o raw_text."""
+        pooling = cv_embedding_pooling()
+        chunks_by_cv = {}
+        if pooling != "text":
+            condition, params = in_clause("cv_id", [r[0] for r in rows])
+            with connection.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT cv_id, embedding, length(content)
+                    FROM "CV_CHUNKS"
+                    WHERE {condition} AND embedding_model = %s
+                    ORDER BY cv_id, chunk_index
+                    """,
+                    params + [model_id],
+                )
+                for cv_id, vec, length in cur.fetchall():
+                    chunks_by_cv.setdefault(cv_id, []).append((vec, length))
+
+        to_encode = [(row_id, text) for row_id, text in rows if row_id not in chunks_by_cv]
+        encoded = encode_in_batches(model, [text or " " for _, text in to_encode], batch_size=len(to_encode) or 1)
+        vectors = dict(zip([row_id for row_id, _ in to_encode], encoded))
+        for cv_id, chunk_list in chunks_by_cv.items():
+            vectors[cv_id] = pool_chunk_embeddings(
+                [vec for vec, _ in chunk_list], [length for _, length in chunk_list], pooling,
+            )
+        return [(row_id, vectors[row_id]) for row_id, _ in rows]
+
+    def _write(self, table: str, updates: list, model_id: str) -> None:
+        # executemany del cursore Django: funziona con psycopg2, psycopg 3 (pipeline) e sqlite
+        with connection.cursor() as cur:
+            cur.executemany(
+                f'UPDATE "{table}" SET embedding = %s::vector, embedding_model = %s WHERE id = %s',
+                [(vec, model_id, str(row_id)) for row_id, vec in updates],
+            )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from candidates.services.coverage import refresh_coverage
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricalcola la tabella CV_JD_COVERAGE (CV attivi × JD). Serve come backfill iniziale; "
+        "dopo, ingest CV e salvataggio JD la tengono aggiornata da soli."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cv", nargs="+", default=None, help="Solo questi CV (id)")
+        parser.add_argument("--jd", nargs="+", default=None, help="Solo queste JD (id)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rows = refresh_coverage(cv_ids=options["cv"], jd_ids=options["jd"])
+        self.stdout.write(self.style.SUCCESS(f"{rows} coppie CV×JD aggiornate"))
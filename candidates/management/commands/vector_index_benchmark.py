@@ -0,0 +1,126 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from candidates.services.embedding_service import get_model_id
+from candidates.services.vector_index import INDEX_KINDS, VECTOR_TABLES, ann_cursor, index_name, nearest_query
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recall@k e latenza della ricerca HNSW al variare di hnsw.ef_search, "
+        "confrontata con la ricerca esatta (scan sequenziale) sulla stessa tabella. "
+        "Con --kind halfvec|binary: indice compatto + rerank esatto, al variare di --rerank-factor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--table", choices=VECTOR_TABLES, default="CV_CHUNKS")
+        parser.add_argument("--queries", type=int, default=50, help="Vettori query campionati dalla tabella")
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 80, 160, 320])
+        parser.add_argument("--kind", choices=INDEX_KINDS, default="vector",
+                            help="Indice da misurare (manage.py vector_indexes create --kind ...)")
+        parser.add_argument("--rerank-factor", type=int, nargs="+", default=[1, 2, 4, 8],
+                            help="Solo indici compatti: candidati grezzi per risultato prima del rerank")
+        parser.add_argument("--noise", type=float, default=0.05,
+                            help="Rumore gaussiano sulle query: evita che il vicino più vicino sia la riga stessa")
+
+    def handle(self, *args, **options):
+        table, k, kind = options["table"], options["k"], options["kind"]
+        model_id = get_model_id()
+
+        queries = self._sample_queries(table, model_id, options["queries"], options["noise"])
+        if not queries:
+            raise CommandError(f"Nessun vettore {model_id} in {table}")
+
+        sql = f"""
+            SELECT id FROM "{table}"
+            WHERE embedding_model = %s
+            ORDER BY embedding <=> %s::vector
+            LIMIT %s
+        """
+
+        # stessa forma di ChunkSearchView: kind=None è la query sull'indice float32
+        factors = options["rerank_factor"] if kind != "vector" else [None]
+        compact = kind if kind != "vector" else None
+
+        def ann_query(vec, factor):
+            return nearest_query(table, "id", "embedding_model = %s", [model_id], vec, k, compact, factor)
+
+        with ann_cursor() as cur:
+            explain_sql, explain_params = ann_query(queries[0], factors[0])
+            cur.execute("EXPLAIN " + explain_sql, explain_params)
+            plan = "\n".join(r[0] for r in cur.fetchall())
+            cur.execute(
+                "SELECT pg_size_pretty(pg_relation_size(oid)) FROM pg_class WHERE relname = %s",
+                [index_name(table, kind)],
+            )
+            size = cur.fetchone()
+        if index_name(table, kind) not in plan:
+            self.stdout.write(self.style.WARNING(
+                f"Il planner non usa {index_name(table, kind)} (manage.py vector_indexes status --kind {kind}): "
+                "i risultati ANN coincideranno con lo scan esatto"
+            ))
+
+        # ---- Ground truth: scan sequenziale esatto ----
+        exact, exact_latency = [], []
+        for vec in queries:
+            with transaction.atomic(), connection.cursor() as cur:
+                cur.execute("SELECT set_config('enable_indexscan', 'off', true)")
+                t0 = time.perf_counter()
+                cur.execute(sql, [model_id, vec, k])
+                rows = cur.fetchall()
+                exact_latency.append((time.perf_counter() - t0) * 1000)
+            exact.append({r[0] for r in rows})
+
+        self.stdout.write(f"{table}: {len(queries)} query, k={k}, modello {model_id}")
+        self.stdout.write(f"  indice {index_name(table, kind)}: {size[0] if size else 'assente'}")
+        self.stdout.write(f"  {'ef_search':>9} {'rerank':>6} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        self.stdout.write(
+            f"  {'esatto':>9} {'-':>6} {1.0:>9.3f} {statistics.median(exact_latency):>8.2f} "
+            f"{_percentile(exact_latency, 0.95):>8.2f}"
+        )
+
+        # ---- HNSW a vari ef_search (e fattori di rerank per gli indici compatti) ----
+        for ef_search in options["ef_search"]:
+            for factor in factors:
+                recalls, latency = [], []
+                for vec, truth in zip(queries, exact):
+                    query_sql, params = ann_query(vec, factor)
+                    with ann_cursor(ef_search) as cur:
+                        t0 = time.perf_counter()
+                        cur.execute(query_sql, params)
+                        rows = cur.fetchall()
+                        latency.append((time.perf_counter() - t0) * 1000)
+                    recalls.append(len(truth & {r[0] for r in rows}) / len(truth) if truth else 1.0)
+                self.stdout.write(
+                    f"  {ef_search:>9} {factor or '-':>6} {statistics.mean(recalls):>9.3f} "
+                    f"{statistics.median(latency):>8.2f} {_percentile(latency, 0.95):>8.2f}"
+                )
+
+        self.stdout.write("Impostare HNSW_EF_SEARCH (o ef_search per richiesta) al primo valore con recall sufficiente.")
+        if compact:
+            self.stdout.write(f"Per usare l'indice compatto: VECTOR_COMPACT_SEARCH={kind} e VECTOR_RERANK_FACTOR scelto qui.")
+
+    def _sample_queries(self, table: str, model_id: str, n: int, noise: float) -> list:
+        with connection.cursor() as cur:
+            cur.execute(
+                f'SELECT embedding FROM "{table}" WHERE embedding_model = %s ORDER BY random() LIMIT %s',
+                [model_id, n],
+            )
+            vectors = [np.asarray(r[0], dtype=np.float32) for r in cur.fetchall()]
+
+        rng = np.random.default_rng(0)
+        queries = []
+        for vec in vectors:
+            vec = vec + rng.normal(0.0, noise, vec.shape).astype(np.float32)
+            queries.append(vec / (np.linalg.norm(vec) or 1.0))
+        return queries
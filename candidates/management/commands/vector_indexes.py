@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from candidates.services.vector_index import (
+    DEFAULT_EF_CONSTRUCTION,
+    DEFAULT_M,
+    INDEX_KINDS,
+    VECTOR_TABLES,
+    create_index_sql,
+    drop_index_sql,
+    index_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Gestisce gli indici HNSW (vector_cosine_ops) sulle colonne embedding: stato, creazione, "
+        "ricostruzione (es. dopo manage.py reembed o build fallite) e rimozione. "
+        "Per cambiare --m/--ef-construction: drop e poi create. "
+        "--kind halfvec|binary gestisce gli indici compatti usati con VECTOR_COMPACT_SEARCH."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", nargs="?", default="status", choices=["status", "create", "rebuild", "drop"])
+        parser.add_argument("--tables", nargs="+", choices=VECTOR_TABLES, default=VECTOR_TABLES)
+        parser.add_argument("--kind", choices=INDEX_KINDS, default="vector",
+                            help="vector (float32), halfvec (float16) o binary (binary_quantize + Hamming)")
+        parser.add_argument("--m", type=int, default=DEFAULT_M, help="Connessioni per nodo (create)")
+        parser.add_argument("--ef-construction", type=int, default=DEFAULT_EF_CONSTRUCTION,
+                            help="Candidati esplorati in fase di build (create)")
+        parser.add_argument("--maintenance-work-mem", default=None,
+                            help="Memoria per la build, es. 1GB (la build HNSW è molto più veloce se il grafo ci sta)")
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        tables = [t for t in VECTOR_TABLES if t in options["tables"]]
+        kind = options["kind"]
+
+        # CONCURRENTLY: niente lock in scrittura sulle tabelle durante la build, ma fuori da transazioni
+        with connection.cursor() as cur:
+            if options["maintenance_work_mem"]:
+                cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", [options["maintenance_work_mem"]])
+
+            for table in tables:
+                if action == "status":
+                    self._status(cur, table, kind)
+                    continue
+
+                if action == "drop":
+                    cur.execute(drop_index_sql(table, kind=kind))
+                elif action == "rebuild" and self._exists(cur, table, kind):
+                    # stessi parametri, ma l'indice vecchio resta in uso finché il nuovo non è pronto
+                    cur.execute(f'REINDEX INDEX CONCURRENTLY "{index_name(table, kind)}"')
+                else:
+                    cur.execute(create_index_sql(table, options["m"], options["ef_construction"], kind=kind))
+                if action != "drop":
+                    # dopo una build le statistiche aggiornate aiutano il planner a scegliere l'indice
+                    cur.execute(f'ANALYZE "{table}"')
+                self.stdout.write(self.style.SUCCESS(f"  {table}: {action} ok"))
+                self._status(cur, table, kind)
+
+    def _exists(self, cur, table: str, kind: str) -> bool:
+        cur.execute("SELECT 1 FROM pg_class WHERE relname = %s", [index_name(table, kind)])
+        return cur.fetchone() is not None
+
+    def _status(self, cur, table: str, kind: str) -> None:
+        cur.execute(
+            """
+            SELECT i.indisvalid, pg_size_pretty(pg_relation_size(c.oid)), c.reloptions
+            FROM pg_class c
+            JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE c.relname = %s
+            """,
+            [index_name(table, kind)],
+        )
+        row = cur.fetchone()
+        if row is None:
+            self.stdout.write(self.style.WARNING(f"  {table}: nessun indice HNSW {kind}"))
+        elif not row[0]:
+            # build CONCURRENTLY interrotta: l'indice esiste ma il planner non lo usa
+            self.stdout.write(self.style.ERROR(f"  {table}: indice NON valido, eseguire 'vector_indexes rebuild'"))
+        else:
+            self.stdout.write(f"  {table}: {index_name(table, kind)} {row[1]} {', '.join(row[2] or [])}")
@@ -0,0 +1,144 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:09
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candidato',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('full_name', models.TextField()),
+                ('email', models.TextField(blank=True, null=True)),
+                ('linkedin_url', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'CANDIDATI',
+                'ordering': ['-created_at'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CV',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_url', models.TextField()),
+                ('raw_text', models.TextField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('embedding', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'CVS',
+                'ordering': ['-created_at'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CVChunk',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('page_number', models.IntegerField(blank=True, null=True)),
+                ('chunk_index', models.IntegerField()),
+                ('embedding', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'CV_CHUNKS',
+                'ordering': ['cv', 'chunk_index'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InterviewNote',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('session_id', models.UUIDField()),
+                ('author', models.TextField(blank=True, null=True)),
+                ('note_text', models.TextField()),
+                ('embedding', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'INTERVIEW_NOTES',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InterviewQuestion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('job_description_id', models.UUIDField()),
+                ('question_text', models.TextField()),
+                ('embedding', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'INTERVIEW_QUESTIONS',
+                'ordering': ['-created_at'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='InterviewSession',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('candidate_id', models.UUIDField()),
+                ('job_description_id', models.UUIDField()),
+                ('status', models.TextField(default='live')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'INTERVIEW_SESSIONS',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='JobDescription',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('title', models.TextField()),
+                ('description_text', models.TextField()),
+                ('embedding', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'JOB_DESCRIPTIONS',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CVIngestionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('candidate_id', models.UUIDField()),
+                ('file_name', models.TextField()),
+                ('file_data', models.BinaryField(blank=True, null=True)),
+                ('status', models.TextField(default='queued')),
+                ('stage', models.TextField(default='queued')),
+                ('pages_total', models.IntegerField(default=0)),
+                ('pages_done', models.IntegerField(default=0)),
+                ('chunks_total', models.IntegerField(default=0)),
+                ('chunks_done', models.IntegerField(default=0)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'CV_INGESTION_JOBS',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0001_initial'),
+    ]
+
+    # "CVS" non è gestita da Django (managed=False): aggiungiamo la colonna a mano
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                'ALTER TABLE "CVS" ADD COLUMN IF NOT EXISTS content_sha256 text',
+                'CREATE INDEX IF NOT EXISTS cvs_candidate_sha256_idx ON "CVS" (candidate_id, content_sha256)',
+            ],
+            reverse_sql=[
+                'DROP INDEX IF EXISTS cvs_candidate_sha256_idx',
+                'ALTER TABLE "CVS" DROP COLUMN IF EXISTS content_sha256',
+            ],
+            hints={"vendor": "postgresql"},
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:13
+
+from django.db import migrations, models
+
+# Tabelle con colonna vector gestite fuori da Django (managed=False)
+VECTOR_TABLES = ["CVS", "CV_CHUNKS", "JOB_DESCRIPTIONS", "INTERVIEW_QUESTIONS", "INTERVIEW_NOTES"]
+
+# Tutti i vettori esistenti sono stati prodotti dal modello di default
+LEGACY_MODEL_ID = "all-MiniLM-L6-v2"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0002_cvs_content_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReembedCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.TextField()),
+                ('model_id', models.TextField()),
+                ('last_id', models.TextField(blank=True, null=True)),
+                ('rows_done', models.IntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'REEMBED_CHECKPOINTS',
+                'unique_together': {('table_name', 'model_id')},
+            },
+        ),
+    ] + [
+        migrations.RunSQL(
+            sql=[
+                f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS embedding_model text',
+                f"""UPDATE "{table}" SET embedding_model = '{LEGACY_MODEL_ID}'
+                    WHERE embedding IS NOT NULL AND embedding_model IS NULL""",
+            ],
+            reverse_sql=[f'ALTER TABLE "{table}" DROP COLUMN IF EXISTS embedding_model'],
+            hints={"vendor": "postgresql"},
+        )
+        for table in VECTOR_TABLES
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+# Colonne embedding delle tabelle managed=False; stessi nomi indice usati da manage.py vector_indexes
+VECTOR_TABLES = ["CV_CHUNKS", "CVS", "JOB_DESCRIPTIONS", "INTERVIEW_QUESTIONS", "INTERVIEW_NOTES"]
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY non può girare dentro una transazione
+    atomic = False
+
+    dependencies = [
+        ('candidates', '0004_embedding_cache'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{table.lower()}_embedding_hnsw" '
+                f'ON "{table}" USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)'
+            ),
+            reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS "{table.lower()}_embedding_hnsw"',
+            hints={"vendor": "postgresql"},
+        )
+        for table in VECTOR_TABLES
+    ]
@@ -0,0 +1,95 @@
+from django.db import migrations
+
+# Su Supabase queste tabelle esistono già (managed=False). Sul backend sqlite_vector
+# (DATABASE_BACKEND=sqlite) le creiamo qui con lo stesso schema; le colonne "vector"
+# contengono blob float32.
+OFFLINE_TABLES = {
+    "CANDIDATI": """
+        id text PRIMARY KEY,
+        full_name text NOT NULL,
+        email text,
+        linkedin_url text,
+        created_at datetime DEFAULT CURRENT_TIMESTAMP
+    """,
+    "CVS": """
+        id text PRIMARY KEY,
+        candidate_id text NOT NULL REFERENCES "CANDIDATI" (id) ON DELETE CASCADE,
+        file_url text NOT NULL,
+        raw_text text,
+        is_active bool NOT NULL DEFAULT 1,
+        embedding vector,
+        embedding_model text,
+        content_sha256 text,
+        created_at datetime DEFAULT CURRENT_TIMESTAMP
+    """,
+    "CV_CHUNKS": """
+        id text PRIMARY KEY,
+        cv_id text NOT NULL REFERENCES "CVS" (id) ON DELETE CASCADE,
+        content text NOT NULL,
+        page_number integer,
+        chunk_index integer NOT NULL,
+        embedding vector,
+        embedding_model text
+    """,
+    "JOB_DESCRIPTIONS": """
+        id text PRIMARY KEY,
+        title text NOT NULL,
+        description_text text NOT NULL,
+        embedding vector,
+        embedding_model text,
+        created_at datetime DEFAULT CURRENT_TIMESTAMP
+    """,
+    "INTERVIEW_SESSIONS": """
+        id text PRIMARY KEY,
+        candidate_id text NOT NULL,
+        job_description_id text NOT NULL,
+        status text NOT NULL DEFAULT 'live',
+        started_at datetime,
+        ended_at datetime,
+        created_at datetime DEFAULT CURRENT_TIMESTAMP
+    """,
+    "INTERVIEW_QUESTIONS": """
+        id text PRIMARY KEY,
+        job_description_id text,
+        session_id text,
+        recruiter_id text,
+        question_text text NOT NULL,
+        embedding vector,
+        embedding_model text,
+        asked_at datetime,
+        asked_by text,
+        created_at datetime DEFAULT CURRENT_TIMESTAMP
+    """,
+    "INTERVIEW_NOTES": """
+        id text PRIMARY KEY,
+        session_id text NOT NULL,
+        author text,
+        note_text text NOT NULL,
+        embedding vector,
+        embedding_model text,
+        created_at datetime DEFAULT CURRENT_TIMESTAMP
+    """,
+}
+
+OFFLINE_INDEXES = [
+    'CREATE INDEX cvs_candidate_sha256_idx ON "CVS" (candidate_id, content_sha256)',
+    'CREATE INDEX cv_chunks_cv_id_idx ON "CV_CHUNKS" (cv_id)',
+    'CREATE INDEX interview_questions_session_idx ON "INTERVIEW_QUESTIONS" (session_id)',
+    'CREATE INDEX interview_notes_session_idx ON "INTERVIEW_NOTES" (session_id)',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0005_hnsw_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[f'CREATE TABLE "{table}" ({columns})' for table, columns in OFFLINE_TABLES.items()]
+            + OFFLINE_INDEXES,
+            reverse_sql=[f'DROP TABLE "{table}"' for table in reversed(OFFLINE_TABLES)],
+            hints={"vendor": "sqlite"},
+        ),
+    ]
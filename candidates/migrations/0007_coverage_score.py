@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0006_offline_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoverageScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cv_id', models.UUIDField()),
+                ('jd_id', models.UUIDField()),
+                ('distance', models.FloatField()),
+                ('score', models.FloatField()),
+                ('model_version', models.TextField()),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'CV_JD_COVERAGE',
+                'indexes': [models.Index(fields=['jd_id', 'score'], name='cv_jd_coverage_jd_score_idx')],
+                'unique_together': {('cv_id', 'jd_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:38
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0007_coverage_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionRecap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.UUIDField(unique=True)),
+                ('fingerprint', models.CharField(blank=True, max_length=64, null=True)),
+                ('status', models.TextField(default='queued')),
+                ('payload', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'SESSION_RECAPS',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Btree sulle colonne di filtro delle ricerche vettoriali (chunk di un CV, note/domande di una
+# sessione o di una JD). Con un filtro selettivo il planner usa questi indici + ordinamento esatto
+# invece dell'HNSW, che filtrando dopo la scansione può restituire meno di k righe.
+# Stessi nomi degli indici già creati per sqlite in 0006.
+FILTER_INDEXES = {
+    "cv_chunks_cv_id_idx": '"CV_CHUNKS" (cv_id)',
+    "interview_notes_session_idx": '"INTERVIEW_NOTES" (session_id)',
+    "interview_questions_session_idx": '"INTERVIEW_QUESTIONS" (session_id)',
+    "interview_questions_jd_idx": '"INTERVIEW_QUESTIONS" (job_description_id)',
+}
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY non può girare dentro una transazione
+    atomic = False
+
+    dependencies = [
+        ('candidates', '0008_session_recap'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {columns}',
+            reverse_sql=f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"',
+            hints={"vendor": "postgresql"},
+        )
+        for name, columns in FILTER_INDEXES.items()
+    ] + [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS "interview_questions_jd_idx" '
+                'ON "INTERVIEW_QUESTIONS" (job_description_id)',
+            reverse_sql='DROP INDEX IF EXISTS "interview_questions_jd_idx"',
+            hints={"vendor": "sqlite"},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0009_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NoteFollowup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note_id', models.UUIDField(unique=True)),
+                ('session_id', models.UUIDField(db_index=True)),
+                ('risk_level', models.TextField()),
+                ('status', models.TextField(default='running')),
+                ('question', models.TextField(blank=True, default='')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'NOTE_FOLLOWUPS',
+            },
+        ),
+    ]
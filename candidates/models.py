@@ -1,6 +1,9 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 import uuid
 
+from .fields import VectorField
+
 
 class Candidato(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # aggiungi default=uuid.uuid4
@@ -29,7 +32,9 @@ class CV(models.Model):
     file_url = models.TextField()
     raw_text = models.TextField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
-    embedding = models.JSONField(null=True, blank=True)  # SOLO placeholder
+    embedding = VectorField(null=True, blank=True)
+    embedding_model = models.TextField(null=True, blank=True)  # modello che ha prodotto embedding
+    content_sha256 = models.TextField(null=True, blank=True)  # fingerprint del PDF per dedup
     created_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
@@ -52,7 +57,8 @@ class CVChunk(models.Model):
     content = models.TextField()
     page_number = models.IntegerField(null=True, blank=True)
     chunk_index = models.IntegerField()
-    embedding = models.JSONField(null=True, blank=True)  # placeholder
+    embedding = VectorField(null=True, blank=True)
+    embedding_model = models.TextField(null=True, blank=True)
 
     class Meta:
         db_table = 'CV_CHUNKS'
@@ -66,7 +72,8 @@ class JobDescription(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.TextField()
     description_text = models.TextField()
-    embedding = models.JSONField(null=True, blank=True)  # placeholder
+    embedding = VectorField(null=True, blank=True)
+    embedding_model = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -83,7 +90,8 @@ class InterviewQuestion(models.Model):
     job_description_id = models.UUIDField()  # semplice, evitiamo FK ORM con managed=False
 
     question_text = models.TextField()
-    embedding = models.JSONField(null=True, blank=True)  # placeholder (nel DB è vector)
+    embedding = VectorField(null=True, blank=True)
+    embedding_model = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -113,9 +121,152 @@ class InterviewNote(models.Model):
     session_id = models.UUIDField()
     author = models.TextField(null=True, blank=True)
     note_text = models.TextField()
-    embedding = models.JSONField(null=True, blank=True)
+    embedding = VectorField(null=True, blank=True)
+    embedding_model = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = "INTERVIEW_NOTES"
         managed = False
+
+
+class CVIngestionJob(models.Model):
+    """
+    Job di ingestione CV eseguito in background (upload -> parse -> embed -> store).
+    Tabella gestita da Django: lo stato sopravvive a un riavvio del server.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    candidate_id = models.UUIDField()
+    file_name = models.TextField()
+    file_data = models.BinaryField(null=True, blank=True)  # svuotato a job concluso
+    status = models.TextField(default=STATUS_QUEUED)
+    stage = models.TextField(default=STATUS_QUEUED)
+    pages_total = models.IntegerField(default=0)
+    pages_done = models.IntegerField(default=0)
+    chunks_total = models.IntegerField(default=0)
+    chunks_done = models.IntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "CV_INGESTION_JOBS"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.status})"
+
+
+class ReembedCheckpoint(models.Model):
+    """Avanzamento di manage.py reembed per (tabella, modello): permette di riprendere."""
+    table_name = models.TextField()
+    model_id = models.TextField()
+    last_id = models.TextField(null=True, blank=True)  # keyset: ultimo id elaborato
+    rows_done = models.IntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "REEMBED_CHECKPOINTS"
+        unique_together = ("table_name", "model_id")
+
+    def __str__(self):
+        return f"{self.table_name} -> {self.model_id}"
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Tier persistente della cache embedding (condiviso tra i worker).
+    Chiave: (model_id, sha256 del testo normalizzato); vettore float32 serializzato.
+    """
+    model_id = models.TextField()
+    text_hash = models.CharField(max_length=64)
+    embedding = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "EMBEDDING_CACHE"
+        unique_together = ("model_id", "text_hash")
+
+    def __str__(self):
+        return f"{self.model_id}:{self.text_hash[:12]}"
+
+
+class CoverageScore(models.Model):
+    """
+    Coverage CV×JD precalcolata (1 - distanza coseno), aggiornata a ogni ingest CV e
+    creazione/modifica JD. model_version: embedding_model del CV (modello + pooling, vedi
+    get_cv_model_id); la JD è sempre del modello corrente.
+    """
+    cv_id = models.UUIDField()
+    jd_id = models.UUIDField()
+    distance = models.FloatField()
+    score = models.FloatField()  # 0-100, come coverage_score nelle API
+    model_version = models.TextField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "CV_JD_COVERAGE"
+        unique_together = ("cv_id", "jd_id")
+        indexes = [models.Index(fields=["jd_id", "score"], name="cv_jd_coverage_jd_score_idx")]
+
+    def __str__(self):
+        return f"{self.cv_id} × {self.jd_id}: {self.score:.2f}"
+
+
+class SessionRecap(models.Model):
+    """
+    Recap di sessione salvato (stesso payload di GET /api/sessions/<id>/recap/), generato in
+    background alla chiusura della sessione. fingerprint: sha256 di note e domande della sessione,
+    se cambia il recap viene rigenerato.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    session_id = models.UUIDField(unique=True)
+    fingerprint = models.CharField(max_length=64, null=True, blank=True)
+    status = models.TextField(default=STATUS_QUEUED)
+    payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "SESSION_RECAPS"
+
+    def __str__(self):
+        return f"{self.session_id} ({self.status})"
+
+
+class NoteFollowup(models.Model):
+    """
+    Domanda di follow-up generata in background dopo una nota. Il testo parziale viene salvato
+    mentre arrivano i token, così qualunque worker può servirlo a GET
+    /api/sessions/<id>/followups/<note_id>/ (il client fa polling finché lo stato è finale).
+    """
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    note_id = models.UUIDField(unique=True)
+    session_id = models.UUIDField(db_index=True)
+    risk_level = models.TextField()
+    status = models.TextField(default=STATUS_RUNNING)
+    question = models.TextField(default="", blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "NOTE_FOLLOWUPS"
+
+    def __str__(self):
+        return f"{self.note_id} ({self.status})"
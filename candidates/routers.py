@@ -0,0 +1,14 @@
+from django.db import connections
+
+
+class VendorRouter:
+    """
+    Le migrazioni RunSQL con hints={"vendor": ...} girano solo su quel database:
+    indici HNSW e ALTER sulle tabelle Supabase solo su Postgres, schema offline solo su SQLite.
+    """
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        vendor = hints.get("vendor")
+        if vendor is None:
+            return None
+        return connections[db].vendor == vendor
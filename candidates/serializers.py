@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Candidato, CV, CVChunk, JobDescription, InterviewQuestion
+from .models import Candidato, CV, CVChunk, JobDescription, InterviewQuestion, CVIngestionJob
 
 
 class CandidatoSerializer(serializers.ModelSerializer):
@@ -13,14 +13,14 @@ class CVSerializer(serializers.ModelSerializer):
     class Meta:
         model = CV
         fields = '__all__'
-        read_only_fields = ("id", "created_at")
+        read_only_fields = ("id", "created_at", "embedding_model")
 
 
 class CVChunkSerializer(serializers.ModelSerializer):
     class Meta:
         model = CVChunk
         fields = '__all__'
-        read_only_fields = ("id", "created_at")
+        read_only_fields = ("id", "created_at", "embedding_model")
 
 
 class CVUploadSerializer(serializers.Serializer):
@@ -28,16 +28,33 @@ class CVUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
 
 
+class CVIngestionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CVIngestionJob
+        exclude = ("file_data",)
+
+
 class ChunkSearchSerializer(serializers.Serializer):
     query = serializers.CharField()
     cv_id = serializers.UUIDField(required=False)
     top_k = serializers.IntegerField(default=5)
+    ef_search = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+
+class BatchChunkQuerySerializer(serializers.Serializer):
+    query = serializers.CharField()
+    cv_id = serializers.UUIDField(required=False)
+
+class BatchChunkSearchSerializer(serializers.Serializer):
+    queries = BatchChunkQuerySerializer(many=True, allow_empty=False, max_length=50)
+    cv_id = serializers.UUIDField(required=False)  # default per le query senza cv_id
+    top_k = serializers.IntegerField(default=5, min_value=1, max_value=50)
+    ef_search = serializers.IntegerField(required=False, min_value=1, max_value=1000)
 
 class JobDescriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = JobDescription
         fields = "__all__"
-        read_only_fields = ("id", "created_at", "embedding")
+        read_only_fields = ("id", "created_at", "embedding", "embedding_model")
 
 class CoverageSerializer(serializers.Serializer):
     cv_id = serializers.UUIDField()
@@ -48,17 +65,27 @@ class CoverageExplainSerializer(serializers.Serializer):
     job_description_id = serializers.UUIDField()
     top_k = serializers.IntegerField(default=5, min_value=1, max_value=20)
 
+class CoverageRankSerializer(serializers.Serializer):
+    job_description_id = serializers.UUIDField()
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=100)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    exclude_candidate_ids = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+    evidence_k = serializers.IntegerField(default=3, min_value=0, max_value=10)
+    cursor = serializers.CharField(required=False)  # next_cursor della pagina precedente
+
 class InterviewQuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = InterviewQuestion
         fields = "__all__"
-        read_only_fields = ("id", "created_at", "embedding")
+        read_only_fields = ("id", "created_at", "embedding", "embedding_model")
 
 class LiveSuggestSerializer(serializers.Serializer):
     cv_id = serializers.UUIDField()
     job_description_id = serializers.UUIDField()
     note_text = serializers.CharField()
     top_k = serializers.IntegerField(default=3, min_value=1, max_value=10)
+    ef_search = serializers.IntegerField(required=False, min_value=1, max_value=1000)
 
 
 class StartSessionSerializer(serializers.Serializer):
@@ -74,6 +101,7 @@ class NextQuestionSerializer(serializers.Serializer):
     notes_window = serializers.IntegerField(default=5, min_value=1, max_value=20)
     top_k_questions = serializers.IntegerField(default=3, min_value=1, max_value=10)
     top_k_chunks = serializers.IntegerField(default=3, min_value=1, max_value=10)
+    ef_search = serializers.IntegerField(required=False, min_value=1, max_value=1000)
 
 class SessionQuestionCreateSerializer(serializers.Serializer):
     question_text = serializers.CharField()
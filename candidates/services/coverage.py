@@ -0,0 +1,114 @@
+from typing import Iterable, Optional, Tuple
+
+from django.db import connection
+
+from .embedding_service import get_cv_model_id, get_model_id
+
+
+def in_clause(column: str, values: list) -> Tuple[str, list]:
+    """("column IN (%s, ...)", params) per una lista non vuota di valori, convertiti in stringa."""
+    return f"{column} IN ({', '.join(['%s'] * len(values))})", [str(v) for v in values]
+
+
+def refresh_coverage(cv_ids: Optional[Iterable] = None, jd_ids: Optional[Iterable] = None) -> int:
+    """
+    Ricalcola e salva in CV_JD_COVERAGE le coppie (CV attivo, JD) con vettori dello stesso modello:
+    - cv_ids: dopo l'ingest di un CV, contro tutte le JD
+    - jd_ids: dopo creazione/modifica di una JD, contro tutti i CV attivi
+    - nessuno dei due: tutto (backfill, dopo manage.py reembed)
+    Ritorna il numero di righe scritte.
+    """
+    where = [
+        "cv.embedding IS NOT NULL",
+        "jd.embedding IS NOT NULL",
+        "cv.embedding_model = %s",
+        "jd.embedding_model = %s",
+    ]
+    params = [get_cv_model_id(), get_model_id()]
+    if cv_ids is not None:
+        cv_ids = list(cv_ids)
+        if not cv_ids:
+            return 0
+        clause, values = in_clause("cv.id", cv_ids)
+        where.append(clause)
+        params += values
+    else:
+        where.append("cv.is_active = true")
+    if jd_ids is not None:
+        jd_ids = list(jd_ids)
+        if not jd_ids:
+            return 0
+        clause, values = in_clause("jd.id", jd_ids)
+        where.append(clause)
+        params += values
+
+    with connection.cursor() as cur:
+        # "WHERE true" esterno: su SQLite evita l'ambiguità tra JOIN ... ON e ON CONFLICT
+        cur.execute(
+            f"""
+            INSERT INTO "CV_JD_COVERAGE" (cv_id, jd_id, distance, score, model_version, computed_at)
+            SELECT cv_id, jd_id, distance, GREATEST(0.0, 1.0 - distance) * 100, model_version, now()
+            FROM (
+                SELECT cv.id AS cv_id, jd.id AS jd_id,
+                       cv.embedding <=> jd.embedding AS distance,
+                       cv.embedding_model AS model_version
+                FROM "CVS" cv
+                CROSS JOIN "JOB_DESCRIPTIONS" jd
+                WHERE {" AND ".join(where)}
+            ) pairs
+            WHERE true
+            ON CONFLICT (cv_id, jd_id) DO UPDATE
+            SET distance = excluded.distance,
+                score = excluded.score,
+                model_version = excluded.model_version,
+                computed_at = excluded.computed_at
+            """,
+            params,
+        )
+        return cur.rowcount
+
+
+def get_coverage(cv_id, jd_id) -> Optional[dict]:
+    """
+    Coverage di una coppia: dalla tabella se aggiornata al modello corrente, altrimenti
+    calcolata al volo (e salvata se i due vettori vengono dal modello corrente).
+    None se CV o JD non esistono o manca un embedding.
+    """
+    model_id, cv_model_id = get_model_id(), get_cv_model_id()
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT distance, score
+            FROM "CV_JD_COVERAGE"
+            WHERE cv_id = %s AND jd_id = %s AND model_version = %s
+            """,
+            [str(cv_id), str(jd_id), cv_model_id],
+        )
+        row = cur.fetchone()
+        if row:
+            return {"distance": row[0], "score": row[1], "cv_model": cv_model_id, "jd_model": model_id}
+
+        cur.execute(
+            """
+            SELECT (c.embedding <=> jd.embedding) AS distance,
+                   c.embedding_model,
+                   jd.embedding_model
+            FROM "CVS" c
+            JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
+            WHERE c.id = %s
+            """,
+            [str(jd_id), str(cv_id)],
+        )
+        row = cur.fetchone()
+
+    if not row or row[0] is None:
+        return None
+    distance = float(row[0])
+    if row[1] == cv_model_id and row[2] == model_id:
+        refresh_coverage(cv_ids=[cv_id], jd_ids=[jd_id])
+    return {
+        "distance": distance,
+        "score": max(0.0, 1.0 - distance) * 100,
+        "cv_model": row[1],
+        "jd_model": row[2],
+    }
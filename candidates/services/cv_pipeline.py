@@ -1,21 +1,22 @@
+import hashlib
+import io
+import multiprocessing
 import os
+import time
 import uuid
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Optional, Tuple, Union
 
+import numpy as np
 import pdfplumber
 from supabase import create_client
 
 from django.db import connection, transaction
 
-from pgvector.psycopg2 import register_vector
-
-
-def sanitize_text(s: str) -> str:
-    if not s:
-        return ""
-    # PostgreSQL non accetta NUL (0x00) nelle stringhe
-    s = s.replace("\x00", "")
-    return s
+from .coverage import refresh_coverage
+from .embedding_service import cv_embedding_pooling, get_cv_model_id, get_encoder, get_model_id, \
+    get_model_load_time, get_model_name
+from .pdf_pages import extract_page, init_page_worker, page_text, sanitize_text
 
 
 def chunk_text(text: str, chunk_size: int = 900, overlap: int = 120) -> List[Tuple[int, str]]:
@@ -38,106 +39,417 @@ def chunk_text(text: str, chunk_size: int = 900, overlap: int = 120) -> List[Tup
     return chunks
 
 
-def extract_text_by_page(pdf_path: str):
-    pages = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages, start=1):
-            txt = sanitize_text((page.extract_text() or "")).strip()
-            if txt:
-                pages.append((i, txt))
-    return pages
+def embedding_batch_size() -> int:
+    return max(1, int(os.environ.get("EMBEDDING_BATCH_SIZE", "32")))
+
+
+def pool_chunk_embeddings(chunk_vecs: list, chunk_lengths: List[int], method: str = "mean") -> np.ndarray:
+    """
+    Vettore CV-level dai vettori dei chunk (già calcolati):
+    - mean: media semplice
+    - weighted: media pesata sulla lunghezza del chunk
+    - max: max-pooling per dimensione
+    Il risultato è rinormalizzato (cosine).
+    """
+    mat = np.asarray(chunk_vecs, dtype=np.float32)
+    if method == "max":
+        pooled = mat.max(axis=0)
+    elif method == "weighted":
+        pooled = np.average(mat, axis=0, weights=np.asarray(chunk_lengths, dtype=np.float32))
+    else:
+        pooled = mat.mean(axis=0)
+    norm = np.linalg.norm(pooled)
+    return (pooled / norm if norm else pooled).astype(np.float32)
+
+
+def pdf_parse_limits() -> dict:
+    return {
+        "max_pages": max(1, int(os.environ.get("PDF_MAX_PAGES", "60"))),
+        "page_timeout": float(os.environ.get("PDF_PAGE_TIMEOUT", "15")),
+        "document_timeout": float(os.environ.get("PDF_DOCUMENT_TIMEOUT", "120")),
+        "parallel_min_pages": max(2, int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "8"))),
+        # sotto entrambe le soglie niente processi: avviare un pool costa più del parsing
+        "inline_max_pages": max(0, int(os.environ.get("PDF_INLINE_MAX_PAGES", "2"))),
+        "inline_max_bytes": max(0, int(os.environ.get("PDF_INLINE_MAX_BYTES", str(1024 * 1024)))),
+        "workers": max(1, int(os.environ.get("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))),
+    }
+
+
+_pool_context = None
+
+
+def _get_pool_context():
+    """
+    Contesto multiprocessing per il parsing: il processo Django ha thread (job, upload, SSE),
+    quindi niente fork. forkserver dove disponibile (pdfplumber precaricato), altrimenti spawn;
+    PDF_PARSE_START_METHOD per forzarne uno.
+    """
+    global _pool_context
+    if _pool_context is None:
+        methods = multiprocessing.get_all_start_methods()
+        method = os.environ.get("PDF_PARSE_START_METHOD") or ("forkserver" if "forkserver" in methods else "spawn")
+        ctx = multiprocessing.get_context(method)
+        if method == "forkserver":
+            ctx.set_forkserver_preload(["candidates.services.pdf_pages"])
+        _pool_context = ctx
+    return _pool_context
+
+
+def _run_page_pool(data: bytes, page_numbers: List[int], workers: int, limits: dict, deadline: float,
+                   texts: dict, warnings: list, on_page: Optional[Callable[[int, int], None]],
+                   total: int) -> List[int]:
+    """
+    Estrae page_numbers su un pool di `workers` processi, con timeout per pagina e scadenza
+    del documento. Ritorna le pagine da riprovare su un pool nuovo: con un solo worker, dopo
+    un timeout il processo è ancora bloccato e le pagine in coda dietro non partirebbero.
+    """
+    pool = _get_pool_context().Pool(workers, initializer=init_page_worker, initargs=(data,))
+    try:
+        pending = [(i, pool.apply_async(extract_page, (i,))) for i in page_numbers]
+        for pos, (i, res) in enumerate(pending):
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise multiprocessing.TimeoutError
+                texts[i] = res.get(timeout=min(limits["page_timeout"], remaining))
+            except multiprocessing.TimeoutError:
+                if remaining <= limits["page_timeout"]:
+                    warnings.append(
+                        f"Documento: timeout dopo {limits['document_timeout']}s, saltate le pagine da {i} in poi"
+                    )
+                    return []
+                warnings.append(f"Pagina {i}: timeout dopo {limits['page_timeout']}s, saltata")
+                if workers == 1:
+                    if on_page:
+                        on_page(i, total)
+                    return [j for j, _ in pending[pos + 1:]]
+            except Exception as exc:
+                warnings.append(f"Pagina {i}: errore di parsing ({type(exc).__name__}), saltata")
+            if on_page:
+                on_page(i, total)
+    finally:
+        # terminate() uccide anche eventuali worker bloccati su una pagina
+        pool.terminate()
+        pool.join()
+    return []
+
+
+def _extract_inline(pdf, n: int, limits: dict, deadline: float, texts: dict, warnings: list,
+                    on_page: Optional[Callable[[int, int], None]]) -> None:
+    """
+    Estrae le prime n pagine nel processo corrente. Una pagina bloccata non si può interrompere:
+    la scadenza del documento viene controllata solo tra una pagina e l'altra.
+    """
+    for i, page in enumerate(pdf.pages[:n], start=1):
+        if time.monotonic() >= deadline:
+            warnings.append(
+                f"Documento: timeout dopo {limits['document_timeout']}s, saltate le pagine da {i} in poi"
+            )
+            return
+        try:
+            texts[i] = page_text(page)
+        except Exception as exc:
+            warnings.append(f"Pagina {i}: errore di parsing ({type(exc).__name__}), saltata")
+        if on_page:
+            on_page(i, n)
+
+
+def extract_pages_with_limits(data: Union[bytes, memoryview], on_page: Optional[Callable[[int, int], None]] = None,
+                              parallel: bool = True, in_process: bool = False) -> Tuple[list, dict]:
+    """
+    Estrae il testo pagina per pagina rispettando PDF_MAX_PAGES.
+    Documenti piccoli (al massimo PDF_INLINE_MAX_PAGES pagine e PDF_INLINE_MAX_BYTES byte), o
+    tutti con in_process=True (chiamante già in un processo dedicato, es. il pool di import_cvs),
+    vengono letti nel processo corrente (stats["workers"] = 0). Gli altri in processi separati
+    con timeout per pagina (PDF_PAGE_TIMEOUT) e per documento (PDF_DOCUMENT_TIMEOUT): oltre
+    PDF_PARALLEL_MIN_PAGES su più processi, altrimenti (o con parallel=False) su un solo
+    processo. Le pagine che sforano vengono saltate e segnalate in warnings invece di
+    bloccare il worker.
+    Ritorna (pages, stats).
+    """
+    limits = pdf_parse_limits()
+    started = time.perf_counter()
+    deadline = time.monotonic() + limits["document_timeout"]
+    warnings = []
+    texts = {}
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        pages_total = len(pdf.pages)
+        n = min(pages_total, limits["max_pages"])
+        if pages_total > n:
+            warnings.append(f"PDF di {pages_total} pagine: elaborate solo le prime {n} (PDF_MAX_PAGES)")
+
+        inline = in_process or (n <= limits["inline_max_pages"] and len(data) <= limits["inline_max_bytes"])
+        if inline:
+            workers = 0
+            _extract_inline(pdf, n, limits, deadline, texts, warnings, on_page)
+
+    if not inline:
+        workers = min(limits["workers"], n)
+        if not parallel or n < limits["parallel_min_pages"] or workers < 2:
+            workers = 1
+
+        todo = list(range(1, n + 1))
+        # initargs del pool vengono serializzati: un memoryview non si può passare
+        data = as_bytes(data)
+        while todo:
+            todo = _run_page_pool(data, todo, workers, limits, deadline, texts, warnings, on_page, n)
+    pages = [(i, texts[i]) for i in sorted(texts) if texts[i]]
+
+    seconds = time.perf_counter() - started
+    stats = {
+        "pages_total": pages_total,
+        "pages_processed": n,
+        "pages_with_text": len(pages),
+        "workers": workers,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(n / seconds, 2) if seconds else None,
+        "warnings": warnings,
+    }
+    return pages, stats
+
+
+def encode_in_batches(model, texts: List[str], batch_size: int,
+                      on_batch: Optional[Callable[[int, int], None]] = None) -> list:
+    """Encode a blocchi di batch_size; ritorna una riga numpy per testo."""
+    vecs = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        vecs.extend(model.encode(batch, batch_size=batch_size, normalize_embeddings=True))
+        if on_batch:
+            on_batch(len(vecs), len(texts))
+    return vecs
 
 
 
+def read_upload(uploaded_file) -> Union[bytes, memoryview]:
+    """
+    Legge l'upload una sola volta. Buffer già in memoria passano senza copia: bytes così come
+    sono, bytearray / memoryview (es. BinaryField letto da psycopg) come memoryview.
+    Hash e parser accettano qualsiasi buffer; as_bytes copia solo dove serve un bytes vero.
+    """
+    if isinstance(uploaded_file, bytes):
+        return uploaded_file
+    if isinstance(uploaded_file, (bytearray, memoryview)):
+        return memoryview(uploaded_file)
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    return uploaded_file.read()
+
+
+def as_bytes(data: Union[bytes, memoryview]) -> bytes:
+    """bytes per chi non accetta altri buffer (client Storage, pickling verso il pool): copia solo se serve."""
+    return data if isinstance(data, bytes) else bytes(data)
+
+
+def content_fingerprint(data: Union[bytes, memoryview]) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def reuse_existing_cv(candidate_id: str, content_sha256: str) -> Optional[dict]:
+    """
+    Se il candidato ha già un CV byte-identico lo riattiva (con i suoi CV_CHUNKS)
+    e ritorna il payload; altrimenti None.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT cv.id, cv.file_url,
+                       COUNT(ch.id), COUNT(DISTINCT ch.page_number)
+                FROM "CVS" cv
+                LEFT JOIN "CV_CHUNKS" ch ON ch.cv_id = cv.id
+                WHERE cv.candidate_id = %s AND cv.content_sha256 = %s
+                  AND cv.embedding_model = %s
+                GROUP BY cv.id, cv.file_url, cv.created_at
+                ORDER BY cv.created_at DESC NULLS LAST
+                LIMIT 1
+                """,
+                [candidate_id, content_sha256, get_cv_model_id()],
+            )
+            row = cur.fetchone()
+            if not row:
+                return None
+
+            cv_id, file_url, chunks, pages = row
+            cur.execute(
+                'UPDATE "CVS" SET is_active = (id = %s) WHERE candidate_id = %s',
+                [str(cv_id), candidate_id],
+            )
+
+        # JD create mentre il CV era inattivo non lo hanno incluso
+        refresh_coverage(cv_ids=[cv_id])
+
+    return {
+        "cv_id": str(cv_id),
+        "candidate_id": candidate_id,
+        "file_url": file_url,
+        "pages": pages,
+        "chunks": chunks,
+        "model": get_model_id(),
+        "content_sha256": content_sha256,
+        "deduplicated": True,
+    }
+
+
 def _get_supabase():
     url = os.environ["SUPABASE_URL"]
     key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
     return create_client(url, key)
 
 
-def process_and_store_cv(candidate_id: str, uploaded_file) -> dict:
-    from sentence_transformers import SentenceTransformer
+# Upload su Supabase Storage in parallelo a parsing ed embedding (è solo I/O di rete)
+_storage_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(os.environ.get("STORAGE_UPLOAD_WORKERS", "4"))),
+    thread_name_prefix="cv-storage",
+)
+
+
+def _upload_to_storage(supabase, bucket: str, storage_path: str, data: Union[bytes, memoryview]) -> Tuple[str, float]:
+    t0 = time.perf_counter()
+    supabase.storage.from_(bucket).upload(
+        path=storage_path,
+        file=as_bytes(data),
+        file_options={"content-type": "application/pdf"},
+    )
+    file_url = supabase.storage.from_(bucket).get_public_url(storage_path)
+    return file_url, time.perf_counter() - t0
+
+
+def _discard_upload(upload_future, supabase, bucket: str, storage_path: str) -> None:
+    try:
+        upload_future.result()
+    except Exception:
+        return  # upload fallito: niente da rimuovere
+    try:
+        supabase.storage.from_(bucket).remove([storage_path])
+    except Exception:
+        pass
+
+
+def process_and_store_cv(candidate_id: str, uploaded_file: Union[bytes, BinaryIO], progress: Optional[Callable] = None) -> dict:
     """
     Pipeline:
-    1) Upload PDF -> Supabase Storage
+    1) Upload PDF -> Supabase Storage (in background, joined before the DB write)
     2) Parse PDF -> text per page
-    3) Global embedding -> CVS.embedding (vector(384))
-    4) Chunk per page + embeddings -> CV_CHUNKS.embedding (vector(384))
+    3) Chunk per page + batched embeddings -> CV_CHUNKS.embedding (vector(384))
+    4) Global embedding pooled from chunks (CV_EMBEDDING_POOLING) -> CVS.embedding (vector(384))
+
+    progress(stage, **counters) viene chiamato a ogni passo (usato dai job di ingestione).
     """
+    progress = progress or (lambda stage, **counters: None)
     bucket = os.environ.get("SUPABASE_BUCKET", "cvs")
-    model_name = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    model_name = get_model_name()
+    model_id = get_model_id(model_name)
 
-    model = SentenceTransformer(model_name)
-    supabase = _get_supabase()
+    # ---- Read upload once: same buffer for storage and parser ----
+    data = read_upload(uploaded_file)
 
-    # ---- Save to temp (works on Windows too) ----
-    tmp_path = os.path.join(os.getcwd(), f"tmp_{uuid.uuid4()}.pdf")
-    with open(tmp_path, "wb") as f:
-        for c in uploaded_file.chunks():
-            f.write(c)
+    # ---- Dedup: PDF identico già caricato per questo candidato ----
+    content_sha256 = content_fingerprint(data)
+    existing = reuse_existing_cv(candidate_id, content_sha256)
+    if existing:
+        return existing
 
-    # ---- Upload to storage ----
+    started = time.perf_counter()
+    timings = {}
+    model = get_encoder()
+    supabase = _get_supabase()
+
+    # ---- Upload to storage (in background, overlaps parse + embed) ----
     storage_path = f"{candidate_id}/{uuid.uuid4()}.pdf"
-    with open(tmp_path, "rb") as f:
-        data = f.read()
+    upload_future = _storage_executor.submit(_upload_to_storage, supabase, bucket, storage_path, data)
 
-    supabase.storage.from_(bucket).upload(
-        path=storage_path,
-        file=data,
-        file_options={"content-type": "application/pdf"},
-    )
-    file_url = supabase.storage.from_(bucket).get_public_url(storage_path)
+    try:
+        # ---- Parse ----
+        progress("parse")
+        t0 = time.perf_counter()
+        pages, parse_stats = extract_pages_with_limits(
+            data,
+            on_page=lambda done, total: progress("parse", pages_done=done, pages_total=total),
+        )
+        raw_text = sanitize_text("\n\n".join(t for _, t in pages)).strip()
 
-    # ---- Parse ----
-    pages = extract_text_by_page(tmp_path)
-    raw_text = sanitize_text("\n\n".join(t for _, t in pages)).strip()
+        # ---- Chunking (all pages, single list) ----
+        chunks = [
+            (page_number, chunk_index, sanitize_text(content))
+            for page_number, page_text in pages
+            for chunk_index, content in chunk_text(page_text)
+        ]
+        timings["parse"] = time.perf_counter() - t0
 
-    # ---- Embeddings (normalize ok for cosine) ----
-    global_vec = model.encode(raw_text or " ", normalize_embeddings=True).tolist()  # 384
+        # ---- Embeddings (normalize ok for cosine) ----
+        # numpy arrays go straight to the pgvector adapter, no .tolist() round-trip
+        progress("embed", chunks_done=0, chunks_total=len(chunks))
+        t0 = time.perf_counter()
+        chunk_vecs = encode_in_batches(
+            model,
+            [content or " " for _, _, content in chunks],
+            batch_size=embedding_batch_size(),
+            on_batch=lambda done, total: progress("embed", chunks_done=done, chunks_total=total),
+        )
 
-    cv_id = str(uuid.uuid4())
+        # Vettore globale: pooling dei chunk (copre tutto il CV, niente forward pass extra).
+        # "text" = vecchio comportamento, encode del raw_text (troncato dal modello).
+        pooling = cv_embedding_pooling()
+        if chunks and pooling != "text":
+            global_vec = pool_chunk_embeddings(chunk_vecs, [len(c) for _, _, c in chunks], pooling)
+        else:
+            global_vec = model.encode(raw_text or " ", normalize_embeddings=True)  # 384
+        timings["embed"] = time.perf_counter() - t0
 
-    # ---- Insert into Postgres (Supabase) ----
-    with transaction.atomic():
-        connection.ensure_connection()
-        register_vector(connection.connection)
+        # ---- Join upload: serve il file_url prima della write ----
+        progress("upload")
+        t0 = time.perf_counter()
+        file_url, timings["upload"] = upload_future.result()
+        timings["upload_wait"] = time.perf_counter() - t0
 
-        with connection.cursor() as cur:
-            # (Optional) ensure only 1 active CV per candidate
-            cur.execute(
-                'UPDATE "CVS" SET is_active = false WHERE candidate_id = %s',
-                [candidate_id],
-            )
+        cv_id = str(uuid.uuid4())
 
-            # Insert CVS (includes vector(384))
-            cur.execute(
-                """
-                INSERT INTO "CVS" (id, candidate_id, file_url, raw_text, embedding, is_active)
-                VALUES (%s, %s, %s, %s, %s, true)
-                """,
-                [cv_id, candidate_id, file_url, raw_text, global_vec],
-            )
+        # ---- Insert into Postgres (Supabase) ----
+        progress("store")
+        t0 = time.perf_counter()
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                # (Optional) ensure only 1 active CV per candidate
+                cur.execute(
+                    'UPDATE "CVS" SET is_active = false WHERE candidate_id = %s',
+                    [candidate_id],
+                )
 
-            total_chunks = 0
-            for page_number, page_text in pages:
-                for chunk_index, content in chunk_text(page_text):
-                    content = sanitize_text(content)
-                    vec = model.encode(content or " ", normalize_embeddings=True).tolist()
-                    chunk_id = str(uuid.uuid4())
+                # Insert CVS (includes vector(384))
+                cur.execute(
+                    """
+                    INSERT INTO "CVS"
+                    (id, candidate_id, file_url, raw_text, embedding, embedding_model, content_sha256, is_active)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, true)
+                    """,
+                    [cv_id, candidate_id, file_url, raw_text, global_vec, get_cv_model_id(model_name), content_sha256],
+                )
 
-                    cur.execute(
+                if chunks:
+                    cur.executemany(
                         """
-                        INSERT INTO "CV_CHUNKS" (id, cv_id, content, page_number, chunk_index, embedding)
-                        VALUES (%s, %s, %s, %s, %s, %s)
+                        INSERT INTO "CV_CHUNKS"
+                        (id, cv_id, content, page_number, chunk_index, embedding, embedding_model)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
                         """,
-                        [chunk_id, cv_id, content, page_number, chunk_index, vec],
+                        [
+                            [str(uuid.uuid4()), cv_id, content, page_number, chunk_index, vec, model_id]
+                            for (page_number, chunk_index, content), vec in zip(chunks, chunk_vecs)
+                        ],
                     )
-                    total_chunks += 1
+                total_chunks = len(chunks)
 
-    try:
-        os.remove(tmp_path)
+            # coverage vs tutte le JD nella stessa transazione del CV
+            refresh_coverage(cv_ids=[cv_id])
+        timings["store"] = time.perf_counter() - t0
     except Exception:
-        pass
+        # nessuna riga scritta: togliamo anche il PDF dallo storage se l'upload era riuscito
+        _discard_upload(upload_future, supabase, bucket, storage_path)
+        raise
+
+    timings["total"] = time.perf_counter() - started
 
     return {
         "cv_id": cv_id,
@@ -146,5 +458,12 @@ def process_and_store_cv(candidate_id: str, uploaded_file) -> dict:
         "pages": len(pages),
         "chunks": total_chunks,
         "embedding_dim": len(global_vec),
-        "model": model_name,
+        "model": model_id,
+        "pooling": pooling if chunks else "text",
+        "model_load_seconds": get_model_load_time(model_name),
+        "content_sha256": content_sha256,
+        "deduplicated": False,
+        "parse": parse_stats,
+        "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+        "warnings": parse_stats["warnings"],
     }
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+import numpy as np
+from django.db import DatabaseError
+
+from ..models import EmbeddingCacheEntry
+
+
+def normalize_text(text: str) -> str:
+    # spazi / a capo multipli non cambiano il significato: stessa chiave
+    return " ".join((text or "").split())
+
+
+def text_hash(normalized_text: str) -> str:
+    return hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache a due livelli per gli embedding di testi brevi (query, note, domande, JD):
+    1) LRU in-process limitata a max_entries
+    2) tabella EMBEDDING_CACHE condivisa tra i worker, solo per i testi che si ripetono
+       (persist=False per le note: testo libero mai ripetuto, riempirebbe la tabella);
+       manage.py prune_embedding_cache elimina le righe scadute
+    """
+
+    def __init__(self, max_entries: int, use_db: bool = True):
+        self.max_entries = max_entries
+        self.use_db = use_db
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+
+    def get_many(self, model_id: str, hashes: Iterable[str], persist: bool = True) -> Dict[str, np.ndarray]:
+        hashes = list(dict.fromkeys(hashes))
+        found = {}
+        with self._lock:
+            for h in hashes:
+                vec = self._lru.get((model_id, h))
+                if vec is not None:
+                    self._lru.move_to_end((model_id, h))
+                    found[h] = vec
+            self._stats["memory_hits"] += len(found)
+
+        missing = [h for h in hashes if h not in found]
+        if missing and self.use_db and persist:
+            try:
+                rows = list(
+                    EmbeddingCacheEntry.objects
+                    .filter(model_id=model_id, text_hash__in=missing)
+                    .values_list("text_hash", "embedding")
+                )
+            except DatabaseError:
+                rows = []  # la cache non deve mai far fallire la richiesta
+            db_found = {h: np.frombuffer(bytes(blob), dtype=np.float32) for h, blob in rows}
+            self._remember(model_id, db_found)
+            found.update(db_found)
+            with self._lock:
+                self._stats["db_hits"] += len(db_found)
+
+        with self._lock:
+            self._stats["misses"] += len(hashes) - len(found)
+        return found
+
+    def put_many(self, model_id: str, vectors: Dict[str, np.ndarray], persist: bool = True) -> None:
+        vectors = {h: np.asarray(v, dtype=np.float32) for h, v in vectors.items()}
+        self._remember(model_id, vectors)
+        if self.use_db and persist and vectors:
+            try:
+                EmbeddingCacheEntry.objects.bulk_create(
+                    [EmbeddingCacheEntry(model_id=model_id, text_hash=h, embedding=v.tobytes())
+                     for h, v in vectors.items()],
+                    ignore_conflicts=True,
+                )
+            except DatabaseError:
+                pass
+
+    def _remember(self, model_id: str, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for h, vec in vectors.items():
+                self._lru[(model_id, h)] = vec
+                self._lru.move_to_end((model_id, h))
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["db_hits"] + self._stats["misses"]
+            hits = lookups - self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._lru),
+                "max_entries": self.max_entries,
+                "db_tier": self.use_db,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    max_entries=max(1, int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))),
+                    use_db=os.environ.get("EMBEDDING_CACHE_DB", "True") == "True",
+                )
+    return _cache
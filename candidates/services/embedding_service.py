@@ -0,0 +1,191 @@
+import logging
+import os
+import threading
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+
+from .embedding_cache import get_embedding_cache, normalize_text, text_hash
+from .embedding_sidecar import SidecarUnavailable, get_sidecar_client
+from .micro_batching import get_micro_batch_encoder
+
+logger = logging.getLogger(__name__)
+
+# Un solo SentenceTransformer per (nome modello, backend), condiviso da views e pipeline
+_models = {}
+_load_times = {}
+_lock = threading.Lock()
+
+# torch: PyTorch fp32 (default)
+# onnx / onnx-int8: ONNX Runtime su CPU, richiede sentence-transformers[onnx]
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def get_model_name() -> str:
+    return os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+def get_backend() -> str:
+    backend = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f"EMBEDDING_BACKEND must be one of {BACKENDS}, got {backend!r}")
+    return backend
+
+
+def get_model_id(model_name: Optional[str] = None) -> str:
+    """
+    Id salvato in embedding_model accanto a ogni vettore: nome modello + revisione opzionale
+    (EMBEDDING_MODEL_REVISION). Vettori con id diversi non vanno mai confrontati.
+    Il backend non fa parte dell'id: onnx-int8 è intercambiabile con torch finché
+    passa il parity check di manage.py embedding_benchmark.
+    """
+    model_name = model_name or get_model_name()
+    revision = os.environ.get("EMBEDDING_MODEL_REVISION")
+    return f"{model_name}@{revision}" if revision else model_name
+
+
+POOLING_METHODS = ("mean", "weighted", "max", "text")
+
+
+def cv_embedding_pooling() -> str:
+    method = os.environ.get("CV_EMBEDDING_POOLING", "mean").lower()
+    if method not in POOLING_METHODS:
+        raise ValueError(f"CV_EMBEDDING_POOLING must be one of {POOLING_METHODS}, got {method!r}")
+    return method
+
+
+def get_cv_model_id(model_name: Optional[str] = None) -> str:
+    """
+    Id salvato in CVS.embedding_model: il vettore CV-level dipende anche da CV_EMBEDDING_POOLING.
+    text (encode del raw_text, come i vettori CV storici) resta l'id del modello; mean, weighted
+    e max diventano "<id>+<metodo>". Cambiando pooling i CV esistenti risultano di un altro
+    modello (409 / esclusi dal ranking) finché manage.py reembed non li ricalcola.
+    """
+    model_id = get_model_id(model_name)
+    pooling = cv_embedding_pooling()
+    return model_id if pooling == "text" else f"{model_id}+{pooling}"
+
+
+def embedding_model_conflict(*model_ids, cv_models: Iterable = ()) -> Optional[dict]:
+    """
+    Corpo dell'errore 409 se i vettori da confrontare non vengono tutti dal modello corrente.
+    cv_models: valori di CVS.embedding_model, confrontati con get_cv_model_id().
+    """
+    current = get_model_id()
+    cv_models = list(cv_models)
+    cv_current = get_cv_model_id() if cv_models else None
+    if all(m == current for m in model_ids) and all(m == cv_current for m in cv_models):
+        return None
+    conflict = {
+        "error": "Embeddings computed with a different model, run manage.py reembed",
+        "expected_model": current,
+        "found_models": sorted({m or "unknown" for m in [*model_ids, *cv_models]}),
+    }
+    if cv_models:
+        conflict["expected_cv_model"] = cv_current
+    return conflict
+
+
+def _load_model(model_name: str, backend: str):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    # EMBEDDING_ONNX_PATH: cartella prodotta da manage.py export_onnx_model (default: il modello sull'Hub)
+    source = os.environ.get("EMBEDDING_ONNX_PATH") or model_name
+    model_kwargs = {"provider": "CPUExecutionProvider"}
+    if backend == "onnx-int8":
+        model_kwargs["file_name"] = os.environ.get("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+    return SentenceTransformer(source, backend="onnx", model_kwargs=model_kwargs)
+
+
+def get_embedding_model(model_name: Optional[str] = None, backend: Optional[str] = None):
+    key = (model_name or get_model_name(), backend or get_backend())
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        # double-checked: un altro thread potrebbe averlo caricato nel frattempo
+        model = _models.get(key)
+        if model is None:
+            started = time.perf_counter()
+            model = _load_model(*key)
+            _load_times[key] = time.perf_counter() - started
+            _models[key] = model
+
+    return model
+
+
+def get_model_load_time(model_name: Optional[str] = None, backend: Optional[str] = None) -> Optional[float]:
+    """Secondi impiegati per caricare il modello (None se non ancora caricato)."""
+    return _load_times.get((model_name or get_model_name(), backend or get_backend()))
+
+
+class _SidecarEncoder:
+    """
+    Stessa interfaccia encode() di SentenceTransformer, ma l'encode avviene nel sidecar
+    (un solo modello in memoria per tutti i worker). Se il sidecar non risponde si
+    ricade sul modello in-process, caricato solo in quel momento.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def encode(self, sentences, batch_size: int = 32, normalize_embeddings: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        try:
+            vecs = self.client.encode(texts, expected_model_id=get_model_id())
+        except SidecarUnavailable as exc:
+            logger.warning("Embedding sidecar unavailable, encoding in-process: %s", exc)
+            vecs = get_embedding_model().encode(
+                texts, batch_size=batch_size, normalize_embeddings=normalize_embeddings, **kwargs,
+            )
+        return vecs[0] if single else vecs
+
+
+def get_encoder():
+    """Oggetto con encode(): sidecar se EMBEDDING_SIDECAR è impostato, altrimenti il modello locale."""
+    client = get_sidecar_client()
+    return _SidecarEncoder(client) if client is not None else get_embedding_model()
+
+
+def _encode_batch(texts: List[str], batch_size: Optional[int] = None) -> list:
+    return get_encoder().encode(texts, batch_size=batch_size or 32, normalize_embeddings=True)
+
+
+def encode_texts(texts: List[str], batch_size: Optional[int] = None, persist: bool = True) -> List[np.ndarray]:
+    """
+    Encode normalizzato (cosine) passando dalla cache (model_id, hash testo normalizzato):
+    solo i testi mai visti arrivano al modello, in un unico batch (micro-batching con le
+    altre richieste concorrenti se EMBEDDING_MICROBATCH=True).
+    persist=False: solo cache in memoria, niente tier DB (testi che non si ripetono, es. note).
+    """
+    model_id = get_model_id()
+    normalized = [normalize_text(t) or " " for t in texts]
+    hashes = [text_hash(t) for t in normalized]
+
+    cache = get_embedding_cache()
+    found = cache.get_many(model_id, hashes, persist=persist)
+
+    missing = {h: t for h, t in zip(hashes, normalized) if h not in found}
+    if missing:
+        batcher = get_micro_batch_encoder(_encode_batch)
+        if batcher is not None:
+            vecs = batcher.encode(list(missing.values()), batch_size)
+        else:
+            vecs = _encode_batch(list(missing.values()), batch_size)
+        computed = dict(zip(missing.keys(), vecs))
+        cache.put_many(model_id, computed, persist=persist)
+        found.update(computed)
+
+    return [found[h] for h in hashes]
+
+
+def encode_text(text: str, persist: bool = True) -> np.ndarray:
+    return encode_texts([text], persist=persist)[0]
@@ -0,0 +1,170 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Protocollo: ogni messaggio è [4 byte lunghezza header][header JSON][payload binario opzionale].
+# Richiesta:  {"op": "encode", "texts": [...]}        -> {"model_id", "count", "dim"} + float32 count*dim
+#             {"op": "ping"}                          -> {"model_id", "ready": true}
+# Errore:     {"error": "..."}
+_HEADER_LEN = struct.Struct("!I")
+
+
+class SidecarUnavailable(Exception):
+    pass
+
+
+def parse_address(address: str):
+    """'unix:/tmp/embedding.sock' oppure 'tcp:127.0.0.1:8765' (o solo 'host:porta')."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    if address.startswith("tcp:"):
+        address = address[len("tcp:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def send_message(sock: socket.socket, header: dict, payload: bytes = b"") -> None:
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER_LEN.pack(len(raw)) + raw + payload)
+
+
+def recv_message(sock: socket.socket, payload_size=None) -> Tuple[dict, bytes]:
+    (length,) = _HEADER_LEN.unpack(_recv_exact(sock, _HEADER_LEN.size))
+    header = json.loads(_recv_exact(sock, length))
+    size = payload_size(header) if payload_size else 0
+    return header, _recv_exact(sock, size) if size else b""
+
+
+# ---------------------------------------------------------------- client (lato Django)
+
+class SidecarClient:
+    """
+    Client sottile: una connessione persistente per thread.
+    Se il sidecar non risponde, per retry_after secondi non viene più interpellato
+    e il chiamante ricade sull'encode in-process.
+    """
+
+    def __init__(self, address: str, timeout: float = 10.0, retry_after: float = 30.0):
+        self.family, self.address = parse_address(address)
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def encode(self, texts: List[str], expected_model_id: str) -> np.ndarray:
+        if time.monotonic() < self._down_until:
+            raise SidecarUnavailable("sidecar marked down")
+        try:
+            sock = self._connect()
+            send_message(sock, {"op": "encode", "texts": texts})
+            header, payload = recv_message(
+                sock, lambda h: h.get("count", 0) * h.get("dim", 0) * 4,
+            )
+        except (OSError, ValueError) as exc:
+            self._close()
+            self._down_until = time.monotonic() + self.retry_after
+            raise SidecarUnavailable(str(exc)) from exc
+
+        if "error" in header:
+            raise SidecarUnavailable(header["error"])
+        if header["model_id"] != expected_model_id:
+            # vettori di un altro modello: non vanno mai mescolati con quelli salvati
+            raise SidecarUnavailable(f"sidecar serves {header['model_id']}, expected {expected_model_id}")
+        return np.frombuffer(payload, dtype=np.float32).reshape(header["count"], header["dim"])
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sidecar_client() -> Optional[SidecarClient]:
+    """None se EMBEDDING_SIDECAR non è configurato."""
+    global _client
+    address = os.environ.get("EMBEDDING_SIDECAR")
+    if not address:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SidecarClient(
+                    address,
+                    timeout=float(os.environ.get("EMBEDDING_SIDECAR_TIMEOUT", "10")),
+                )
+    return _client
+
+
+# ---------------------------------------------------------------- server (processo sidecar)
+
+def serve(address: str, encode_fn, model_id: str, log=print) -> None:
+    """Avvia il sidecar: encode_fn(texts) -> array (n, dim) di vettori normalizzati."""
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    header, _ = recv_message(self.request)
+                except (ConnectionError, OSError):
+                    return
+                try:
+                    if header.get("op") == "ping":
+                        send_message(self.request, {"model_id": model_id, "ready": True})
+                        continue
+                    vecs = np.asarray(encode_fn(header["texts"]), dtype=np.float32)
+                    send_message(
+                        self.request,
+                        {"model_id": model_id, "count": int(vecs.shape[0]), "dim": int(vecs.shape[1])},
+                        vecs.tobytes(),
+                    )
+                except Exception as exc:
+                    send_message(self.request, {"error": f"{type(exc).__name__}: {exc}"})
+
+    family, bind = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind):
+            os.remove(bind)
+        base = socketserver.ThreadingUnixStreamServer
+    else:
+        base = socketserver.ThreadingTCPServer
+
+    class Server(base):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    with Server(bind, Handler) as server:
+        log(f"Embedding sidecar ({model_id}) in ascolto su {address}")
+        server.serve_forever()
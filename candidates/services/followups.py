@@ -0,0 +1,85 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+
+from ..models import NoteFollowup
+from .embedding_service import get_model_id
+from .llm_service import stream_followup_question
+
+logger = logging.getLogger(__name__)
+
+# La nota viene confermata subito; la domanda di follow-up viene generata in background e
+# salvata in NOTE_FOLLOWUPS man mano che arrivano i token (al massimo ogni
+# FOLLOWUP_FLUSH_SECONDS). Il client fa polling su GET /api/sessions/<id>/followups/<note_id>/:
+# lo stato è nel DB, quindi funziona con più worker e nessuna richiesta resta appesa.
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, int(os.environ.get("FOLLOWUP_WORKERS", "4")))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="followup")
+    return _executor
+
+
+def flush_seconds() -> float:
+    return max(0.0, float(os.environ.get("FOLLOWUP_FLUSH_SECONDS", "0.3")))
+
+
+def submit_followup(session_id, note_id: str, note_text: str, note_vec, jd_text: str, risk_level: str) -> None:
+    """Registra il follow-up (stato running) e ne accoda la generazione per la nota appena salvata."""
+    NoteFollowup.objects.create(note_id=note_id, session_id=session_id, risk_level=risk_level)
+    _get_executor().submit(run_followup, str(session_id), note_id, note_text, note_vec, jd_text, risk_level)
+
+
+def _save(note_id: str, **fields) -> None:
+    NoteFollowup.objects.filter(note_id=note_id).update(**fields)
+
+
+def run_followup(session_id: str, note_id: str, note_text: str, note_vec, jd_text: str, risk_level: str) -> None:
+    try:
+        # chunk CV più vicini alla nota (contesto per LLM)
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT ch.content
+                FROM "CV_CHUNKS" ch
+                JOIN "CVS" cv ON cv.id = ch.cv_id
+                JOIN "INTERVIEW_SESSIONS" s ON s.candidate_id = cv.candidate_id
+                WHERE s.id = %s AND cv.is_active = true AND ch.embedding_model = %s
+                ORDER BY ch.embedding <=> %s::vector
+                LIMIT 3
+                """,
+                [session_id, get_model_id(), note_vec],
+            )
+            cv_chunks = [r[0] for r in cur.fetchall()]
+
+        parts = []
+        interval = flush_seconds()
+        last_flush = time.monotonic()
+        for token in stream_followup_question(
+            jd_text=jd_text,
+            note_text=note_text,
+            risk_level=risk_level,
+            cv_chunks=cv_chunks,
+        ):
+            parts.append(token)
+            # testo parziale nel DB a intervalli, non un UPDATE per token
+            if time.monotonic() - last_flush >= interval:
+                _save(note_id, question="".join(parts))
+                last_flush = time.monotonic()
+        _save(note_id, question="".join(parts).strip(), status=NoteFollowup.STATUS_COMPLETED)
+    except Exception as exc:
+        logger.exception("Follow-up della nota %s fallito", note_id)
+        _save(note_id, status=NoteFollowup.STATUS_FAILED, error=f"{type(exc).__name__}: {exc}")
+    finally:
+        # ogni thread del pool apre la sua connessione: chiudiamola a fine job
+        connections.close_all()
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import CVIngestionJob
+from .cv_pipeline import process_and_store_cv
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, int(os.environ.get("CV_INGEST_WORKERS", "2")))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cv-ingest")
+    return _executor
+
+
+def lease_seconds() -> float:
+    """Un job running senza heartbeat da più di CV_INGEST_LEASE_SECONDS è considerato orfano."""
+    return float(os.environ.get("CV_INGEST_LEASE_SECONDS", "600"))
+
+
+def _claimable() -> Q:
+    # queued, oppure running con heartbeat (updated_at) scaduto: il processo che lo eseguiva è morto
+    stale = timezone.now() - timedelta(seconds=lease_seconds())
+    return Q(status=CVIngestionJob.STATUS_QUEUED) | Q(status=CVIngestionJob.STATUS_RUNNING, updated_at__lt=stale)
+
+
+def resume_pending_jobs() -> int:
+    """
+    Rimette in coda i job rimasti queued o orfani dopo un riavvio, se abbiamo ancora il PDF.
+    Chiamato all'avvio di ogni processo server: con più worker ognuno prova, run_job fa il claim
+    atomico e solo uno lo esegue.
+    """
+    pending = list(
+        CVIngestionJob.objects.filter(_claimable(), file_data__isnull=False).values_list("id", flat=True)
+    )
+    for job_id in pending:
+        _get_executor().submit(run_job, job_id)
+    return len(pending)
+
+
+def start_job_resume() -> threading.Thread:
+    """Ripresa dei job in background: niente query al DB dentro AppConfig.ready()."""
+
+    def resume():
+        try:
+            count = resume_pending_jobs()
+            if count:
+                logger.info("Resumed %d CV ingestion jobs", count)
+        except Exception:
+            logger.exception("Could not resume CV ingestion jobs")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=resume, name="cv-ingest-resume", daemon=True)
+    thread.start()
+    return thread
+
+
+def submit_cv_job(candidate_id: str, data: bytes, file_name: str) -> CVIngestionJob:
+    """Salva il PDF nel job e lo accoda al pool di worker."""
+    job = CVIngestionJob.objects.create(
+        candidate_id=candidate_id,
+        file_name=file_name,
+        file_data=data,
+    )
+    _get_executor().submit(run_job, job.id)
+    return job
+
+
+def record_completed_job(candidate_id: str, file_name: str, result: dict) -> CVIngestionJob:
+    """Job già concluso (es. PDF duplicato riusato): stessa risposta e stesso polling di un upload normale."""
+    return CVIngestionJob.objects.create(
+        candidate_id=candidate_id,
+        file_name=file_name,
+        status=CVIngestionJob.STATUS_COMPLETED,
+        stage="done",
+        result=result,
+    )
+
+
+def _update(job_id, **fields) -> None:
+    CVIngestionJob.objects.filter(id=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def _claim(job_id) -> bool:
+    # UPDATE condizionale in un solo statement: se due processi provano insieme, uno solo vince
+    return CVIngestionJob.objects.filter(_claimable(), id=job_id).update(
+        status=CVIngestionJob.STATUS_RUNNING, stage="upload", updated_at=timezone.now(),
+    ) == 1
+
+
+def _heartbeat(job_id, stop: threading.Event) -> None:
+    # rinnova il lease anche durante gli stage lunghi senza progress (upload, embedding di un blocco)
+    try:
+        while not stop.wait(lease_seconds() / 3):
+            _update(job_id)
+    finally:
+        connections.close_all()
+
+
+def run_job(job_id) -> None:
+    if not _claim(job_id):
+        return  # già preso da un altro worker/processo
+
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, stop), name="cv-ingest-heartbeat", daemon=True).start()
+    try:
+        job = CVIngestionJob.objects.get(id=job_id)
+
+        def progress(stage, **counters):
+            _update(job_id, stage=stage, **counters)
+
+        result = process_and_store_cv(
+            candidate_id=str(job.candidate_id),
+            uploaded_file=job.file_data,
+            progress=progress,
+        )
+        _update(
+            job_id,
+            status=CVIngestionJob.STATUS_COMPLETED,
+            stage="done",
+            result=result,
+            file_data=None,
+        )
+    except Exception as exc:
+        logger.exception("CV ingestion job %s failed", job_id)
+        _update(
+            job_id,
+            status=CVIngestionJob.STATUS_FAILED,
+            error=f"{type(exc).__name__}: {exc}",
+            file_data=None,
+        )
+    finally:
+        stop.set()
+        # ogni thread del pool apre la sua connessione: chiudiamola a fine job
+        connections.close_all()
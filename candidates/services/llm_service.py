@@ -1,12 +1,24 @@
+import json
 import os
+from typing import Iterator
+
 from openai import OpenAI
 
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 
-def generate_followup_question(jd_text: str, note_text: str, risk_level: str, cv_chunks: list = None) -> str:
-    model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+FOLLOWUP_FALLBACKS = {
+    "HIGH": "Puoi descrivere un sistema che hai messo in produzione e come hai gestito un incidente critico?",
+    "MEDIUM": "Come garantiresti la qualità del codice in un team distribuito con CI/CD?",
+    "LOW": "Qual è la scelta architetturale di cui sei più soddisfatto negli ultimi 12 mesi?",
+}
+
+
+def _followup_fallback(risk_level: str) -> str:
+    return FOLLOWUP_FALLBACKS.get(risk_level, "Puoi raccontarmi un progetto tecnico complesso che hai gestito?")
 
+
+def _followup_messages(jd_text: str, note_text: str, risk_level: str, cv_chunks: list = None) -> list:
     chunks_context = ""
     if cv_chunks:
         chunks_context = "\n\nESTRATTI RILEVANTI DAL CV:\n" + "\n---\n".join(cv_chunks[:3])
@@ -34,21 +46,99 @@ def generate_followup_question(jd_text: str, note_text: str, risk_level: str, cv
     Rispondi SOLO con la domanda.
     """
 
+    return [
+        {"role": "system", "content": "Sei un intervistatore tecnico senior. Rispondi sempre e solo in italiano."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def generate_followup_question(jd_text: str, note_text: str, risk_level: str, cv_chunks: list = None) -> str:
+    model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+
     try:
         response = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": "Sei un intervistatore tecnico senior. Rispondi sempre e solo in italiano."},
-                {"role": "user", "content": prompt}
-            ],
+            messages=_followup_messages(jd_text, note_text, risk_level, cv_chunks),
             temperature=0.4,
             timeout=10,
         )
         return response.choices[0].message.content.strip()
     except Exception:
-        fallbacks = {
-            "HIGH": "Puoi descrivere un sistema che hai messo in produzione e come hai gestito un incidente critico?",
-            "MEDIUM": "Come garantiresti la qualità del codice in un team distribuito con CI/CD?",
-            "LOW": "Qual è la scelta architetturale di cui sei più soddisfatto negli ultimi 12 mesi?",
+        return _followup_fallback(risk_level)
+
+
+def stream_followup_question(jd_text: str, note_text: str, risk_level: str, cv_chunks: list = None) -> Iterator[str]:
+    """Come generate_followup_question, ma restituisce i token man mano che arrivano."""
+    model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+
+    sent = False
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=_followup_messages(jd_text, note_text, risk_level, cv_chunks),
+            temperature=0.4,
+            timeout=10,
+            stream=True,
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                sent = True
+                yield delta
+    except Exception:
+        # a stream iniziato non possiamo più sostituire la domanda: teniamo la parte già arrivata
+        if not sent:
+            yield _followup_fallback(risk_level)
+
+
+def generate_session_recap(jd_title: str, coverage_score: float, notes: list, asked: list, unasked: list) -> dict:
+    """Recap LLM di fine sessione (summary, strengths, gaps_or_risks, recommended_next_steps)."""
+    model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+
+    notes_text = "\n".join([f"- {n['note_text']}" for n in notes]) or "- (nessuna nota)"
+    asked_text = "\n".join([f"- {q['question_text']}" for q in asked]) or "- (nessuna)"
+    unasked_text = "\n".join([f"- {q['question_text']}" for q in unasked]) or "- (nessuna)"
+
+    recap_prompt = f"""
+SESSION RECAP REQUEST
+
+Job title: {jd_title}
+
+Coverage score: {coverage_score}%
+
+NOTES (timeline):
+{notes_text}
+
+QUESTIONS ASKED:
+{asked_text}
+
+QUESTIONS NOT ASKED:
+{unasked_text}
+
+Produce un recap in ITALIANO con questo formato JSON (solo JSON, niente testo extra):
+{{
+  "summary": "...",
+  "strengths": ["...", "...", "..."],
+  "gaps_or_risks": ["...", "...", "..."],
+  "recommended_next_steps": ["...", "..."]
+}}
+"""
+    resp = client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": "Sei un recruiter tecnico senior. Rispondi sempre e solo in italiano. Output solo JSON valido."},
+            {"role": "user", "content": recap_prompt},
+        ],
+        temperature=0.3,
+    )
+    llm_json = resp.choices[0].message.content.strip()
+
+    try:
+        return json.loads(llm_json)
+    except Exception:
+        return {
+            "summary": llm_json,
+            "strengths": [],
+            "gaps_or_risks": [],
+            "recommended_next_steps": []
         }
-        return fallbacks.get(risk_level, "Puoi raccontarmi un progetto tecnico complesso che hai gestito?")
@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class _Request:
+    __slots__ = ("texts", "batch_size", "future")
+
+    def __init__(self, texts: List[str], batch_size: Optional[int]):
+        self.texts = texts
+        self.batch_size = batch_size
+        self.future = Future()
+
+
+class MicroBatchEncoder:
+    """
+    Raccoglie le chiamate encode concorrenti (note, live suggest, search) e le esegue
+    in un unico forward pass da un solo thread dedicato; ogni chiamante riceve i suoi vettori.
+
+    Richieste che arrivano mentre il modello è occupato si accumulano da sole nel batch successivo.
+    L'attesa esplicita (max_wait_ms) scatta solo se il batch precedente aveva più di una
+    richiesta, cioè quando c'è davvero concorrenza: da idle la latenza non cambia.
+    Il forward pass usa il batch_size più piccolo tra quelli chiesti dai chiamanti; se fallisce,
+    le richieste vengono rieseguite una per una, così l'errore arriva solo a chi l'ha causato.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str], Optional[int]], list], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, timeout: Optional[float] = None):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._last_batch_requests = 1
+        self._stats = {"batches": 0, "requests": 0, "texts": 0, "max_batch_texts": 0, "fallbacks": 0}
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> List[np.ndarray]:
+        """Vettori di texts; TimeoutError se il thread del batcher non risponde entro timeout secondi."""
+        self._ensure_started()
+        request = _Request(list(texts), batch_size)
+        self._queue.put(request)
+        return request.future.result(timeout=self.timeout)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + (self.max_wait if self._last_batch_requests > 1 else 0.0)
+        while size < self.max_batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            self._last_batch_requests = len(batch)
+            texts = [t for request in batch for t in request.texts]
+            sizes = [r.batch_size for r in batch if r.batch_size]
+            try:
+                vectors = self.encode_fn(texts, min(sizes) if sizes else None)
+            except Exception as exc:
+                if len(batch) == 1:
+                    batch[0].future.set_exception(exc)
+                else:
+                    self._encode_one_by_one(batch)
+                continue
+
+            start = 0
+            for request in batch:
+                request.future.set_result(list(vectors[start:start + len(request.texts)]))
+                start += len(request.texts)
+
+            self._stats["batches"] += 1
+            self._stats["requests"] += len(batch)
+            self._stats["texts"] += len(texts)
+            self._stats["max_batch_texts"] = max(self._stats["max_batch_texts"], len(texts))
+
+    def _encode_one_by_one(self, batch: List[_Request]) -> None:
+        # un testo non valido non deve far fallire le altre richieste finite nello stesso batch
+        self._stats["fallbacks"] += 1
+        for request in batch:
+            try:
+                request.future.set_result(list(self.encode_fn(request.texts, request.batch_size)))
+            except Exception as exc:
+                request.future.set_exception(exc)
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["avg_requests_per_batch"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else None
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000
+        stats["timeout"] = self.timeout
+        return stats
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_micro_batch_encoder(encode_fn: Callable[[List[str], Optional[int]], list]) -> Optional[MicroBatchEncoder]:
+    """
+    Opt-in con EMBEDDING_MICROBATCH=True; altrimenti None e si encoda direttamente nel thread
+    chiamante. EMBEDDING_MICROBATCH_TIMEOUT: secondi massimi di attesa del chiamante.
+    """
+    global _encoder
+    if os.environ.get("EMBEDDING_MICROBATCH", "False") != "True":
+        return None
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = MicroBatchEncoder(
+                    encode_fn,
+                    max_batch_size=max(1, int(os.environ.get("EMBEDDING_MICROBATCH_MAX_SIZE", "64"))),
+                    max_wait_ms=float(os.environ.get("EMBEDDING_MICROBATCH_WAIT_MS", "5")),
+                    timeout=float(os.environ.get("EMBEDDING_MICROBATCH_TIMEOUT", "60")),
+                )
+    return _encoder
+
+
+def micro_batch_stats() -> Optional[dict]:
+    return _encoder.stats() if _encoder is not None else None
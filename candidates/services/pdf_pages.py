@@ -0,0 +1,31 @@
+import io
+
+import pdfplumber
+
+# Funzioni eseguite nei processi di parsing PDF (contesto forkserver/spawn): il modulo non importa
+# Django né i modelli, così il processo figlio può caricarlo senza django.setup().
+
+
+def sanitize_text(s: str) -> str:
+    if not s:
+        return ""
+    # PostgreSQL non accetta NUL (0x00) nelle stringhe
+    s = s.replace("\x00", "")
+    return s
+
+
+# PDF aperto una volta per processo del pool (initializer), così i task passano solo il numero di pagina
+_worker_pdf = None
+
+
+def init_page_worker(data: bytes) -> None:
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(io.BytesIO(data))
+
+
+def page_text(page) -> str:
+    return sanitize_text(page.extract_text() or "").strip()
+
+
+def extract_page(page_number: int) -> str:
+    return page_text(_worker_pdf.pages[page_number - 1])
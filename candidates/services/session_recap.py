@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+
+from ..models import SessionRecap
+from .coverage import get_coverage
+from .embedding_service import embedding_model_conflict, get_cv_model_id
+from .llm_service import generate_session_recap
+
+MAX_SESSION_LOCKS = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+_session_locks = OrderedDict()
+_session_locks_lock = threading.Lock()
+
+
+class RecapUnavailable(Exception):
+    """Recap non generabile (sessione/CV/JD mancanti, embedding non confrontabili)."""
+
+    def __init__(self, status: int, body: dict):
+        super().__init__(body.get("error"))
+        self.status = status
+        self.body = body
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = max(1, int(os.environ.get("RECAP_WORKERS", "2")))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session-recap")
+    return _executor
+
+
+def _session_lock(session_id: str) -> threading.Lock:
+    # un solo recap alla volta per sessione nel processo: niente completion OpenAI duplicate
+    # LRU limitata a MAX_SESSION_LOCKS: le sessioni vecchie escono dalla memoria
+    with _session_locks_lock:
+        lock = _session_locks.get(session_id)
+        if lock is None:
+            lock = _session_locks[session_id] = threading.Lock()
+            while len(_session_locks) > MAX_SESSION_LOCKS:
+                _session_locks.popitem(last=False)
+        _session_locks.move_to_end(session_id)
+        return lock
+
+
+def session_fingerprint(session_id) -> Optional[str]:
+    """
+    sha256 del contenuto che entra nel recap: stato della sessione, CV attivo e JD (con il loro
+    embedding_model), coverage CV×JD, note e domande (testo, autore, asked_at).
+    None se la sessione non esiste.
+    """
+    with connection.cursor() as cur:
+        # colonne castate a text: UNION di tipi diversi (uuid, timestamp, float)
+        cur.execute(
+            """
+            WITH s AS (
+                SELECT id, candidate_id, job_description_id, status, ended_at
+                FROM "INTERVIEW_SESSIONS"
+                WHERE id = %s
+            ),
+            active_cv AS (
+                SELECT cv.id, cv.embedding, cv.embedding_model
+                FROM "CVS" cv
+                JOIN s ON cv.candidate_id = s.candidate_id
+                WHERE cv.is_active = true
+                ORDER BY cv.created_at DESC NULLS LAST
+                LIMIT 1
+            )
+            SELECT 's', CAST(id AS text), status, CAST(ended_at AS text), NULL FROM s
+            UNION ALL
+            SELECT 'c', CAST(id AS text), embedding_model, NULL, NULL FROM active_cv
+            UNION ALL
+            SELECT 'j', CAST(jd.id AS text), jd.embedding_model, jd.title, NULL
+            FROM "JOB_DESCRIPTIONS" jd
+            JOIN s ON jd.id = s.job_description_id
+            UNION ALL
+            -- coverage come la legge get_coverage: riga salvata per il modello corrente,
+            -- altrimenti distanza al volo (stesso valore che poi viene salvato)
+            SELECT 'v', NULL, NULL, CAST(COALESCE(cov.distance, active_cv.embedding <=> jd.embedding) AS text), NULL
+            FROM s
+            JOIN "JOB_DESCRIPTIONS" jd ON jd.id = s.job_description_id
+            CROSS JOIN active_cv
+            LEFT JOIN "CV_JD_COVERAGE" cov
+              ON cov.cv_id = active_cv.id AND cov.jd_id = jd.id AND cov.model_version = %s
+            UNION ALL
+            SELECT 'n', CAST(id AS text), author, note_text, NULL FROM "INTERVIEW_NOTES" WHERE session_id = %s
+            UNION ALL
+            SELECT 'q', CAST(id AS text), asked_by, question_text, CAST(asked_at AS text)
+            FROM "INTERVIEW_QUESTIONS" WHERE session_id = %s
+            """,
+            [str(session_id), get_cv_model_id(), str(session_id), str(session_id)],
+        )
+        rows = [[None if v is None else str(v) for v in r] for r in cur.fetchall()]
+    if not any(r[0] == "s" for r in rows):
+        return None
+    rows.sort(key=lambda r: (r[0], r[1] or ""))
+    return hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()
+
+
+def build_recap(session_id) -> dict:
+    """Payload completo del recap: sessione, coverage + top chunk, note, domande, recap LLM."""
+    # 1) session + candidato + CV attivo + JD
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.candidate_id, s.job_description_id, s.status, s.started_at, s.ended_at,
+                   c.full_name,
+                   (SELECT cv.id FROM "CVS" cv
+                    WHERE cv.candidate_id = s.candidate_id AND cv.is_active = true
+                    ORDER BY cv.created_at DESC NULLS LAST
+                    LIMIT 1),
+                   jd.id, jd.title
+            FROM "INTERVIEW_SESSIONS" s
+            LEFT JOIN "CANDIDATI" c ON c.id = s.candidate_id
+            LEFT JOIN "JOB_DESCRIPTIONS" jd ON jd.id = s.job_description_id
+            WHERE s.id = %s
+            """,
+            [str(session_id)],
+        )
+        sess = cur.fetchone()
+    if not sess:
+        raise RecapUnavailable(404, {"error": "Session not found"})
+
+    candidate_id, jd_id, status, started_at, ended_at, candidate_name, cv_id, jd_found, jd_title = sess
+    candidate_name = candidate_name or "Sconosciuto"
+    if cv_id is None:
+        raise RecapUnavailable(404, {"error": "Active CV not found"})
+    if jd_found is None:
+        raise RecapUnavailable(404, {"error": "Job Description not found"})
+
+    # 2) Coverage (macro), precalcolata in CV_JD_COVERAGE
+    coverage = get_coverage(cv_id, jd_id)
+    if not coverage:
+        raise RecapUnavailable(400, {"error": "Missing embeddings for coverage"})
+
+    conflict = embedding_model_conflict(coverage["jd_model"], cv_models=[coverage["cv_model"]])
+    if conflict:
+        raise RecapUnavailable(409, conflict)
+
+    distance = float(coverage["distance"])
+    similarity = max(0.0, 1.0 - distance)
+    coverage_score = round(coverage["score"], 2)
+
+    with connection.cursor() as cur:
+        # 3) Coverage explain: top chunks CV vs JD
+        cur.execute(
+            """
+            SELECT ch.id, ch.content, ch.page_number, ch.chunk_index,
+                   (ch.embedding <=> jd.embedding) AS distance
+            FROM "CV_CHUNKS" ch
+            JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
+            WHERE ch.cv_id = %s AND ch.embedding_model = jd.embedding_model
+            ORDER BY ch.embedding <=> jd.embedding
+            LIMIT 5
+            """,
+            [str(jd_id), str(cv_id)],
+        )
+        chunk_rows = cur.fetchall()
+
+        # 4) Notes timeline
+        cur.execute(
+            """
+            SELECT author, note_text, created_at
+            FROM "INTERVIEW_NOTES"
+            WHERE session_id = %s
+            ORDER BY created_at ASC NULLS LAST
+            """,
+            [str(session_id)],
+        )
+        note_rows = cur.fetchall()
+
+        # 5) Questions asked / unasked (session-scoped)
+        cur.execute(
+            """
+            SELECT id, question_text, asked_at, asked_by, created_at
+            FROM "INTERVIEW_QUESTIONS"
+            WHERE session_id = %s
+            ORDER BY created_at ASC NULLS LAST
+            """,
+            [str(session_id)],
+        )
+        q_rows = cur.fetchall()
+
+    top_chunks = [
+        {
+            "chunk_id": r[0],
+            "content": r[1],
+            "page_number": r[2],
+            "chunk_index": r[3],
+            "distance": float(r[4]),
+        }
+        for r in chunk_rows
+    ]
+
+    notes = [
+        {"author": r[0], "note_text": r[1], "created_at": r[2]}
+        for r in note_rows
+    ]
+
+    asked = []
+    unasked = []
+    for r in q_rows:
+        item = {
+            "question_id": r[0],
+            "question_text": r[1],
+            "asked_at": r[2],
+            "asked_by": r[3],
+            "created_at": r[4],
+        }
+        (asked if r[2] is not None else unasked).append(item)
+
+    # 6) LLM recap (strengths/gaps/summary)
+    llm_recap = generate_session_recap(jd_title, coverage_score, notes, asked, unasked)
+
+    return {
+        "session": {
+            "session_id": str(session_id),
+            "status": status,
+            "started_at": started_at,
+            "ended_at": ended_at,
+            "candidate_id": str(candidate_id),
+            "cv_id": str(cv_id),
+            "job_description_id": str(jd_id),
+            "jd_title": jd_title,
+            "candidate_name": candidate_name,
+        },
+        "coverage": {
+            "distance": round(distance, 6),
+            "similarity": round(similarity, 6),
+            "coverage_score": coverage_score,
+            "top_chunks": top_chunks,
+        },
+        "notes": notes,
+        "questions": {
+            "asked": asked,
+            "unasked": unasked,
+        },
+        "llm_recap": llm_recap,
+    }
+
+
+def _fresh(recap: Optional[SessionRecap], fingerprint: str) -> bool:
+    return recap is not None and recap.status == SessionRecap.STATUS_COMPLETED and recap.fingerprint == fingerprint
+
+
+def get_or_build_recap(session_id) -> Tuple[SessionRecap, bool]:
+    """
+    Recap salvato se il fingerprint della sessione non è cambiato (cached=True),
+    altrimenti lo rigenera subito e lo salva. Solleva RecapUnavailable.
+    """
+    session_id = str(session_id)
+    fingerprint = session_fingerprint(session_id)
+    if fingerprint is None:
+        raise RecapUnavailable(404, {"error": "Session not found"})
+
+    recap = SessionRecap.objects.filter(session_id=session_id).first()
+    if _fresh(recap, fingerprint):
+        return recap, True
+
+    with _session_lock(session_id):
+        # intanto potrebbe averlo generato il job in background
+        recap = SessionRecap.objects.filter(session_id=session_id).first()
+        if _fresh(recap, fingerprint):
+            return recap, True
+        return _store(session_id, fingerprint, build_recap(session_id)), False
+
+
+def _store(session_id: str, fingerprint: str, payload: dict) -> SessionRecap:
+    # payload normalizzato come in lettura dal JSONField: stesso output cached e non
+    payload = json.loads(json.dumps(payload, cls=DjangoJSONEncoder))
+    recap, _ = SessionRecap.objects.update_or_create(
+        session_id=session_id,
+        defaults={
+            "fingerprint": fingerprint,
+            "status": SessionRecap.STATUS_COMPLETED,
+            "payload": payload,
+            "error": None,
+        },
+    )
+    return recap
+
+
+def submit_recap(session_id) -> None:
+    """Accoda la generazione del recap (chiamato da EndSessionView)."""
+    session_id = str(session_id)
+    recap, _ = SessionRecap.objects.get_or_create(session_id=session_id)
+    if recap.status != SessionRecap.STATUS_COMPLETED:
+        SessionRecap.objects.filter(pk=recap.pk).update(status=SessionRecap.STATUS_QUEUED, error=None)
+    _get_executor().submit(run_recap, session_id)
+
+
+def run_recap(session_id: str) -> None:
+    try:
+        with _session_lock(session_id):
+            fingerprint = session_fingerprint(session_id)
+            if fingerprint is None:
+                return
+            if _fresh(SessionRecap.objects.filter(session_id=session_id).first(), fingerprint):
+                return
+            SessionRecap.objects.filter(session_id=session_id).exclude(
+                status=SessionRecap.STATUS_COMPLETED
+            ).update(status=SessionRecap.STATUS_RUNNING)
+            _store(session_id, fingerprint, build_recap(session_id))
+    except Exception as exc:
+        traceback.print_exc()
+        error = exc.body.get("error") if isinstance(exc, RecapUnavailable) else f"{type(exc).__name__}: {exc}"
+        # un recap precedente resta leggibile; GET lo rigenera perché il fingerprint non combacia
+        SessionRecap.objects.filter(session_id=session_id).update(status=SessionRecap.STATUS_FAILED, error=error)
+    finally:
+        # ogni thread del pool apre la sua connessione: chiudiamola a fine job
+        connections.close_all()
@@ -0,0 +1,168 @@
+import os
+import weakref
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+# Indici HNSW (cosine) sulle colonne embedding delle tabelle managed=False
+VECTOR_TABLES = ["CV_CHUNKS", "CVS", "JOB_DESCRIPTIONS", "INTERVIEW_QUESTIONS", "INTERVIEW_NOTES"]
+
+# Parametri di build di default di pgvector: m=16, ef_construction=64
+DEFAULT_M = 16
+DEFAULT_EF_CONSTRUCTION = 64
+
+
+# Tipi di indice sulla colonna embedding:
+#   vector:  HNSW sul float32 completo (default)
+#   halfvec: HNSW su embedding::halfvec (metà memoria, richiede pgvector >= 0.7)
+#   binary:  HNSW su binary_quantize(embedding) con distanza di Hamming (1 bit per dimensione)
+# I due compatti sono indici su espressione: il float32 resta in tabella per il rerank esatto.
+INDEX_KINDS = ("vector", "halfvec", "binary")
+
+
+def embedding_dim() -> int:
+    return int(os.environ.get("EMBEDDING_DIM", "384"))
+
+
+def index_name(table: str, kind: str = "vector") -> str:
+    suffix = "hnsw" if kind == "vector" else f"{kind}_hnsw"
+    return f"{table.lower()}_embedding_{suffix}"
+
+
+def _index_expression(kind: str, dim: int) -> str:
+    if kind == "halfvec":
+        return f"(embedding::halfvec({dim})) halfvec_cosine_ops"
+    if kind == "binary":
+        return f"(binary_quantize(embedding)::bit({dim})) bit_hamming_ops"
+    return "embedding vector_cosine_ops"
+
+
+def create_index_sql(table: str, m: int = DEFAULT_M, ef_construction: int = DEFAULT_EF_CONSTRUCTION,
+                     concurrently: bool = True, kind: str = "vector") -> str:
+    return (
+        f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS "{index_name(table, kind)}" '
+        f'ON "{table}" USING hnsw ({_index_expression(kind, embedding_dim())}) '
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+    )
+
+
+def drop_index_sql(table: str, concurrently: bool = True, kind: str = "vector") -> str:
+    return f'DROP INDEX {"CONCURRENTLY " if concurrently else ""}IF EXISTS "{index_name(table, kind)}"'
+
+
+def compact_search_kind() -> Optional[str]:
+    """
+    VECTOR_COMPACT_SEARCH=halfvec|binary: le ricerche top-k (ricerca chunk su CV_CHUNKS, ranking
+    coverage su CVS) passano dall'indice compatto (creato con manage.py vector_indexes create
+    --kind ...) e poi rerank esatto in float32.
+    Solo su Postgres: il backend sqlite_vector fa già la ricerca esatta.
+    """
+    kind = os.environ.get("VECTOR_COMPACT_SEARCH", "").lower()
+    if kind not in ("halfvec", "binary") or connection.vendor != "postgresql":
+        return None
+    return kind
+
+
+def rerank_factor() -> int:
+    """Candidati grezzi presi dall'indice compatto per ogni risultato finale."""
+    return max(1, int(os.environ.get("VECTOR_RERANK_FACTOR", "4")))
+
+
+def coarse_order_by(kind: str, column: str = "embedding") -> str:
+    """ORDER BY della fase grezza, identico all'espressione dell'indice (un parametro: il vettore query)."""
+    dim = embedding_dim()
+    if kind == "halfvec":
+        return f"({column}::halfvec({dim})) <=> %s::halfvec({dim})"
+    if kind == "binary":
+        return f"(binary_quantize({column})::bit({dim})) <~> binary_quantize(%s::vector)::bit({dim})"
+    return f"{column} <=> %s::vector"
+
+
+def nearest_query(table: str, columns: str, where: str, where_params: list, query_vec,
+                  top_k: int, kind: Optional[str] = None, factor: Optional[int] = None) -> Tuple[str, list]:
+    """
+    (sql, params) per i top_k righe di table più vicine a query_vec, con colonna finale distance.
+    Con kind compatto (halfvec|binary): top_k * VECTOR_RERANK_FACTOR candidati dall'indice
+    compatto (o top_k * factor), poi rerank sulla distanza esatta in float32.
+    """
+    if kind is None:
+        sql = f"""
+            SELECT {columns}, embedding <=> %s::vector AS distance
+            FROM "{table}"
+            WHERE {where}
+            ORDER BY embedding <=> %s::vector
+            LIMIT %s
+        """
+        return sql, [query_vec] + list(where_params) + [query_vec, top_k]
+
+    sql = f"""
+        SELECT {columns}, embedding <=> %s::vector AS distance
+        FROM (
+            SELECT *
+            FROM "{table}"
+            WHERE {where}
+            ORDER BY {coarse_order_by(kind)}
+            LIMIT %s
+        ) coarse
+        ORDER BY embedding <=> %s::vector
+        LIMIT %s
+    """
+    return sql, [query_vec] + list(where_params) + [query_vec, top_k * (factor or rerank_factor()), query_vec, top_k]
+
+
+# connessioni fisiche già registrate: con il pool di psycopg 3 connection_created scatta
+# a ogni checkout, ma la registrazione (una query sul tipo vector) serve una volta sola
+_registered_connections = weakref.WeakSet()
+
+
+def register_vector_types(sender, connection, **kwargs) -> None:
+    """
+    Receiver di connection_created: tipo vector <-> numpy sulla connessione appena aperta.
+    Sul backend sqlite_vector adapter e converter sono già registrati a livello di modulo.
+    """
+    if connection.vendor != "postgresql":
+        return
+    raw = connection.connection
+    if raw in _registered_connections:
+        return
+    if is_psycopg3:
+        from pgvector.psycopg import register_vector
+    else:
+        from pgvector.psycopg2 import register_vector
+    register_vector(raw)
+    _registered_connections.add(raw)
+
+
+def default_ef_search() -> int:
+    """Candidati esplorati per query HNSW (default pgvector: 40). Più alto = recall migliore, più lento."""
+    return int(os.environ.get("HNSW_EF_SEARCH", "40"))
+
+
+@contextmanager
+def ann_cursor(ef_search: Optional[int] = None, iterative_scan: Optional[str] = None):
+    """
+    Cursore per query ORDER BY embedding <=> ...: imposta hnsw.ef_search solo per questa
+    transazione (set_config locale), così il valore non resta sulla connessione.
+    HNSW_ITERATIVE_SCAN (pgvector >= 0.8, es. relaxed_order) evita risultati troncati
+    quando la query ha filtri WHERE oltre all'ordinamento per distanza; iterative_scan lo
+    sovrascrive per la singola query (es. strict_order per la paginazione keyset).
+    Senza nulla da impostare è un cursore normale: nessun round trip in più.
+    """
+    settings = []
+    if ef_search or "HNSW_EF_SEARCH" in os.environ:
+        settings.append(("hnsw.ef_search", str(ef_search or default_ef_search())))
+    iterative_scan = iterative_scan or os.environ.get("HNSW_ITERATIVE_SCAN")
+    if iterative_scan:
+        settings.append(("hnsw.iterative_scan", iterative_scan))
+
+    if not settings:
+        with connection.cursor() as cur:
+            yield cur
+        return
+
+    with transaction.atomic(), connection.cursor() as cur:
+        for name, value in settings:
+            cur.execute("SELECT set_config(%s, %s, true)", [name, value])
+        yield cur
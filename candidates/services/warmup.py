@@ -0,0 +1,161 @@
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Stato del warm-up di questo processo, letto da /healthz/ready. pid: processo che ha avviato il
+# thread; dopo un fork (gunicorn --preload) il thread non esiste più nel figlio e va riavviato.
+_state = {"enabled": False, "ready": False, "started_at": None, "timings": {}, "error": None, "warnings": []}
+_lock = threading.Lock()
+_thread = None
+_pid = None
+
+MAX_RETRY_DELAY = 30.0
+
+
+def preload_enabled() -> bool:
+    return os.environ.get("APP_PRELOAD", "False") == "True"
+
+
+def defer_startup() -> bool:
+    """
+    APP_DEFER_STARTUP=True (impostato da gunicorn.conf.py): AppConfig.ready() non avvia thread,
+    li avvia l'hook post_worker_init in ogni worker. Con --preload l'app è importata nel master
+    e i thread avviati lì non sopravvivono al fork.
+    """
+    return os.environ.get("APP_DEFER_STARTUP", "False") == "True"
+
+
+def is_server_process() -> bool:
+    """Processo che serve richieste: no migrate, shell, test, ecc. né il padre dell'autoreloader di runserver."""
+    if not sys.argv or not sys.argv[0].endswith("manage.py"):
+        return True  # gunicorn / uwsgi / daphne
+    if len(sys.argv) < 2 or sys.argv[1] != "runserver":
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
+def _step(name: str, fn) -> None:
+    t0 = time.perf_counter()
+    fn()
+    _state["timings"][name] = round(time.perf_counter() - t0, 3)
+
+
+def _step_with_retry(name: str, fn) -> None:
+    """WARMUP_RETRIES tentativi con backoff esponenziale (WARMUP_RETRY_BACKOFF, max 30s): DB o sidecar ancora in avvio."""
+    attempts = max(1, int(os.environ.get("WARMUP_RETRIES", "5")))
+    delay = float(os.environ.get("WARMUP_RETRY_BACKOFF", "1"))
+    for attempt in range(1, attempts + 1):
+        try:
+            _step(name, fn)
+            return
+        except Exception as exc:
+            if attempt == attempts:
+                raise
+            wait = min(delay * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+            logger.warning("Warm-up %s fallito (tentativo %d/%d), riprovo tra %.1fs: %s", name, attempt, attempts, wait, exc)
+            time.sleep(wait)
+
+
+def _load_model():
+    from .embedding_service import get_encoder
+
+    # get_encoder(): con EMBEDDING_SIDECAR il warm-up verifica il sidecar invece di caricare il modello qui
+    get_encoder().encode(["warm-up"], normalize_embeddings=True)
+
+
+def _check_db_reachable():
+    # le connessioni Django sono per thread: quella del warm-up non verrebbe riusata dalle
+    # richieste, quindi si verifica solo raggiungibilità e TLS e poi si chiude
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT 1")
+    finally:
+        connection.close()
+
+
+def _open_openai():
+    from .llm_service import client
+
+    # apre il pool HTTP del client condiviso, riusato dalle chiamate successive
+    client.models.retrieve(os.environ.get("OPENAI_MODEL", "gpt-4o-mini"))
+
+
+def run_warmup() -> None:
+    started = time.perf_counter()
+    _state.update(error=None, warnings=[], timings={})
+    try:
+        _step_with_retry("embedding_model", _load_model)
+        _step_with_retry("database", _check_db_reachable)
+    except Exception as exc:
+        logger.exception("Warm-up fallito")
+        _state["error"] = f"{type(exc).__name__}: {exc}"
+
+    # OpenAI giù non deve togliere il nodo dal load balancer: embedding e ricerca funzionano comunque
+    try:
+        _step("openai", _open_openai)
+    except Exception as exc:
+        _state["warnings"].append(f"openai: {type(exc).__name__}: {exc}")
+    _state["timings"]["total"] = round(time.perf_counter() - started, 3)
+    _state["ready"] = _state["error"] is None
+
+
+def _start_thread() -> threading.Thread:
+    # chiamata con _lock acquisito
+    global _thread, _pid
+    _state.update(ready=False, started_at=time.time())
+    _thread = threading.Thread(target=run_warmup, name="app-warmup", daemon=True)
+    _pid = os.getpid()
+    _thread.start()
+    return _thread
+
+
+def _forked() -> bool:
+    return _pid is not None and _pid != os.getpid()
+
+
+def start_warmup() -> Optional[threading.Thread]:
+    """Avvia il warm-up in background (una sola volta per processo) se APP_PRELOAD=True."""
+    if not preload_enabled() or not is_server_process():
+        return None
+    with _lock:
+        if _state["enabled"] and not _forked():
+            return None
+        _state["enabled"] = True
+        return _start_thread()
+
+
+def start_background_services() -> None:
+    """Thread di processo: warm-up e ripresa dei job di ingestione (AppConfig.ready o post_worker_init)."""
+    from .ingestion_jobs import start_job_resume
+
+    # APP_PRELOAD=True: modello, DB e client OpenAI scaldati al boot invece che alla prima richiesta
+    start_warmup()
+    # job di ingestione rimasti in coda prima del riavvio: ripartono subito, non al prossimo upload
+    if is_server_process():
+        start_job_resume()
+
+
+def readiness() -> dict:
+    """
+    Senza preload il processo è sempre pronto: il modello si carica alla prima richiesta.
+    Se il warm-up è fallito, o il processo è un figlio forkato dopo l'avvio del thread,
+    il probe lo rilancia in background e risponde non pronto finché non riesce.
+    """
+    if _state["enabled"]:
+        with _lock:
+            if _forked() or (not _state["ready"] and not _thread.is_alive()):
+                _start_thread()
+    return {
+        "ready": _state["ready"] or not _state["enabled"],
+        "preload": _state["enabled"],
+        "timings": dict(_state["timings"]),
+        "error": _state["error"],
+        "warnings": list(_state["warnings"]),
+    }
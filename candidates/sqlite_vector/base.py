@@ -0,0 +1,119 @@
+"""
+Backend SQLite per sviluppo locale e CI, senza Supabase/pgvector.
+
+I vettori sono salvati come blob float32 (colonne dichiarate "vector") e la distanza
+coseno è calcolata in NumPy: ricerca brute force, stesso ordinamento di pgvector.
+Le query raw delle views restano scritte per Postgres; qui vengono adattate:
+  a <=> b        -> cosine_distance(a, b)
+  %s::vector     -> %s          (cast rimossi)
+  now(), GREATEST, set_config   registrate come funzioni SQL
+  AVG            su colonne vector fa la media elemento per elemento (come pgvector)
+Attivazione: DATABASE_BACKEND=sqlite (vedi settings.py).
+"""
+import re
+import sqlite3
+import uuid
+
+import numpy as np
+from django.db.backends.sqlite3 import base as sqlite_base
+from django.db.backends.sqlite3.features import DatabaseFeatures as SQLiteDatabaseFeatures
+from django.utils import timezone
+
+_CAST_RE = re.compile(r"::\w+(\[\])?")
+_OPERAND = r"\(SELECT\s+[\w.\"]+\s+FROM\s+[\w\"]+\)|\(%s\)|%s|[\w.\"]+"
+_COSINE_RE = re.compile(rf"(?P<a>{_OPERAND})\s*<=>\s*(?P<b>{_OPERAND})")
+
+
+def vector_to_blob(vec) -> bytes:
+    return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+def blob_to_vector(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+# uuid come testo con trattini (come Postgres li restituisce nelle query raw), vettori come float32
+sqlite3.register_adapter(uuid.UUID, str)
+sqlite3.register_adapter(np.ndarray, vector_to_blob)
+sqlite3.register_converter("vector", blob_to_vector)
+
+
+def cosine_distance(a, b):
+    """Stessa semantica dell'operatore <=> di pgvector: 1 - cos(a, b), NULL se manca un vettore."""
+    if a is None or b is None:
+        return None
+    a = np.frombuffer(a, dtype=np.float32).astype(np.float64)
+    b = np.frombuffer(b, dtype=np.float32).astype(np.float64)
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    if norm == 0:
+        return None
+    return float(1.0 - np.dot(a, b) / norm)
+
+
+class _Avg:
+    """AVG di SQLite esteso ai blob vector: media elemento per elemento, come avg(vector) di pgvector."""
+
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(value)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        if isinstance(self.values[0], bytes):
+            return vector_to_blob(np.mean([blob_to_vector(v) for v in self.values], axis=0))
+        return sum(float(v) for v in self.values) / len(self.values)
+
+
+def _now():
+    # stesso formato con cui Django salva i DateTimeField su SQLite (UTC, naive)
+    return str(timezone.now().replace(tzinfo=None))
+
+
+def _greatest(*values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _set_config(name, value, is_local):
+    # hnsw.ef_search & co.: senza indice ANN non c'è niente da configurare
+    return value
+
+
+def translate_query(query: str) -> str:
+    query = _CAST_RE.sub("", query)
+    return _COSINE_RE.sub(lambda m: f"cosine_distance({m['a']}, {m['b']})", query)
+
+
+class DatabaseFeatures(SQLiteDatabaseFeatures):
+    # UUIDField salvati come "xxxxxxxx-xxxx-..." e non hex: le query raw passano str(uuid)
+    has_native_uuid_field = True
+
+
+class VectorCursorWrapper(sqlite_base.SQLiteCursorWrapper):
+    def execute(self, query, params=None):
+        return super().execute(translate_query(query), params)
+
+    def executemany(self, query, param_list):
+        return super().executemany(translate_query(query), param_list)
+
+
+class DatabaseWrapper(sqlite_base.DatabaseWrapper):
+    vendor = "sqlite"
+    display_name = "SQLite (vector)"
+    features_class = DatabaseFeatures
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        conn.create_function("cosine_distance", 2, cosine_distance, deterministic=True)
+        conn.create_function("now", 0, _now)
+        conn.create_function("greatest", -1, _greatest, deterministic=True)
+        conn.create_function("set_config", 3, _set_config)
+        conn.create_aggregate("avg", 1, _Avg)
+        return conn
+
+    def create_cursor(self, name=None):
+        return self.connection.cursor(factory=VectorCursorWrapper)
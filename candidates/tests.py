@@ -1,3 +1,967 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import time
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .models import CVIngestionJob, EmbeddingCacheEntry, NoteFollowup, ReembedCheckpoint
+from .services import cv_pipeline, embedding_service, ingestion_jobs, session_recap, warmup
+from .services.embedding_cache import EmbeddingCache, text_hash
+from .services.embedding_service import get_cv_model_id, get_model_id
+from .services.micro_batching import MicroBatchEncoder, get_micro_batch_encoder
+from .services.pdf_pages import extract_page
+
+
+def fake_vector(text):
+    rng = np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16))
+    vec = rng.normal(size=384).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def cosine_distance(a, b):
+    return 1.0 - float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+# Le tabelle managed=False esistono nel DB di test solo sul backend sqlite_vector (migration 0006):
+# DATABASE_BACKEND=sqlite python manage.py test candidates
+@skipUnless(connection.vendor == "sqlite", "richiede DATABASE_BACKEND=sqlite")
+class SessionTestCase(TestCase):
+
+    def setUp(self):
+        self.model_id = get_model_id()
+        self.cv_model_id = get_cv_model_id()
+        self.candidate_id = str(uuid.uuid4())
+        self.cv_id = str(uuid.uuid4())
+        self.jd_id = str(uuid.uuid4())
+        self.session_id = str(uuid.uuid4())
+        self.chunks = [f"chunk {i}" for i in range(20)]
+
+        with connection.cursor() as cur:
+            cur.execute('INSERT INTO "CANDIDATI" (id, full_name) VALUES (%s, %s)', [self.candidate_id, "Mario"])
+            cur.execute(
+                'INSERT INTO "CVS" (id, candidate_id, file_url, raw_text, embedding, embedding_model, is_active) '
+                "VALUES (%s, %s, %s, %s, %s, %s, true)",
+                [self.cv_id, self.candidate_id, "cv.pdf", "raw", fake_vector("raw"), self.cv_model_id],
+            )
+            cur.executemany(
+                'INSERT INTO "CV_CHUNKS" (id, cv_id, content, page_number, chunk_index, embedding, embedding_model) '
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [
+                    [str(uuid.uuid4()), self.cv_id, text, 1, i, fake_vector(text), self.model_id]
+                    for i, text in enumerate(self.chunks)
+                ],
+            )
+            cur.execute(
+                'INSERT INTO "JOB_DESCRIPTIONS" (id, title, description_text, embedding, embedding_model) '
+                "VALUES (%s, %s, %s, %s, %s)",
+                [self.jd_id, "Dev", "Python Django", fake_vector("Python Django"), self.model_id],
+            )
+            cur.execute(
+                'INSERT INTO "INTERVIEW_SESSIONS" (id, candidate_id, job_description_id, status) '
+                "VALUES (%s, %s, %s, 'live')",
+                [self.session_id, self.candidate_id, self.jd_id],
+            )
+
+    def _add_note(self, text, created_at):
+        with connection.cursor() as cur:
+            cur.execute(
+                'INSERT INTO "INTERVIEW_NOTES" (id, session_id, note_text, embedding, embedding_model, created_at) '
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [str(uuid.uuid4()), self.session_id, text, fake_vector(text), self.model_id, created_at],
+            )
+
+    def _add_question(self, text, session_id=None, job_description_id=None):
+        with connection.cursor() as cur:
+            cur.execute(
+                'INSERT INTO "INTERVIEW_QUESTIONS" (id, session_id, job_description_id, question_text, '
+                "embedding, embedding_model) VALUES (%s, %s, %s, %s, %s, %s)",
+                [str(uuid.uuid4()), session_id, job_description_id, text, fake_vector(text), self.model_id],
+            )
+
+
+
+@mock.patch("candidates.views.generate_followup_question", return_value="Domanda?")
+class NextBestQuestionViewTests(SessionTestCase):
+
+    def _post(self, **body):
+        return self.client.post(
+            f"/api/sessions/{self.session_id}/next-question/", body, content_type="application/json"
+        )
+
+    def test_retrieval_is_a_single_query(self, _generate):
+        self._add_note("sa docker", "2026-01-01 10:00:00")
+        self._add_note("usa kubernetes", "2026-01-01 10:05:00")
+        self._add_question("Docker in produzione?", session_id=self.session_id)
+        self._add_question("Esperienza con Django?", job_description_id=self.jd_id)
+
+        with self.assertNumQueries(1):
+            response = self._post(top_k_chunks=3)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["context_notes"], ["sa docker", "usa kubernetes"])
+        # domande della sessione prima del fallback sulla JD
+        self.assertEqual(
+            [q["question_text"] for q in data["suggested_preloaded_questions"]], ["Docker in produzione?"]
+        )
+
+        # contesto = media delle note, distanze come nel calcolo esatto
+        context = np.mean([fake_vector("sa docker"), fake_vector("usa kubernetes")], axis=0)
+        jd_distance = cosine_distance(context, fake_vector("Python Django"))
+        self.assertAlmostEqual(data["jd_similarity"], round(max(0.0, 1.0 - jd_distance), 4), places=4)
+        question_distance = cosine_distance(context, fake_vector("Docker in produzione?"))
+        self.assertAlmostEqual(data["suggested_preloaded_questions"][0]["distance"], question_distance, places=5)
+
+    def test_falls_back_to_job_description_questions(self, _generate):
+        self._add_question("Esperienza con Django?", job_description_id=self.jd_id)
+        self._add_question("Testing con pytest?", job_description_id=self.jd_id)
+
+        with self.assertNumQueries(1):
+            response = self._post()
+
+        data = response.json()
+        # senza note il contesto è la JD stessa
+        self.assertEqual(data["jd_similarity"], 1.0)
+        context = fake_vector("Python Django")
+        expected = sorted(
+            ["Esperienza con Django?", "Testing con pytest?"],
+            key=lambda text: cosine_distance(context, fake_vector(text)),
+        )
+        self.assertEqual([q["question_text"] for q in data["suggested_preloaded_questions"]], expected)
+
+    def test_job_description_without_embedding_is_encoded(self, _generate):
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "JOB_DESCRIPTIONS" SET embedding = NULL WHERE id = %s', [self.jd_id])
+
+        # secondo statement solo per il contesto calcolato al volo dal testo JD
+        with mock.patch("candidates.views.encode_text", side_effect=fake_vector) as encode, \
+                self.assertNumQueries(2):
+            response = self._post()
+
+        encode.assert_called_once_with("Python Django")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["risk_level"], "HIGH")
+
+    def test_unknown_session(self, _generate):
+        self.session_id = str(uuid.uuid4())
+        self.assertEqual(self._post().status_code, 404)
+
+
+RECAP = {"summary": "Ok", "strengths": [], "gaps_or_risks": [], "recommended_next_steps": []}
+
+
+@mock.patch("candidates.services.session_recap.generate_session_recap", return_value=RECAP)
+class SessionRecapViewTests(SessionTestCase):
+
+    def _get(self):
+        return self.client.get(f"/api/sessions/{self.session_id}/recap/")
+
+    def test_recap_is_stored_and_reused(self, generate):
+        self._add_note("sa docker", "2026-01-01 10:00:00")
+
+        first = self._get().json()
+        self.assertFalse(first["recap_meta"]["cached"])
+        self.assertEqual(first["llm_recap"], RECAP)
+
+        # fingerprint + lettura del recap salvato, nessuna completion
+        with self.assertNumQueries(2):
+            second = self._get().json()
+        self.assertTrue(second["recap_meta"]["cached"])
+        self.assertEqual({k: v for k, v in second.items() if k != "recap_meta"},
+                         {k: v for k, v in first.items() if k != "recap_meta"})
+        self.assertEqual(generate.call_count, 1)
+
+    def test_recap_regenerated_when_notes_change(self, generate):
+        self._get()
+        self._add_note("usa kubernetes", "2026-01-01 10:05:00")
+
+        data = self._get().json()
+        self.assertFalse(data["recap_meta"]["cached"])
+        self.assertEqual([n["note_text"] for n in data["notes"]], ["usa kubernetes"])
+        self.assertEqual(generate.call_count, 2)
+
+    def test_end_session_queues_recap(self, generate):
+        self.assertEqual(self._get().json()["session"]["status"], "live")
+        with mock.patch("candidates.views.submit_recap") as submit:
+            response = self.client.post(f"/api/sessions/{self.session_id}/end/", {}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        submit.assert_called_once()
+
+        # stato cambiato: il recap di una sessione live non vale per quella chiusa
+        data = self._get().json()
+        self.assertFalse(data["recap_meta"]["cached"])
+        self.assertEqual(data["session"]["status"], "completed")
+
+    def test_recap_regenerated_when_active_cv_changes(self, generate):
+        self._get()
+        new_cv_id = str(uuid.uuid4())
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "CVS" SET is_active = false WHERE id = %s', [self.cv_id])
+            cur.execute(
+                'INSERT INTO "CVS" (id, candidate_id, file_url, raw_text, embedding, embedding_model, is_active) '
+                "VALUES (%s, %s, %s, %s, %s, %s, true)",
+                [new_cv_id, self.candidate_id, "cv2.pdf", "raw 2", fake_vector("raw 2"), self.cv_model_id],
+            )
+
+        data = self._get().json()
+        self.assertFalse(data["recap_meta"]["cached"])
+        self.assertEqual(data["session"]["cv_id"], new_cv_id)
+
+    def test_recap_regenerated_when_job_description_changes(self, generate):
+        first = self._get().json()
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "JOB_DESCRIPTIONS" SET embedding = %s WHERE id = %s',
+                        [fake_vector("Go Kubernetes"), self.jd_id])
+            cur.execute('DELETE FROM "CV_JD_COVERAGE" WHERE jd_id = %s', [self.jd_id])
+
+        data = self._get().json()
+        self.assertFalse(data["recap_meta"]["cached"])
+        self.assertNotEqual(data["coverage"]["distance"], first["coverage"]["distance"])
+        # coverage ricalcolata e salvata durante il build: il fingerprint resta lo stesso
+        self.assertTrue(self._get().json()["recap_meta"]["cached"])
+
+    def test_session_locks_are_bounded(self, generate):
+        with mock.patch.object(session_recap, "MAX_SESSION_LOCKS", 3), \
+                mock.patch.object(session_recap, "_session_locks", session_recap.OrderedDict()):
+            first = session_recap._session_lock("a")
+            for key in "bcd":
+                session_recap._session_lock(key)
+            self.assertEqual(list(session_recap._session_locks), ["b", "c", "d"])
+            self.assertIsNot(session_recap._session_lock("a"), first)
+
+
+class CVUploadDedupTests(SessionTestCase):
+
+    def _upload(self, data):
+        return self.client.post("/api/cvs/upload/", {
+            "candidate_id": self.candidate_id,
+            "file": SimpleUploadedFile("cv.pdf", data, content_type="application/pdf"),
+        })
+
+    def test_duplicate_upload_returns_completed_job(self):
+        data = b"%PDF-1.4 stesso cv"
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "CVS" SET content_sha256 = %s, is_active = false WHERE id = %s',
+                        [hashlib.sha256(data).hexdigest(), self.cv_id])
+
+        with mock.patch("candidates.views.submit_cv_job") as submit:
+            response = self._upload(data)
+        submit.assert_not_called()
+
+        # stesso formato dell'upload asincrono: il client segue status_url come sempre
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["status"], "completed")
+        self.assertTrue(body["status_url"].endswith(f"/api/cvs/jobs/{body['job_id']}/"))
+        self.assertEqual(body["result"]["cv_id"], self.cv_id)
+        self.assertTrue(body["result"]["deduplicated"])
+
+        job = self.client.get(body["status_url"]).json()
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["result"]["cv_id"], self.cv_id)
+        with connection.cursor() as cur:
+            cur.execute('SELECT is_active FROM "CVS" WHERE id = %s', [self.cv_id])
+            self.assertTrue(cur.fetchone()[0])
+
+    def test_new_upload_is_queued(self):
+        with mock.patch("candidates.views.submit_cv_job") as submit:
+            submit.return_value = CVIngestionJob.objects.create(candidate_id=self.candidate_id, file_name="cv.pdf")
+            response = self._upload(b"%PDF-1.4 nuovo cv")
+
+        submit.assert_called_once()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "queued")
+        self.assertIsNone(response.json()["result"])
+
+
+class CoverageRankPaginationTests(SessionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cv_ids = [self.cv_id]
+        with connection.cursor() as cur:
+            for i in range(11):
+                candidate_id, cv_id = str(uuid.uuid4()), str(uuid.uuid4())
+                cur.execute('INSERT INTO "CANDIDATI" (id, full_name) VALUES (%s, %s)', [candidate_id, f"C{i}"])
+                cur.execute(
+                    'INSERT INTO "CVS" (id, candidate_id, file_url, raw_text, embedding, embedding_model, is_active) '
+                    "VALUES (%s, %s, %s, %s, %s, %s, true)",
+                    # due CV con lo stesso embedding: pareggio sulla distanza risolto da cv_id
+                    [cv_id, candidate_id, "cv.pdf", "raw", fake_vector(f"cv {i % 10}"), self.cv_model_id],
+                )
+                self.cv_ids.append(cv_id)
+
+    def _pages(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            body = {"job_description_id": self.jd_id, "limit": 5, "evidence_k": 0}
+            if cursor:
+                body["cursor"] = cursor
+            response = self.client.post("/api/coverage/rank/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages += 1
+            seen += [(r["distance"], r["cv_id"]) for r in data["results"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        return seen, pages
+
+    def _assert_pages(self, seen, pages):
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(cv_id for _, cv_id in seen), sorted(self.cv_ids))
+        self.assertEqual(seen, sorted(seen))
+
+    def test_pages_cover_every_cv_once_in_order(self):
+        self._assert_pages(*self._pages())
+
+    def test_ordered_ann_query_pages(self):
+        # la query ordinata di Postgres sullo stesso dataset (senza set_config, che sqlite non ha)
+        from .views import CoverageRankView
+        with mock.patch.object(CoverageRankView, "_ranked_exact", staticmethod(CoverageRankView._ranked_ann)), \
+                mock.patch("candidates.views.ann_cursor", side_effect=lambda **_kw: connection.cursor()) as ann:
+            self._assert_pages(*self._pages())
+        self.assertEqual(ann.call_args.kwargs, {"iterative_scan": "strict_order"})
+
+    def test_compact_coarse_search_with_rerank(self):
+        # fase grezza + rerank: l'espressione dell'indice compatto è sostituita da quella float32,
+        # che sqlite sa calcolare; le pagine devono restare identiche alla scansione esatta
+        from .views import CoverageRankView
+        with mock.patch.object(CoverageRankView, "_ranked_exact", staticmethod(CoverageRankView._ranked_ann)), \
+                mock.patch("candidates.views.ann_cursor", side_effect=lambda **_kw: connection.cursor()), \
+                mock.patch("candidates.views.compact_search_kind", return_value="halfvec"), \
+                mock.patch("candidates.views.coarse_order_by", return_value="cv.embedding <=> %s::vector") as coarse, \
+                mock.patch.dict(os.environ, {"VECTOR_RERANK_FACTOR": "2"}):
+            self._assert_pages(*self._pages())
+        coarse.assert_called_with("halfvec", "cv.embedding")
+
+
+@mock.patch("candidates.views.encode_texts", side_effect=lambda texts: [fake_vector(t) for t in texts])
+@mock.patch("candidates.views.encode_text", side_effect=fake_vector)
+class BatchChunkSearchViewTests(SessionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # secondo CV: le query globali devono vedere anche i suoi chunk
+        self.other_cv_id = str(uuid.uuid4())
+        with connection.cursor() as cur:
+            cur.execute(
+                'INSERT INTO "CVS" (id, candidate_id, file_url, raw_text, embedding, embedding_model, is_active) '
+                "VALUES (%s, %s, %s, %s, %s, %s, true)",
+                [self.other_cv_id, self.candidate_id, "cv2.pdf", "raw", fake_vector("raw 2"), self.cv_model_id],
+            )
+            cur.executemany(
+                'INSERT INTO "CV_CHUNKS" (id, cv_id, content, page_number, chunk_index, embedding, embedding_model) '
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [
+                    [str(uuid.uuid4()), self.other_cv_id, f"altro {i}", 1, i, fake_vector(f"altro {i}"), self.model_id]
+                    for i in range(10)
+                ],
+            )
+
+    def _single(self, query, cv_id=None):
+        body = {"query": query, "top_k": 4}
+        if cv_id:
+            body["cv_id"] = cv_id
+        response = self.client.post("/api/search/chunks/", body, content_type="application/json")
+        return response.json()["results"]
+
+    def test_batch_matches_single_search(self, _encode, _encode_many):
+        queries = [
+            {"query": "python", "cv_id": self.cv_id},
+            {"query": "docker"},
+            {"query": "django", "cv_id": self.other_cv_id},
+            {"query": "kubernetes"},
+        ]
+        response = self.client.post(
+            "/api/search/chunks/batch/", {"queries": queries, "top_k": 4}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+
+        self.assertEqual([r["query"] for r in results], [q["query"] for q in queries])
+        for query, result in zip(queries, results):
+            self.assertEqual(result["cv_id"], query.get("cv_id"))
+            self.assertEqual(result["results"], self._single(query["query"], query.get("cv_id")))
+        # le query globali pescano da entrambi i CV, quelle per CV solo dal proprio
+        self.assertTrue(all(r["content"].startswith("chunk") for r in results[0]["results"]))
+        self.assertTrue(all(r["content"].startswith("altro") for r in results[2]["results"]))
+
+    def test_default_cv_id_applies_to_queries_without_one(self, _encode, _encode_many):
+        response = self.client.post(
+            "/api/search/chunks/batch/",
+            {"queries": [{"query": "python"}, {"query": "django", "cv_id": self.other_cv_id}],
+             "cv_id": self.cv_id, "top_k": 4},
+            content_type="application/json",
+        )
+        results = response.json()["results"]
+        self.assertEqual(results[0]["results"], self._single("python", self.cv_id))
+        self.assertEqual(results[1]["results"], self._single("django", self.other_cv_id))
+
+
+def make_pdf(texts):
+    """PDF minimale, una pagina per testo."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = b"%PDF-1.4\n", []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{num} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def _slow_page(page_number):
+    # eseguita nel processo figlio (contesto fork nei test): la pagina 2 non finisce mai in tempo
+    if page_number == 2:
+        time.sleep(30)
+    return extract_page(page_number)
+
+
+class ExtractPagesWithLimitsTests(SimpleTestCase):
+    PDF = make_pdf(["uno", "due", "tre"])
+
+    def test_pages_are_parsed_in_a_child_process(self):
+        with mock.patch.dict(os.environ, {"PDF_INLINE_MAX_PAGES": "2"}):
+            pages, stats = cv_pipeline.extract_pages_with_limits(self.PDF, parallel=False)
+        self.assertEqual(pages, [(1, "uno"), (2, "due"), (3, "tre")])
+        self.assertEqual(stats["workers"], 1)
+        self.assertEqual(stats["warnings"], [])
+
+    def test_small_document_is_parsed_inline(self):
+        progress = []
+        with mock.patch.dict(os.environ, {"PDF_INLINE_MAX_PAGES": "3"}), \
+                mock.patch.object(cv_pipeline, "_run_page_pool") as pool:
+            pages, stats = cv_pipeline.extract_pages_with_limits(
+                self.PDF, on_page=lambda done, total: progress.append(done),
+            )
+        pool.assert_not_called()
+        self.assertEqual(pages, [(1, "uno"), (2, "due"), (3, "tre")])
+        self.assertEqual(stats["workers"], 0)
+        self.assertEqual(progress, [1, 2, 3])
+
+    def test_buffers_are_not_copied(self):
+        self.assertIs(cv_pipeline.read_upload(self.PDF), self.PDF)
+        buffer = bytearray(self.PDF)
+        view = cv_pipeline.read_upload(buffer)
+        self.assertIsInstance(view, memoryview)
+        self.assertIs(view.obj, buffer)
+        self.assertEqual(cv_pipeline.content_fingerprint(view), hashlib.sha256(self.PDF).hexdigest())
+
+    def test_memoryview_through_inline_and_pool(self):
+        for inline_pages in ("3", "0"):
+            with mock.patch.dict(os.environ, {"PDF_INLINE_MAX_PAGES": inline_pages}):
+                pages, _ = cv_pipeline.extract_pages_with_limits(memoryview(self.PDF), parallel=False)
+            self.assertEqual(pages, [(1, "uno"), (2, "due"), (3, "tre")])
+
+    def test_in_process_ignores_thresholds(self):
+        with mock.patch.dict(os.environ, {"PDF_INLINE_MAX_PAGES": "0"}), \
+                mock.patch.object(cv_pipeline, "_run_page_pool") as pool:
+            pages, stats = cv_pipeline.extract_pages_with_limits(self.PDF, in_process=True)
+        pool.assert_not_called()
+        self.assertEqual(pages, [(1, "uno"), (2, "due"), (3, "tre")])
+        self.assertEqual(stats["workers"], 0)
+
+    def test_byte_threshold_keeps_process_pool(self):
+        with mock.patch.dict(os.environ, {"PDF_INLINE_MAX_PAGES": "3", "PDF_INLINE_MAX_BYTES": str(len(self.PDF) - 1)}):
+            pages, stats = cv_pipeline.extract_pages_with_limits(self.PDF, parallel=False)
+        self.assertEqual(pages, [(1, "uno"), (2, "due"), (3, "tre")])
+        self.assertEqual(stats["workers"], 1)
+
+    def _extract_with_slow_page(self, parallel, **env):
+        env = {"PDF_PARSE_START_METHOD": "fork", "PDF_PARALLEL_MIN_PAGES": "2", "PDF_PARSE_WORKERS": "2",
+               "PDF_INLINE_MAX_PAGES": "0", **env}
+        progress = []
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.object(cv_pipeline, "_pool_context", None), \
+                mock.patch.object(cv_pipeline, "extract_page", _slow_page):
+            started = time.monotonic()
+            pages, stats = cv_pipeline.extract_pages_with_limits(
+                self.PDF, on_page=lambda done, total: progress.append(done), parallel=parallel,
+            )
+        return pages, stats, time.monotonic() - started, progress
+
+    def test_serial_path_skips_slow_page(self):
+        pages, stats, elapsed, progress = self._extract_with_slow_page(False, PDF_PAGE_TIMEOUT="0.5")
+        self.assertLess(elapsed, 10)
+        self.assertEqual(stats["workers"], 1)
+        # il worker bloccato viene sostituito: la pagina dopo quella lenta viene comunque estratta
+        self.assertEqual(pages, [(1, "uno"), (3, "tre")])
+        self.assertEqual(stats["warnings"], ["Pagina 2: timeout dopo 0.5s, saltata"])
+        self.assertEqual(progress, [1, 2, 3])
+
+    def test_parallel_path_skips_slow_page(self):
+        pages, stats, elapsed, _ = self._extract_with_slow_page(True, PDF_PAGE_TIMEOUT="0.5")
+        self.assertLess(elapsed, 10)
+        self.assertEqual(stats["workers"], 2)
+        self.assertEqual(pages, [(1, "uno"), (3, "tre")])
+        self.assertEqual(stats["warnings"], ["Pagina 2: timeout dopo 0.5s, saltata"])
+
+    def test_document_timeout(self):
+        pages, stats, elapsed, _ = self._extract_with_slow_page(
+            False, PDF_PAGE_TIMEOUT="20", PDF_DOCUMENT_TIMEOUT="1",
+        )
+        self.assertLess(elapsed, 10)
+        self.assertEqual(pages, [(1, "uno")])
+        self.assertEqual(stats["warnings"], ["Documento: timeout dopo 1.0s, saltate le pagine da 2 in poi"])
+
+
+class _InlineExecutor:
+    """Esegue subito i job accodati: il follow-up gira nel thread del test, dentro la sua transazione."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@mock.patch("candidates.services.followups._get_executor", return_value=_InlineExecutor())
+@mock.patch("candidates.views.encode_text", side_effect=lambda text, persist=True: fake_vector(text))
+class AddNoteViewTests(SessionTestCase):
+
+    def _post(self, text="sa docker"):
+        return self.client.post(
+            f"/api/sessions/{self.session_id}/notes/", {"note_text": text, "author": "hr"},
+            content_type="application/json",
+        )
+
+    def _note_count(self):
+        with connection.cursor() as cur:
+            cur.execute('SELECT COUNT(*) FROM "INTERVIEW_NOTES" WHERE session_id = %s', [self.session_id])
+            return cur.fetchone()[0]
+
+    def _followup(self, data):
+        response = self.client.get(data["followup_url"])
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_note_is_acknowledged_and_followup_stored(self, _encode, _executor):
+        with mock.patch("candidates.services.followups.stream_followup_question",
+                        return_value=iter(["Come ", "usi Docker?"])) as stream:
+            response = self._post()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(self._note_count(), 1)
+        distance = cosine_distance(fake_vector("sa docker"), fake_vector("Python Django"))
+        self.assertAlmostEqual(data["jd_similarity"], round(max(0.0, 1.0 - distance), 4), places=4)
+        self.assertEqual(data["risk_level"], "HIGH")
+        note_id = data["note_id"]
+        self.assertTrue(data["followup_url"].endswith(f"/api/sessions/{self.session_id}/followups/{note_id}/"))
+
+        # contesto per l'LLM: i chunk del CV attivo più vicini alla nota
+        expected_chunks = sorted(self.chunks, key=lambda t: cosine_distance(fake_vector("sa docker"), fake_vector(t)))
+        self.assertEqual(stream.call_args.kwargs["cv_chunks"], expected_chunks[:3])
+
+        followup = self._followup(data)
+        self.assertEqual(followup["note_id"], note_id)
+        self.assertEqual(followup["status"], "completed")
+        self.assertEqual(followup["risk_level"], "HIGH")
+        self.assertEqual(followup["question"], "Come usi Docker?")
+        self.assertIsNone(followup["error"])
+
+    def test_partial_text_is_visible_while_generating(self, _encode, _executor):
+        seen = []
+
+        def tokens(**_kwargs):
+            yield "Come "
+            # a metà generazione la GET vede già il testo parziale
+            seen.append(NoteFollowup.objects.get().question)
+            yield "usi Docker?"
+
+        with mock.patch.dict(os.environ, {"FOLLOWUP_FLUSH_SECONDS": "0"}), \
+                mock.patch("candidates.services.followups.stream_followup_question", side_effect=tokens):
+            self._post()
+        self.assertEqual(seen, ["Come "])
+
+    def test_llm_failure_is_reported(self, _encode, _executor):
+        with mock.patch("candidates.services.followups.stream_followup_question",
+                        side_effect=RuntimeError("openai down")):
+            with self.assertLogs("candidates.services.followups", level="ERROR"):
+                response = self._post()
+
+        self.assertEqual(response.status_code, 200)
+        followup = self._followup(response.json())
+        self.assertEqual(followup["status"], "failed")
+        self.assertEqual(followup["error"], "RuntimeError: openai down")
+
+    def test_unknown_followup(self, _encode, _executor):
+        response = self.client.get(f"/api/sessions/{self.session_id}/followups/{uuid.uuid4()}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_model_conflict_does_not_store_note(self, _encode, _executor):
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "JOB_DESCRIPTIONS" SET embedding_model = %s WHERE id = %s', ["altro", self.jd_id])
+
+        with mock.patch("candidates.views.submit_followup") as submit:
+            response = self._post()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self._note_count(), 0)
+        submit.assert_not_called()
+
+    def test_job_description_without_embedding(self, _encode, _executor):
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "JOB_DESCRIPTIONS" SET embedding = NULL WHERE id = %s', [self.jd_id])
+
+        response = self._post()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._note_count(), 0)
+
+    def test_unknown_session(self, _encode, _executor):
+        self.session_id = str(uuid.uuid4())
+        self.assertEqual(self._post().status_code, 404)
+
+
+@mock.patch("candidates.services.embedding_service._encode_batch",
+            side_effect=lambda texts, batch_size=None: [fake_vector(t) for t in texts])
+class EmbeddingCacheDbTierTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(embedding_service, "get_embedding_cache", return_value=EmbeddingCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_notes_stay_out_of_the_db_tier(self, encode):
+        embedding_service.encode_text("sa docker", persist=False)
+        embedding_service.encode_text("Esperienza con Django?")
+        self.assertEqual(
+            list(EmbeddingCacheEntry.objects.values_list("text_hash", flat=True)),
+            [text_hash("Esperienza con Django?")],
+        )
+        # la nota resta comunque nella LRU in memoria
+        embedding_service.encode_text("sa docker", persist=False)
+        self.assertEqual(encode.call_count, 2)
+
+    def test_prune_removes_expired_and_other_model_rows(self, encode):
+        embedding_service.encode_texts(["vecchia", "recente", "altro modello"])
+        EmbeddingCacheEntry.objects.filter(text_hash=text_hash("vecchia")).update(
+            created_at=timezone.now() - timedelta(days=40)
+        )
+        EmbeddingCacheEntry.objects.filter(text_hash=text_hash("altro modello")).update(model_id="altro")
+
+        call_command("prune_embedding_cache", days=30, stdout=io.StringIO())
+        self.assertEqual(
+            list(EmbeddingCacheEntry.objects.values_list("text_hash", flat=True)), [text_hash("recente")]
+        )
+
+
+@mock.patch("candidates.services.ingestion_jobs._get_executor", return_value=_InlineExecutor())
+class CVIngestionJobTests(SessionTestCase):
+
+    def _upload(self):
+        return self.client.post("/api/cvs/upload/", {
+            "candidate_id": self.candidate_id,
+            "file": SimpleUploadedFile("cv.pdf", b"%PDF-1.4 nuovo", content_type="application/pdf"),
+        })
+
+    def test_job_lifecycle(self, _executor):
+        stages = []
+
+        def process(candidate_id, uploaded_file, progress):
+            self.assertEqual(uploaded_file, b"%PDF-1.4 nuovo")
+            progress("parse", pages_done=1, pages_total=2)
+            progress("embed", chunks_done=3, chunks_total=3)
+            stages.append(CVIngestionJob.objects.values_list("status", "stage", "chunks_done").get())
+            return {"cv_id": self.cv_id, "chunks": 3}
+
+        with mock.patch("candidates.services.ingestion_jobs.process_and_store_cv", side_effect=process):
+            response = self._upload()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(stages, [("running", "embed", 3)])
+
+        job = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual(job["stage"], "done")
+        self.assertEqual((job["pages_done"], job["pages_total"]), (1, 2))
+        self.assertEqual(job["result"], {"cv_id": self.cv_id, "chunks": 3})
+        self.assertNotIn("file_data", job)
+        # il PDF non resta nel job una volta concluso
+        self.assertIsNone(CVIngestionJob.objects.get().file_data)
+
+    def test_failed_job(self, _executor):
+        with mock.patch("candidates.services.ingestion_jobs.process_and_store_cv",
+                        side_effect=ValueError("PDF senza testo")), \
+                mock.patch("candidates.services.ingestion_jobs.logger"):
+            response = self._upload()
+
+        job = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "ValueError: PDF senza testo")
+        self.assertIsNone(job["result"])
+        self.assertIsNone(CVIngestionJob.objects.get().file_data)
+
+    def test_unknown_job(self, _executor):
+        self.assertEqual(self.client.get(f"/api/cvs/jobs/{uuid.uuid4()}/").status_code, 404)
+
+    def _job(self, status, age_seconds=0):
+        job = CVIngestionJob.objects.create(
+            candidate_id=self.candidate_id, file_name="cv.pdf", file_data=b"%PDF", status=status,
+        )
+        CVIngestionJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=age_seconds))
+        return job
+
+    def test_resume_claims_queued_and_orphaned_jobs_only(self, _executor):
+        queued = self._job("queued")
+        orphaned = self._job("running", age_seconds=3600)
+        self._job("running")  # ancora in mano a un altro worker (heartbeat recente)
+        self._job("completed", age_seconds=3600)
+
+        with mock.patch("candidates.services.ingestion_jobs.process_and_store_cv",
+                        return_value={"cv_id": self.cv_id}) as process:
+            self.assertEqual(ingestion_jobs.resume_pending_jobs(), 2)
+
+        self.assertEqual(process.call_count, 2)
+        self.assertEqual(
+            set(CVIngestionJob.objects.filter(status="completed", result__isnull=False).values_list("pk", flat=True)),
+            {queued.pk, orphaned.pk},
+        )
+
+    def test_job_already_claimed_is_not_run_twice(self, _executor):
+        job = self._job("running")
+        with mock.patch("candidates.services.ingestion_jobs.process_and_store_cv") as process:
+            ingestion_jobs.run_job(job.pk)
+        process.assert_not_called()
+        self.assertEqual(CVIngestionJob.objects.get(pk=job.pk).status, "running")
+
+
+@mock.patch("candidates.views.encode_text", side_effect=fake_vector)
+class JobDescriptionCoverageTests(SessionTestCase):
+
+    def _coverage(self, jd_id):
+        with connection.cursor() as cur:
+            cur.execute(
+                'SELECT cv_id, distance, score, model_version FROM "CV_JD_COVERAGE" WHERE jd_id = %s', [jd_id]
+            )
+            return cur.fetchall()
+
+    def _assert_coverage(self, jd_id, text):
+        distance = cosine_distance(fake_vector("raw"), fake_vector(text))
+        [(cv_id, stored_distance, score, model_version)] = self._coverage(jd_id)
+        self.assertEqual(str(cv_id), self.cv_id)
+        self.assertAlmostEqual(stored_distance, distance, places=5)
+        self.assertAlmostEqual(score, max(0.0, 1.0 - distance) * 100, places=3)
+        self.assertEqual(model_version, self.cv_model_id)
+
+    def test_coverage_refreshed_on_create_and_update(self, _encode):
+        response = self.client.post(
+            "/api/job-descriptions/", {"title": "Backend", "description_text": "Go Kubernetes"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        jd_id = response.json()["id"]
+        self._assert_coverage(jd_id, "Go Kubernetes")
+
+        response = self.client.patch(
+            f"/api/job-descriptions/{jd_id}/", {"description_text": "Rust embedded"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self._assert_coverage(jd_id, "Rust embedded")
+
+    def test_pooling_change_requires_reembed(self, _encode):
+        self.assertEqual(get_cv_model_id(), f"{self.model_id}+mean")
+        with mock.patch.dict(os.environ, {"CV_EMBEDDING_POOLING": "weighted"}):
+            self.assertEqual(get_cv_model_id(), f"{self.model_id}+weighted")
+            # CV pooled in mean: non confrontabile finché manage.py reembed non lo ricalcola
+            response = self.client.post(
+                "/api/coverage/", {"cv_id": self.cv_id, "job_description_id": self.jd_id},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["expected_cv_model"], f"{self.model_id}+weighted")
+        with mock.patch.dict(os.environ, {"CV_EMBEDDING_POOLING": "text"}):
+            # text: encode del raw_text, stesso id dei vettori CV storici
+            self.assertEqual(get_cv_model_id(), self.model_id)
+
+    def test_inactive_cvs_are_not_scored(self, _encode):
+        with connection.cursor() as cur:
+            cur.execute('UPDATE "CVS" SET is_active = false WHERE id = %s', [self.cv_id])
+        response = self.client.post(
+            "/api/job-descriptions/", {"title": "Backend", "description_text": "Go Kubernetes"},
+            content_type="application/json",
+        )
+        self.assertEqual(self._coverage(response.json()["id"]), [])
+
+
+class WarmupTests(SimpleTestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(warmup._state, {"enabled": True, "ready": False, "error": None, "warnings": [], "timings": {}}),
+            mock.patch.object(warmup, "_thread", None),
+            mock.patch.object(warmup, "_pid", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @mock.patch("candidates.services.warmup.time.sleep")
+    def test_failed_step_is_retried_with_backoff(self, sleep):
+        step = mock.Mock(side_effect=[OSError("db down"), OSError("db down"), None])
+        with mock.patch.dict(os.environ, {"WARMUP_RETRIES": "3", "WARMUP_RETRY_BACKOFF": "1"}), \
+                self.assertLogs("candidates.services.warmup", level="WARNING"):
+            warmup._step_with_retry("database", step)
+        self.assertEqual(step.call_count, 3)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1.0, 2.0])
+
+    def test_failed_warmup_is_rerun_from_readiness(self):
+        with mock.patch.object(warmup, "run_warmup") as run:
+            with warmup._lock:
+                warmup._start_thread().join()
+            warmup._state["error"] = "OperationalError: db down"
+
+            state = warmup.readiness()
+            warmup._thread.join()
+        self.assertFalse(state["ready"])
+        self.assertEqual(run.call_count, 2)
+
+    def test_forked_process_restarts_warmup(self):
+        with mock.patch.object(warmup, "run_warmup") as run:
+            with warmup._lock:
+                warmup._start_thread().join()
+            warmup._state["ready"] = True
+            # figlio forkato dopo il warm-up nel master: il thread non esiste più qui
+            warmup._pid = os.getpid() + 1
+
+            state = warmup.readiness()
+            warmup._thread.join()
+        self.assertFalse(state["ready"])
+        self.assertEqual(warmup._pid, os.getpid())
+        self.assertEqual(run.call_count, 2)
+
+
+class MicroBatchEncoderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def _encode(self, texts, batch_size):
+        self.calls.append((list(texts), batch_size))
+        if texts == ["primo"]:
+            # tiene occupato il batcher: le richieste successive si accodano nello stesso batch
+            self.gate.wait(5)
+        if "rotto" in texts:
+            raise ValueError("testo non valido")
+        return np.stack([fake_vector(t) for t in texts])
+
+    def _queue_while_busy(self, batcher, requests):
+        results = {}
+
+        def call(text, batch_size):
+            try:
+                results[text] = batcher.encode([text], batch_size)
+            except Exception as exc:
+                results[text] = exc
+
+        threads = [threading.Thread(target=call, args=("primo", None))]
+        threads[0].start()
+        while not self.calls:
+            time.sleep(0.01)
+        for queued, (text, batch_size) in enumerate(requests, start=1):
+            threads.append(threading.Thread(target=call, args=(text, batch_size)))
+            threads[-1].start()
+            # una alla volta: l'ordine in coda è quello di requests
+            while batcher._queue.qsize() < queued:
+                time.sleep(0.01)
+        self.gate.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_requests_share_one_forward_pass(self):
+        batcher = MicroBatchEncoder(self._encode, max_wait_ms=0)
+        results = self._queue_while_busy(batcher, [("a", 16), ("b", 8), ("c", None)])
+
+        # il batch accorpato usa il batch_size più piccolo chiesto dai chiamanti
+        self.assertEqual(self.calls, [(["primo"], None), (["a", "b", "c"], 8)])
+        for text in ("a", "b", "c"):
+            np.testing.assert_allclose(results[text][0], fake_vector(text))
+        self.assertEqual(batcher.stats()["max_batch_texts"], 3)
+
+    def test_failing_text_only_fails_its_caller(self):
+        batcher = MicroBatchEncoder(self._encode, max_wait_ms=0)
+        results = self._queue_while_busy(batcher, [("rotto", None), ("ok", 4)])
+
+        self.assertIsInstance(results["rotto"], ValueError)
+        np.testing.assert_allclose(results["ok"][0], fake_vector("ok"))
+        self.assertEqual(self.calls[1:], [(["rotto", "ok"], 4), (["rotto"], None), (["ok"], 4)])
+        self.assertEqual(batcher.stats()["fallbacks"], 1)
+
+    def test_caller_times_out_when_batcher_is_stuck(self):
+        batcher = MicroBatchEncoder(self._encode, timeout=0.2)
+        with self.assertRaises(TimeoutError):
+            batcher.encode(["primo"])
+
+    def test_idle_request_does_not_wait(self):
+        batcher = MicroBatchEncoder(self._encode, max_wait_ms=2000)
+        started = time.monotonic()
+        batcher.encode(["solo"])
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_disabled_by_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop("EMBEDDING_MICROBATCH", None)
+            self.assertIsNone(get_micro_batch_encoder(self._encode))
+
+
+class _FakeEncoder:
+    def encode(self, texts, batch_size=None, normalize_embeddings=True):
+        return np.stack([fake_vector(t) for t in texts])
+
+
+@mock.patch("candidates.management.commands.reembed.get_encoder", return_value=_FakeEncoder())
+class ReembedCommandTests(SessionTestCase):
+
+    def _models(self):
+        with connection.cursor() as cur:
+            cur.execute('SELECT note_text, embedding_model FROM "INTERVIEW_NOTES" ORDER BY note_text')
+            return cur.fetchall()
+
+    def _set_model(self, model_id, note_text=None):
+        with connection.cursor() as cur:
+            if note_text:
+                cur.execute('UPDATE "INTERVIEW_NOTES" SET embedding_model = %s WHERE note_text = %s', [model_id, note_text])
+            else:
+                cur.execute('UPDATE "INTERVIEW_NOTES" SET embedding_model = %s', [model_id])
+
+    def _reembed(self):
+        call_command("reembed", tables=["INTERVIEW_NOTES"], batch_size=2, stdout=io.StringIO())
+
+    def test_completed_checkpoint_still_picks_up_stale_rows(self, _encoder):
+        for text in ("a", "b", "c"):
+            self._add_note(text, timezone.now())
+        self._set_model("vecchio")
+
+        self._reembed()
+        self.assertEqual(self._models(), [("a", self.model_id), ("b", self.model_id), ("c", self.model_id)])
+        checkpoint = ReembedCheckpoint.objects.get(table_name="INTERVIEW_NOTES", model_id=self.model_id)
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.rows_done, 3)
+
+        # riga riscritta con un altro modello dopo il passaggio completato (es. cambio A -> B -> A)
+        self._set_model("vecchio", note_text="a")
+        self._reembed()
+        self.assertEqual(self._models()[0], ("a", self.model_id))
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(checkpoint.rows_done, 1)
@@ -1,9 +1,10 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import CandidatoViewSet, CVViewSet, CVChunkViewSet, CVUploadView, ChunkSearchView, JobDescriptionViewSet, \
-    CoverageView, CoverageExplainView, InterviewQuestionViewSet, LiveSuggestView, StartSessionView, AddNoteView, \
-    NextBestQuestionView, SessionQuestionsView, MarkQuestionAskedView, EndSessionView, SessionRecapView, \
-    SessionListView, SessionTimelineView, SessionCVView, ParseQuestionsFromFileView, GenerateQuestionsFromCVView
+from .views import CandidatoViewSet, CVViewSet, CVChunkViewSet, CVUploadView, CVIngestionJobView, ChunkSearchView, JobDescriptionViewSet, \
+    BatchChunkSearchView, CoverageView, CoverageExplainView, CoverageRankView, InterviewQuestionViewSet, LiveSuggestView, StartSessionView, AddNoteView, \
+    NoteFollowupView, NextBestQuestionView, SessionQuestionsView, MarkQuestionAskedView, EndSessionView, SessionRecapView, \
+    SessionListView, SessionTimelineView, SessionCVView, ParseQuestionsFromFileView, GenerateQuestionsFromCVView, \
+    EmbeddingCacheStatsView
 
 router = DefaultRouter()
 router.register(r'candidates', CandidatoViewSet)
@@ -14,12 +15,16 @@ router.register(r'interview-questions', InterviewQuestionViewSet)
 
 urlpatterns = [
     path("cvs/upload/", CVUploadView.as_view(), name="cv-upload"),
+    path("cvs/jobs/<uuid:job_id>/", CVIngestionJobView.as_view(), name="cv-ingestion-job"),
     path("search/chunks/", ChunkSearchView.as_view(), name="chunk-search"),
+    path("search/chunks/batch/", BatchChunkSearchView.as_view(), name="chunk-search-batch"),
     path("coverage/", CoverageView.as_view(), name="coverage"),
     path("coverage/explain/", CoverageExplainView.as_view(), name="coverage-explain"),
+    path("coverage/rank/", CoverageRankView.as_view(), name="coverage-rank"),
     path("live/suggest/", LiveSuggestView.as_view(), name="live-suggest"),
     path("sessions/start/", StartSessionView.as_view()),
     path("sessions/<uuid:session_id>/notes/", AddNoteView.as_view()),
+    path("sessions/<uuid:session_id>/followups/<uuid:note_id>/", NoteFollowupView.as_view(), name="session-followup"),
     path("sessions/<uuid:session_id>/next-question/", NextBestQuestionView.as_view(), name="next-best-question"),
     path("sessions/<uuid:session_id>/questions/", SessionQuestionsView.as_view(), name="session-questions"),
     path("interview-questions/<uuid:question_id>/mark-asked/", MarkQuestionAskedView.as_view(), name="mark-question-asked"),
@@ -30,6 +35,7 @@ urlpatterns = [
     path("sessions/<uuid:session_id>/cv/", SessionCVView.as_view(), name="session-cv"),
     path("questions/parse-file/", ParseQuestionsFromFileView.as_view(), name="parse-questions-file"),
     path("questions/generate/", GenerateQuestionsFromCVView.as_view(), name="generate-questions"),
+    path("embeddings/cache/", EmbeddingCacheStatsView.as_view(), name="embedding-cache-stats"),
     path('sessions/<uuid:session_id>/questions/<uuid:question_id>/mark-asked/', MarkQuestionAskedView.as_view()),
 ]
 
@@ -1,37 +1,51 @@
+import base64
+import json
 import uuid
 
+import numpy as np
 from rest_framework import viewsets
 
 from docx import Document as DocxDocument
 import io
-from .models import Candidato, CV, CVChunk, JobDescription, InterviewQuestion
+from .models import Candidato, CV, CVChunk, JobDescription, InterviewQuestion, CVIngestionJob, NoteFollowup
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
 
-from .services.cv_pipeline import process_and_store_cv
+from .services.coverage import get_coverage, refresh_coverage
+from .services.cv_pipeline import content_fingerprint, read_upload, reuse_existing_cv
+from .services.ingestion_jobs import record_completed_job, submit_cv_job
 from .serializers import (
     CandidatoSerializer,
     CVSerializer,
-    CVChunkSerializer, CVUploadSerializer, ChunkSearchSerializer, JobDescriptionSerializer, CoverageExplainSerializer,
+    CVChunkSerializer, CVUploadSerializer, CVIngestionJobSerializer, ChunkSearchSerializer, BatchChunkSearchSerializer,
+    JobDescriptionSerializer, CoverageExplainSerializer, CoverageRankSerializer,
     InterviewQuestionSerializer, LiveSuggestSerializer, StartSessionSerializer, AddNoteSerializer,
     NextQuestionSerializer, SessionQuestionCreateSerializer, MarkAskedSerializer, EndSessionSerializer
 )
 
-from django.db import connection
-from pgvector.psycopg2 import register_vector
+from django.db import connection, transaction
+from django.urls import reverse
 
 from .services.llm_service import generate_followup_question
-_embedding_model = None
+from .services.embedding_cache import get_embedding_cache
+from .services.embedding_service import embedding_model_conflict, encode_text, encode_texts, get_cv_model_id, \
+    get_model_id
+from .services.followups import submit_followup
+from .services.micro_batching import micro_batch_stats
+from .services.session_recap import RecapUnavailable, get_or_build_recap, submit_recap
+from .services.vector_index import ann_cursor, coarse_order_by, compact_search_kind, default_ef_search, \
+    nearest_query, rerank_factor
+from .services.warmup import readiness
+
+
+def _embedding_model_conflict(*model_ids, cv_models=()):
+    """409 se i vettori da confrontare non vengono tutti dal modello corrente (serve manage.py reembed)."""
+    conflict = embedding_model_conflict(*model_ids, cv_models=cv_models)
+    return Response(conflict, status=409) if conflict else None
 
-def get_embedding_model():
-    from sentence_transformers import SentenceTransformer
-    global _embedding_model
-    if _embedding_model is None:
-        _embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-    return _embedding_model
 
 class CandidatoViewSet(viewsets.ModelViewSet):
     queryset = Candidato.objects.all()
@@ -61,8 +75,36 @@ class CVUploadView(GenericAPIView):
         if not pdf.name.lower().endswith(".pdf"):
             return Response({"error": "Only PDF files are supported"}, status=status.HTTP_400_BAD_REQUEST)
 
-        result = process_and_store_cv(candidate_id=candidate_id, uploaded_file=pdf)
-        return Response(result, status=status.HTTP_201_CREATED)
+        data = read_upload(pdf)
+
+        # PDF identico già caricato: riusiamo CV e chunk senza passare dal worker,
+        # ma rispondiamo con un job già completato (stesso formato del caso normale)
+        existing = reuse_existing_cv(candidate_id, content_fingerprint(data))
+        if existing:
+            job = record_completed_job(candidate_id=candidate_id, file_name=pdf.name, result=existing)
+            response_status = status.HTTP_200_OK
+        else:
+            job = submit_cv_job(candidate_id=candidate_id, data=data, file_name=pdf.name)
+            response_status = status.HTTP_202_ACCEPTED
+
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": request.build_absolute_uri(reverse("cv-ingestion-job", kwargs={"job_id": job.id})),
+            "result": job.result,
+        }, status=response_status)
+
+
+class CVIngestionJobView(APIView):
+    """
+    GET /api/cvs/jobs/<id>/
+    Stato del job di ingestione: stage, avanzamento (pagine / chunk) e risultato finale.
+    """
+    def get(self, request, job_id):
+        job = CVIngestionJob.objects.filter(id=job_id).first()
+        if not job:
+            return Response({"error": "Job not found"}, status=404)
+        return Response(CVIngestionJobSerializer(job).data)
 
 class ChunkSearchView(GenericAPIView):
     serializer_class = ChunkSearchSerializer
@@ -76,37 +118,26 @@ class ChunkSearchView(GenericAPIView):
         top_k = serializer.validated_data["top_k"]
 
         # embedding query
-        model = get_embedding_model()
-        query_vec = model.encode(query_text, normalize_embeddings=True).tolist()
-
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
-        with connection.cursor() as cur:
-            if cv_id:
-                cur.execute(
-                    """
-                    SELECT id, content, page_number, chunk_index,
-                           embedding <=> (%s::vector) AS distance
-                    FROM "CV_CHUNKS"
-                    WHERE cv_id = %s
-                    ORDER BY embedding <=> (%s::vector)
-                    LIMIT %s
-                    """,
-                    [query_vec, str(cv_id), query_vec, top_k],
-                )
-            else:
-                cur.execute(
-                    """
-                    SELECT id, content, page_number, chunk_index,
-                           embedding <=> (%s::vector) AS distance
-                    FROM "CV_CHUNKS"
-                    ORDER BY embedding <=> (%s::vector)
-                    LIMIT %s
-                    """,
-                    [query_vec, query_vec, top_k],
-                )
+        query_vec = encode_text(query_text)
+
+        where = "embedding_model = %s"
+        where_params = [get_model_id()]
+        if cv_id:
+            where = "cv_id = %s AND " + where
+            where_params.insert(0, str(cv_id))
+        # VECTOR_COMPACT_SEARCH: candidati dall'indice halfvec/binario, poi rerank esatto
+        kind = compact_search_kind()
+        sql, params = nearest_query(
+            "CV_CHUNKS", "id, content, page_number, chunk_index", where, where_params,
+            query_vec, top_k, kind,
+        )
+        ef_search = serializer.validated_data.get("ef_search")
+        if kind:
+            # l'indice restituisce al massimo ef_search candidati
+            ef_search = max(ef_search or default_ef_search(), top_k * rerank_factor())
 
+        with ann_cursor(ef_search) as cur:
+            cur.execute(sql, params)
             rows = cur.fetchall()
 
         results = [
@@ -122,37 +153,136 @@ class ChunkSearchView(GenericAPIView):
 
         return Response({"results": results})
 
+class BatchChunkSearchView(GenericAPIView):
+    """
+    POST /api/search/chunks/batch/
+    Più query in una richiesta: un solo encode batched e al massimo due statement SQL
+    (LATERAL: un top_k per query), uno per le query con cv_id e uno per quelle globali,
+    così ognuno ha un predicato semplice che usa l'indice.
+    """
+    serializer_class = BatchChunkSearchSerializer
+
+    @staticmethod
+    def _search_sql(count: int, scoped: bool) -> str:
+        if scoped:
+            values = ", ".join(["(%s, %s::vector, %s::uuid)"] * count)
+            columns = "idx, embedding, cv_id"
+            cv_filter = "AND ch.cv_id = q.cv_id"
+        else:
+            values = ", ".join(["(%s, %s::vector)"] * count)
+            columns = "idx, embedding"
+            cv_filter = ""
+
+        if connection.vendor == "postgresql":
+            # LATERAL: ogni riga di q fa la sua ricerca ORDER BY <=> LIMIT
+            return f"""
+                WITH q({columns}) AS (VALUES {values})
+                SELECT q.idx, ch.id, ch.content, ch.page_number, ch.chunk_index, ch.distance
+                FROM q
+                CROSS JOIN LATERAL (
+                    SELECT ch.id, ch.content, ch.page_number, ch.chunk_index,
+                           ch.embedding <=> q.embedding AS distance
+                    FROM "CV_CHUNKS" ch
+                    WHERE ch.embedding_model = %s
+                      {cv_filter}
+                    ORDER BY ch.embedding <=> q.embedding
+                    LIMIT %s
+                ) ch
+                ORDER BY q.idx, ch.distance
+            """
+        # backend sqlite_vector (niente LATERAL): stesso risultato con ROW_NUMBER per query
+        return f"""
+            WITH q({columns}) AS (VALUES {values})
+            SELECT idx, id, content, page_number, chunk_index, distance
+            FROM (
+                SELECT q.idx, ch.id, ch.content, ch.page_number, ch.chunk_index,
+                       ch.embedding <=> q.embedding AS distance,
+                       ROW_NUMBER() OVER (PARTITION BY q.idx ORDER BY ch.embedding <=> q.embedding) AS rn
+                FROM q
+                JOIN "CV_CHUNKS" ch
+                  ON ch.embedding_model = %s
+                 {cv_filter}
+            ) ranked
+            WHERE rn <= %s
+            ORDER BY idx, distance
+        """
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        default_cv_id = serializer.validated_data.get("cv_id")
+        top_k = serializer.validated_data["top_k"]
+        queries = [
+            (q["query"], q.get("cv_id") or default_cv_id)
+            for q in serializer.validated_data["queries"]
+        ]
+
+        query_vecs = encode_texts([text for text, _ in queries])
+
+        scoped_params, global_params = [], []
+        for idx, ((_, cv_id), vec) in enumerate(zip(queries, query_vecs)):
+            if cv_id:
+                scoped_params += [idx, vec, str(cv_id)]
+            else:
+                global_params += [idx, vec]
+
+        rows = []
+        with ann_cursor(serializer.validated_data.get("ef_search")) as cur:
+            if scoped_params:
+                cur.execute(self._search_sql(len(scoped_params) // 3, scoped=True),
+                            scoped_params + [get_model_id(), top_k])
+                rows += cur.fetchall()
+            if global_params:
+                cur.execute(self._search_sql(len(global_params) // 2, scoped=False),
+                            global_params + [get_model_id(), top_k])
+                rows += cur.fetchall()
+
+        grouped = [
+            {"query": text, "cv_id": str(cv_id) if cv_id else None, "results": []}
+            for text, cv_id in queries
+        ]
+        for r in rows:
+            grouped[r[0]]["results"].append({
+                "chunk_id": r[1],
+                "content": r[2],
+                "page_number": r[3],
+                "chunk_index": r[4],
+                "distance": float(r[5]),
+            })
+
+        return Response({"results": grouped})
+
 class JobDescriptionViewSet(viewsets.ModelViewSet):
     queryset = JobDescription.objects.all()
     serializer_class = JobDescriptionSerializer
 
     def perform_create(self, serializer):
-        jd = serializer.save()
+        self._embed(serializer.save())
 
-        model = get_embedding_model()
-        embedding = model.encode(
-            jd.description_text,
-            normalize_embeddings=True
-        ).tolist()
+    def perform_update(self, serializer):
+        # description_text cambiata: nuovo embedding e nuove coverage
+        self._embed(serializer.save())
 
-        connection.ensure_connection()
-        register_vector(connection.connection)
+    def _embed(self, jd):
+        embedding = encode_text(jd.description_text)
 
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE "JOB_DESCRIPTIONS"
-                SET embedding = %s
-                WHERE id = %s
-                """,
-                [embedding, str(jd.id)]
-            )
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE "JOB_DESCRIPTIONS"
+                    SET embedding = %s, embedding_model = %s
+                    WHERE id = %s
+                    """,
+                    [embedding, get_model_id(), str(jd.id)]
+                )
+            refresh_coverage(jd_ids=[jd.id])
 
 from .serializers import CoverageSerializer
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
 from django.db import connection
-from pgvector.psycopg2 import register_vector
 
 
 class CoverageView(GenericAPIView):
@@ -165,29 +295,18 @@ class CoverageView(GenericAPIView):
         cv_id = str(serializer.validated_data["cv_id"])
         jd_id = str(serializer.validated_data["job_description_id"])
 
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT c.id,
-                       jd.id,
-                       (c.embedding <=> jd.embedding) AS distance
-                FROM "CVS" c
-                JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
-                WHERE c.id = %s
-                """,
-                [jd_id, cv_id],
-            )
-            row = cur.fetchone()
-
-        if not row:
+        # letta da CV_JD_COVERAGE (calcolata solo se manca)
+        coverage = get_coverage(cv_id, jd_id)
+        if not coverage:
             return Response({"error": "CV or Job Description not found"}, status=404)
 
-        distance = float(row[2])
+        conflict = _embedding_model_conflict(coverage["jd_model"], cv_models=[coverage["cv_model"]])
+        if conflict:
+            return conflict
+
+        distance = float(coverage["distance"])
         similarity = max(0.0, 1.0 - distance)
-        coverage_score = round(similarity * 100, 2)
+        coverage_score = round(coverage["score"], 2)
 
         return Response({
             "cv_id": cv_id,
@@ -211,29 +330,20 @@ class CoverageExplainView(GenericAPIView):
         jd_id = str(serializer.validated_data["job_description_id"])
         top_k = int(serializer.validated_data["top_k"])
 
-        connection.ensure_connection()
-        register_vector(connection.connection)
+        # 1) Coverage macro (CV vs JD global), precalcolata in CV_JD_COVERAGE
+        coverage = get_coverage(cv_id, jd_id)
+        if not coverage:
+            return Response({"error": "CV or JD not found, or missing embeddings"}, status=404)
 
-        with connection.cursor() as cur:
-            # 1) Coverage macro (CV vs JD global)
-            cur.execute(
-                """
-                SELECT (c.embedding <=> jd.embedding) AS distance
-                FROM "CVS" c
-                JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
-                WHERE c.id = %s
-                """,
-                [jd_id, cv_id],
-            )
-            row = cur.fetchone()
+        conflict = _embedding_model_conflict(coverage["jd_model"], cv_models=[coverage["cv_model"]])
+        if conflict:
+            return conflict
 
-            if not row or row[0] is None:
-                return Response({"error": "CV or JD not found, or missing embeddings"}, status=404)
-
-            distance = float(row[0])
-            similarity = max(0.0, 1.0 - distance)
-            coverage_score = round(similarity * 100, 2)
+        distance = float(coverage["distance"])
+        similarity = max(0.0, 1.0 - distance)
+        coverage_score = round(coverage["score"], 2)
 
+        with connection.cursor() as cur:
             # 2) Evidence micro: top chunks in that CV closest to JD embedding
             cur.execute(
                 """
@@ -244,7 +354,7 @@ class CoverageExplainView(GenericAPIView):
                        (ch.embedding <=> jd.embedding) AS distance
                 FROM "CV_CHUNKS" ch
                 JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
-                WHERE ch.cv_id = %s
+                WHERE ch.cv_id = %s AND ch.embedding_model = jd.embedding_model
                 ORDER BY ch.embedding <=> jd.embedding
                 LIMIT %s
                 """,
@@ -273,6 +383,222 @@ class CoverageExplainView(GenericAPIView):
         })
 
 
+def _encode_rank_cursor(distance, cv_id) -> str:
+    raw = json.dumps({"d": distance, "id": str(cv_id)}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_rank_cursor(cursor: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(data["d"]), str(uuid.UUID(data["id"]))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class CoverageRankView(GenericAPIView):
+    """
+    POST /api/coverage/rank/
+    Shortlist per una JD: CV attivi ordinati per similarità coseno con paginazione keyset
+    (distance, cv_id), filtri su created_at e candidati esclusi. Su Postgres query ordinata
+    sull'indice HNSW (iterative scan), altrove scansione esatta.
+    Gli evidence chunks vengono calcolati solo per i CV della pagina restituita.
+    """
+    serializer_class = CoverageRankSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        jd_id = str(data["job_description_id"])
+        limit = data["limit"]
+        evidence_k = data["evidence_k"]
+
+        after = None
+        if data.get("cursor"):
+            after = _decode_rank_cursor(data["cursor"])
+            if after is None:
+                return Response({"error": "Invalid cursor"}, status=400)
+
+        with connection.cursor() as cur:
+            cur.execute(
+                'SELECT embedding, embedding_model FROM "JOB_DESCRIPTIONS" WHERE id = %s',
+                [jd_id],
+            )
+            jd_row = cur.fetchone()
+        if not jd_row or jd_row[0] is None:
+            return Response({"error": "Job Description not found or missing embedding"}, status=404)
+        conflict = _embedding_model_conflict(jd_row[1])
+        if conflict:
+            return conflict
+        jd_vec = jd_row[0]
+
+        where = ["cv.is_active = true", "cv.embedding_model = %s"]
+        params = [get_cv_model_id()]
+        if data.get("created_after"):
+            where.append("cv.created_at >= %s")
+            params.append(connection.ops.adapt_datetimefield_value(data["created_after"]))
+        if data.get("created_before"):
+            where.append("cv.created_at < %s")
+            params.append(connection.ops.adapt_datetimefield_value(data["created_before"]))
+        if data["exclude_candidate_ids"]:
+            where.append(f"cv.candidate_id NOT IN ({', '.join(['%s'] * len(data['exclude_candidate_ids']))})")
+            params += [str(c) for c in data["exclude_candidate_ids"]]
+
+        if connection.vendor == "postgresql":
+            rows = self._ranked_ann(jd_vec, where, params, after, limit + 1)
+        else:
+            rows = self._ranked_exact(jd_vec, where, params, after, limit + 1)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        # ---- Evidence: top chunk vs JD solo per i CV di questa pagina ----
+        evidence = {}
+        if rows and evidence_k:
+            cv_ids = [str(r[0]) for r in rows]
+            with connection.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT cv_id, id, content, page_number, chunk_index, distance
+                    FROM (
+                        SELECT ch.cv_id, ch.id, ch.content, ch.page_number, ch.chunk_index,
+                               ch.embedding <=> %s::vector AS distance,
+                               ROW_NUMBER() OVER (PARTITION BY ch.cv_id ORDER BY ch.embedding <=> %s::vector) AS rn
+                        FROM "CV_CHUNKS" ch
+                        WHERE ch.cv_id IN ({", ".join(["%s"] * len(cv_ids))})
+                          AND ch.embedding_model = %s
+                    ) ranked
+                    WHERE rn <= %s
+                    ORDER BY cv_id, distance
+                    """,
+                    [jd_vec, jd_vec] + cv_ids + [get_model_id(), evidence_k],
+                )
+                for r in cur.fetchall():
+                    evidence.setdefault(str(r[0]), []).append({
+                        "chunk_id": r[1],
+                        "content": r[2],
+                        "page_number": r[3],
+                        "chunk_index": r[4],
+                        "distance": float(r[5]),
+                    })
+
+        results = []
+        for r in rows:
+            distance = float(r[4])
+            similarity = max(0.0, 1.0 - distance)
+            results.append({
+                "cv_id": str(r[0]),
+                "candidate_id": str(r[1]),
+                "candidate_name": r[2],
+                "cv_created_at": r[3],
+                "distance": round(distance, 6),
+                "similarity": round(similarity, 6),
+                "coverage_score": round(similarity * 100, 2),
+                "top_chunks": evidence.get(str(r[0]), []),
+            })
+
+        return Response({
+            "job_description_id": jd_id,
+            "results": results,
+            "next_cursor": _encode_rank_cursor(float(rows[-1][4]), rows[-1][0]) if has_more else None,
+        })
+
+    @staticmethod
+    def _ranked_ann(jd_vec, where: list, params: list, after, limit: int) -> list:
+        """
+        Postgres: scansione ordinata sull'indice HNSW con iterative scan strict_order (pgvector
+        >= 0.8). L'indice continua a produrre candidati in ordine di distanza finché filtri e
+        keyset (distance, cv_id) non riempiono la pagina, quindi le pagine successive non
+        tornano corte; cv.id come secondo criterio passa da un incremental sort sui pari merito.
+        Con VECTOR_COMPACT_SEARCH la fase grezza usa l'indice compatto e segue un rerank esatto.
+        Limite di lavoro per query: hnsw.max_scan_tuples (default pgvector 20000).
+        """
+        where = list(where)
+        keyset_params = []
+        if after:
+            where.append(
+                "(cv.embedding <=> %s::vector > %s OR (cv.embedding <=> %s::vector = %s AND cv.id > %s))"
+            )
+            keyset_params = [jd_vec, after[0], jd_vec, after[0], after[1]]
+
+        kind = compact_search_kind()
+        if kind is None:
+            sql = f"""
+                SELECT cv.id, cv.candidate_id, cv.created_at,
+                       cv.embedding <=> %s::vector AS distance
+                FROM "CVS" cv
+                WHERE {" AND ".join(where)}
+                ORDER BY cv.embedding <=> %s::vector, cv.id
+                LIMIT %s
+            """
+            sql_params = [jd_vec] + params + keyset_params + [jd_vec, limit]
+        else:
+            # VECTOR_COMPACT_SEARCH: limit * VECTOR_RERANK_FACTOR candidati grezzi dall'indice
+            # halfvec/binary (stessi filtri e keyset), poi rerank esatto in float32 su (distance, id)
+            sql = f"""
+                SELECT id, candidate_id, created_at, embedding <=> %s::vector AS distance
+                FROM (
+                    SELECT cv.id, cv.candidate_id, cv.created_at, cv.embedding
+                    FROM "CVS" cv
+                    WHERE {" AND ".join(where)}
+                    ORDER BY {coarse_order_by(kind, "cv.embedding")}
+                    LIMIT %s
+                ) coarse
+                ORDER BY embedding <=> %s::vector, id
+                LIMIT %s
+            """
+            sql_params = [jd_vec] + params + keyset_params + [jd_vec, limit * rerank_factor(), jd_vec, limit]
+
+        with ann_cursor(iterative_scan="strict_order") as cur:
+            cur.execute(
+                f"""
+                SELECT s.id, s.candidate_id, c.full_name, s.created_at, s.distance
+                FROM ({sql}) s
+                JOIN "CANDIDATI" c ON c.id = s.candidate_id
+                ORDER BY s.distance, s.id
+                """,
+                sql_params,
+            )
+            return cur.fetchall()
+
+    @staticmethod
+    def _ranked_exact(jd_vec, where: list, params: list, after, limit: int) -> list:
+        """
+        Fallback senza indice HNSW (backend sqlite_vector / offline): scansione esatta.
+        MATERIALIZED calcola la distanza una volta per riga prima del filtro keyset.
+        """
+        keyset = ""
+        keyset_params = []
+        if after:
+            keyset = "WHERE distance > %s OR (distance = %s AND id > %s)"
+            keyset_params = [after[0], after[0], after[1]]
+
+        with connection.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH scored AS MATERIALIZED (
+                    SELECT cv.id, cv.candidate_id, cv.created_at,
+                           cv.embedding <=> %s::vector AS distance
+                    FROM "CVS" cv
+                    WHERE {" AND ".join(where)}
+                )
+                SELECT s.id, s.candidate_id, c.full_name, s.created_at, s.distance
+                FROM (
+                    SELECT * FROM scored
+                    {keyset}
+                    ORDER BY distance, id
+                    LIMIT %s
+                ) s
+                JOIN "CANDIDATI" c ON c.id = s.candidate_id
+                ORDER BY s.distance, s.id
+                """,
+                [jd_vec] + params + keyset_params + [limit],
+            )
+            return cur.fetchall()
+
+
 class InterviewQuestionViewSet(viewsets.ModelViewSet):
     queryset = InterviewQuestion.objects.all()
     serializer_class = InterviewQuestionSerializer
@@ -280,20 +606,16 @@ class InterviewQuestionViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         q = serializer.save()
 
-        model = get_embedding_model()
-        vec = model.encode(q.question_text, normalize_embeddings=True).tolist()
-
-        connection.ensure_connection()
-        register_vector(connection.connection)
+        vec = encode_text(q.question_text)
 
         with connection.cursor() as cur:
             cur.execute(
                 """
                 UPDATE "INTERVIEW_QUESTIONS"
-                SET embedding = %s
+                SET embedding = %s, embedding_model = %s
                 WHERE id = %s
                 """,
-                [vec, str(q.id)],
+                [vec, get_model_id(), str(q.id)],
             )
 
 class LiveSuggestView(GenericAPIView):
@@ -308,24 +630,24 @@ class LiveSuggestView(GenericAPIView):
         note_text = serializer.validated_data["note_text"]
         top_k = serializer.validated_data["top_k"]
 
-        model = get_embedding_model()
-        note_vec = model.encode(note_text, normalize_embeddings=True).tolist()
+        note_vec = encode_text(note_text, persist=False)
 
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
-        with connection.cursor() as cur:
+        with ann_cursor(serializer.validated_data.get("ef_search")) as cur:
 
             # 1️⃣ Note vs JD (macro relevance)
             cur.execute(
                 """
-                SELECT (jd.embedding <=> %s::vector) AS distance
+                SELECT (jd.embedding <=> %s::vector) AS distance, jd.embedding_model
                 FROM "JOB_DESCRIPTIONS" jd
                 WHERE jd.id = %s
                 """,
                 [note_vec, jd_id],
             )
-            jd_distance = float(cur.fetchone()[0])
+            jd_row = cur.fetchone()
+            conflict = _embedding_model_conflict(jd_row[1])
+            if conflict:
+                return conflict
+            jd_distance = float(jd_row[0])
             jd_similarity = max(0.0, 1.0 - jd_distance)
 
             # 2️⃣ Note vs CV chunks
@@ -334,11 +656,11 @@ class LiveSuggestView(GenericAPIView):
                 SELECT ch.id, ch.content, ch.page_number,
                        (ch.embedding <=> %s::vector) AS distance
                 FROM "CV_CHUNKS" ch
-                WHERE ch.cv_id = %s
+                WHERE ch.cv_id = %s AND ch.embedding_model = %s
                 ORDER BY ch.embedding <=> %s::vector
                 LIMIT %s
                 """,
-                [note_vec, cv_id, note_vec, top_k],
+                [note_vec, cv_id, get_model_id(), note_vec, top_k],
             )
             chunk_rows = cur.fetchall()
 
@@ -348,11 +670,11 @@ class LiveSuggestView(GenericAPIView):
                 SELECT q.id, q.question_text,
                        (q.embedding <=> %s::vector) AS distance
                 FROM "INTERVIEW_QUESTIONS" q
-                WHERE q.job_description_id = %s
+                WHERE q.job_description_id = %s AND q.embedding_model = %s
                 ORDER BY q.embedding <=> %s::vector
                 LIMIT %s
                 """,
-                [note_vec, jd_id, note_vec, top_k],
+                [note_vec, jd_id, get_model_id(), note_vec, top_k],
             )
             question_rows = cur.fetchall()
 
@@ -438,23 +760,31 @@ class AddNoteView(GenericAPIView):
         note_text = serializer.validated_data["note_text"]
         author = serializer.validated_data.get("author", "")
 
-        model = get_embedding_model()
-        note_vec = model.encode(note_text, normalize_embeddings=True).tolist()
-
-        connection.ensure_connection()
-        register_vector(connection.connection)
+        note_vec = encode_text(note_text, persist=False)
 
-        # Recupera JD collegata alla sessione
+        # JD della sessione + rischio nota ↔ JD in un solo round trip
         with connection.cursor() as cur:
             cur.execute(
                 """
-                SELECT job_description_id
-                FROM "INTERVIEW_SESSIONS"
-                WHERE id = %s
+                SELECT jd.description_text, (jd.embedding <=> %s::vector), jd.embedding_model
+                FROM "INTERVIEW_SESSIONS" s
+                JOIN "JOB_DESCRIPTIONS" jd ON jd.id = s.job_description_id
+                WHERE s.id = %s
                 """,
-                [session_id],
+                [note_vec, str(session_id)],
             )
-            jd_id = cur.fetchone()[0]
+            jd_row = cur.fetchone()
+        if not jd_row:
+            return Response({"error": "Session not found"}, status=404)
+        jd_text = jd_row[0]
+
+        # controlli prima dell'INSERT: una risposta 4xx non deve lasciare la nota salvata
+        if jd_row[1] is None:
+            return Response({"error": "Job Description missing embedding"}, status=400)
+        conflict = _embedding_model_conflict(jd_row[2])
+        if conflict:
+            return conflict
+        distance = float(jd_row[1])
 
         note_id = str(uuid.uuid4())
 
@@ -463,32 +793,12 @@ class AddNoteView(GenericAPIView):
             cur.execute(
                 """
                 INSERT INTO "INTERVIEW_NOTES"
-                (id, session_id, author, note_text, embedding)
-                VALUES (%s, %s, %s, %s, %s)
+                (id, session_id, author, note_text, embedding, embedding_model)
+                VALUES (%s, %s, %s, %s, %s, %s)
                 """,
-                [note_id, session_id, author, note_text, note_vec],
+                [note_id, str(session_id), author, note_text, note_vec, get_model_id()],
             )
 
-        # Recupera testo JD
-        with connection.cursor() as cur:
-            cur.execute(
-                'SELECT description_text FROM "JOB_DESCRIPTIONS" WHERE id = %s',
-                [jd_id]
-            )
-            jd_text = cur.fetchone()[0]
-
-        # Calcolo rischio
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT (embedding <=> %s::vector)
-                FROM "JOB_DESCRIPTIONS"
-                WHERE id = %s
-                """,
-                [note_vec, jd_id],
-            )
-            distance = float(cur.fetchone()[0])
-
         similarity = max(0.0, 1.0 - distance)
 
         risk_flag = "LOW"
@@ -497,47 +807,123 @@ class AddNoteView(GenericAPIView):
         if similarity < 0.3:
             risk_flag = "HIGH"
 
-        # Recupera chunk CV più vicini alla nota (contesto per LLM)
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT ch.content
-                FROM "CV_CHUNKS" ch
-                JOIN "CVS" cv ON cv.id = ch.cv_id
-                JOIN "INTERVIEW_SESSIONS" s ON s.candidate_id = cv.candidate_id
-                WHERE s.id = %s AND cv.is_active = true
-                ORDER BY ch.embedding <=> %s::vector
-                LIMIT 3
-                """,
-                [session_id, note_vec],
-            )
-            cv_chunks = [r[0] for r in cur.fetchall()]
-
-        generated_question = generate_followup_question(
-            jd_text=jd_text,
-            note_text=note_text,
-            risk_level=risk_flag,
-            cv_chunks=cv_chunks,
-        )
+        # chunk CV + domanda LLM in background: il client fa polling su followup_url
+        submit_followup(session_id, note_id, note_text, note_vec, jd_text, risk_flag)
 
         return Response({
             "note_id": note_id,
             "jd_similarity": round(similarity, 4),
             "risk_level": risk_flag,
-            "generated_followup_question": generated_question
+            "followup_url": request.build_absolute_uri(
+                reverse("session-followup", kwargs={"session_id": session_id, "note_id": note_id})
+            ),
         })
 
-def _avg_vectors(vectors):
-    # vectors: list of list[float]
-    if not vectors:
-        return None
-    dim = len(vectors[0])
-    acc = [0.0] * dim
-    for v in vectors:
-        for i in range(dim):
-            acc[i] += float(v[i])
-    n = float(len(vectors))
-    return [x / n for x in acc]
+
+class NoteFollowupView(APIView):
+    """
+    GET /api/sessions/<id>/followups/<note_id>/
+    Stato della domanda di follow-up della nota: running (question contiene il testo parziale),
+    completed oppure failed (con error). Il client ripete la GET finché lo stato non è finale.
+    """
+    def get(self, request, session_id, note_id):
+        followup = NoteFollowup.objects.filter(session_id=session_id, note_id=note_id).first()
+        if followup is None:
+            return Response({"error": "Follow-up not found"}, status=404)
+        return Response({
+            "note_id": str(followup.note_id),
+            "status": followup.status,
+            "risk_level": followup.risk_level,
+            "question": followup.question,
+            "error": followup.error,
+            "updated_at": followup.updated_at,
+        })
+
+
+# Tutto il retrieval di NextBestQuestionView in un solo statement (un round trip):
+# sessione, CV attivo, JD, ultime note, contesto (media note del modello corrente, altrimenti
+# JD), distanza contesto<->JD, domande (sessione, poi fallback JD) ed evidence chunks.
+# Il contesto è un sottoquery scalare: ORDER BY embedding <=> (SELECT ...) usa l'indice HNSW.
+# Righe: kind = session | note | question | chunk, colonne comuni.
+_NEXT_QUESTION_SQL = """
+    WITH s AS (
+        SELECT id, candidate_id, job_description_id
+        FROM "INTERVIEW_SESSIONS"
+        WHERE id = %s
+    ),
+    cv AS (
+        SELECT id
+        FROM "CVS"
+        WHERE candidate_id = (SELECT candidate_id FROM s) AND is_active = true
+        ORDER BY created_at DESC NULLS LAST
+        LIMIT 1
+    ),
+    jd AS (
+        SELECT id, description_text, embedding, embedding_model
+        FROM "JOB_DESCRIPTIONS"
+        WHERE id = (SELECT job_description_id FROM s)
+    ),
+    recent AS (
+        SELECT note_text, embedding, embedding_model, created_at
+        FROM "INTERVIEW_NOTES"
+        WHERE session_id = %s
+        ORDER BY created_at DESC NULLS LAST
+        LIMIT %s
+    ),
+    ctx AS (
+        SELECT COALESCE(
+            %s::vector,
+            (SELECT AVG(embedding) FROM recent WHERE embedding IS NOT NULL AND embedding_model = %s),
+            (SELECT embedding FROM jd)
+        ) AS embedding
+    ),
+    session_q AS (
+        SELECT id, question_text, embedding <=> (SELECT embedding FROM ctx) AS distance
+        FROM "INTERVIEW_QUESTIONS"
+        WHERE session_id = %s AND asked_at IS NULL AND embedding_model = %s
+        ORDER BY embedding <=> (SELECT embedding FROM ctx)
+        LIMIT %s
+    ),
+    jd_q AS (
+        SELECT id, question_text, embedding <=> (SELECT embedding FROM ctx) AS distance
+        FROM "INTERVIEW_QUESTIONS"
+        WHERE job_description_id = (SELECT job_description_id FROM s)
+          AND asked_at IS NULL AND embedding_model = %s
+          AND NOT EXISTS (SELECT 1 FROM session_q)
+        ORDER BY embedding <=> (SELECT embedding FROM ctx)
+        LIMIT %s
+    ),
+    chunks AS (
+        SELECT id, content, page_number, chunk_index, embedding <=> (SELECT embedding FROM ctx) AS distance
+        FROM "CV_CHUNKS"
+        WHERE cv_id = (SELECT id FROM cv) AND embedding_model = %s
+        ORDER BY embedding <=> (SELECT embedding FROM ctx)
+        LIMIT %s
+    )
+    SELECT 'session' AS kind, cv.id AS item_id, jd.description_text AS body,
+           NULL AS page_number, NULL AS chunk_index,
+           jd.embedding <=> (SELECT embedding FROM ctx) AS distance, NULL AS created_at,
+           s.candidate_id, s.job_description_id,
+           CASE WHEN jd.embedding IS NOT NULL THEN jd.embedding_model END AS embedding_model
+    FROM s
+    LEFT JOIN jd ON true
+    LEFT JOIN cv ON true
+    UNION ALL
+    SELECT 'note', NULL, note_text, NULL, NULL, NULL, created_at, NULL, NULL,
+           CASE WHEN embedding IS NOT NULL THEN embedding_model END
+    FROM recent
+    UNION ALL
+    SELECT 'question', id, question_text, NULL, NULL, distance, NULL, NULL, NULL, NULL FROM session_q
+    UNION ALL
+    SELECT 'question', id, question_text, NULL, NULL, distance, NULL, NULL, NULL, NULL FROM jd_q
+    UNION ALL
+    SELECT 'chunk', id, content, page_number, chunk_index, distance, NULL, NULL, NULL, NULL FROM chunks
+"""
+
+
+def _by_distance(row):
+    # come ORDER BY ... <=> in Postgres: distanze NULL in fondo
+    return (row[5] is None, row[5] or 0.0)
 
 
 class NextBestQuestionView(GenericAPIView):
@@ -550,95 +936,56 @@ class NextBestQuestionView(GenericAPIView):
         notes_window = int(serializer.validated_data["notes_window"])
         top_k_questions = int(serializer.validated_data["top_k_questions"])
         top_k_chunks = int(serializer.validated_data["top_k_chunks"])
+        ef_search = serializer.validated_data.get("ef_search")
 
-        connection.ensure_connection()
-        register_vector(connection.connection)
+        model_id = get_model_id()
 
-        model = get_embedding_model()
-
-        # 1) Recupera session: candidate_id + job_description_id
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT candidate_id, job_description_id
-                FROM "INTERVIEW_SESSIONS"
-                WHERE id = %s
-                """,
-                [str(session_id)],
-            )
-            sess = cur.fetchone()
-            if not sess:
-                return Response({"error": "Session not found"}, status=404)
-            candidate_id, jd_id = sess[0], sess[1]
-
-        # 2) Recupera CV attivo del candidato
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT id
-                FROM "CVS"
-                WHERE candidate_id = %s AND is_active = true
-                ORDER BY created_at DESC NULLS LAST
-                LIMIT 1
-                """,
-                [str(candidate_id)],
-            )
-            row = cur.fetchone()
-            if not row:
-                return Response({"error": "Active CV not found for candidate"}, status=404)
-            cv_id = row[0]
-
-        # 3) Recupera ultime note + embeddings
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT note_text, embedding
-                FROM "INTERVIEW_NOTES"
-                WHERE session_id = %s
-                ORDER BY created_at DESC NULLS LAST
-                LIMIT %s
-                """,
-                [str(session_id), notes_window],
-            )
-            note_rows = cur.fetchall()
+        def retrieve(context_vec=None):
+            with ann_cursor(ef_search) as cur:
+                cur.execute(
+                    _NEXT_QUESTION_SQL,
+                    [
+                        str(session_id),
+                        str(session_id), notes_window,
+                        context_vec, model_id,
+                        str(session_id), model_id, top_k_questions,
+                        model_id, top_k_questions,
+                        model_id, top_k_chunks,
+                    ],
+                )
+                rows = cur.fetchall()
+            grouped = {"session": [], "note": [], "question": [], "chunk": []}
+            for r in rows:
+                grouped[r[0]].append(r)
+            return grouped
+
+        # 1-7) Sessione, CV attivo, JD, note, rischio, domande e chunk in un solo round trip
+        grouped = retrieve()
+        if not grouped["session"]:
+            return Response({"error": "Session not found"}, status=404)
+        header = grouped["session"][0]
+        cv_id, jd_text, candidate_id, jd_id, jd_model = header[1], header[2], header[7], header[8], header[9]
+        if cv_id is None:
+            return Response({"error": "Active CV not found for candidate"}, status=404)
+        if jd_text is None:
+            return Response({"error": "Job Description not found"}, status=404)
+
+        if jd_model is not None:
+            conflict = _embedding_model_conflict(jd_model)
+            if conflict:
+                return conflict
 
         # note_texts in ordine cronologico (dal più vecchio al più nuovo)
-        note_texts = [r[0] for r in reversed(note_rows)]
-        note_vecs = [r[1] for r in note_rows if r[1] is not None]
+        note_rows = sorted(grouped["note"], key=lambda r: (r[6] is not None, r[6] or ""))
+        note_texts = [r[2] for r in note_rows]
 
-        context_vec = _avg_vectors(note_vecs)
-
-        # 4) Se non ci sono note, usa JD come contesto
-        with connection.cursor() as cur:
-            cur.execute(
-                'SELECT description_text, embedding FROM "JOB_DESCRIPTIONS" WHERE id = %s',
-                [str(jd_id)],
-            )
-            jd_row = cur.fetchone()
-            if not jd_row:
-                return Response({"error": "Job Description not found"}, status=404)
-            jd_text, jd_vec = jd_row[0], jd_row[1]
-
-        if context_vec is None:
-            # fallback: embedding dal testo JD (se embedding null, lo calcoliamo al volo)
-            if jd_vec is not None:
-                context_vec = jd_vec
-            else:
-                context_vec = model.encode(jd_text, normalize_embeddings=True).tolist()
-
-        # 5) Similarità contesto ↔ JD (rischio)
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT (embedding <=> %s::vector)
-                FROM "JOB_DESCRIPTIONS"
-                WHERE id = %s
-                """,
-                [context_vec, str(jd_id)],
-            )
-            dist = cur.fetchone()[0]
-            jd_distance = float(dist) if dist is not None else 1.0
+        # né note del modello corrente né embedding JD: contesto dal testo JD, calcolato al volo
+        if jd_model is None and not any(r[9] == model_id for r in note_rows):
+            grouped = retrieve(encode_text(jd_text))
+            header = grouped["session"][0]
 
+        # Similarità contesto ↔ JD (rischio)
+        jd_distance = float(header[5]) if header[5] is not None else 1.0
         jd_similarity = max(0.0, 1.0 - jd_distance)
         risk_flag = "LOW"
         if jd_similarity < 0.5:
@@ -646,69 +993,21 @@ class NextBestQuestionView(GenericAPIView):
         if jd_similarity < 0.3:
             risk_flag = "HIGH"
 
-        # 6) Best preloaded questions (prima session_id se esiste, poi fallback JD)
-        with connection.cursor() as cur:
-            # prova prima domande legate alla sessione (se colonna esiste e hai popolato)
-            try:
-                cur.execute(
-                    """
-                    SELECT id, question_text, (embedding <=> %s::vector) AS distance
-                    FROM "INTERVIEW_QUESTIONS"
-                    WHERE session_id = %s
-                      AND asked_at IS NULL
-                    ORDER BY embedding <=> %s::vector
-                    LIMIT %s
-                    """,
-                    [context_vec, str(session_id), context_vec, top_k_questions],
-                )
-                q_rows = cur.fetchall()
-            except Exception:
-                q_rows = []
-
-            if not q_rows:
-                cur.execute(
-                    """
-                    SELECT id, question_text, (embedding <=> %s::vector) AS distance
-                    FROM "INTERVIEW_QUESTIONS"
-                    WHERE job_description_id = %s
-                      AND asked_at IS NULL
-                    ORDER BY embedding <=> %s::vector
-                    LIMIT %s
-                    """,
-                    [context_vec, str(jd_id), context_vec, top_k_questions],
-                )
-                q_rows = cur.fetchall()
-
         suggested_questions = [
-            {"question_id": r[0], "question_text": r[1], "distance": float(r[2])}
-            for r in q_rows
+            {"question_id": r[1], "question_text": r[2], "distance": float(r[5])}
+            for r in sorted(grouped["question"], key=_by_distance)
         ]
         best_preloaded = suggested_questions[0] if suggested_questions else None
 
-        # 7) Evidence chunks dal CV (contestualizzati alle note)
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT id, content, page_number, chunk_index,
-                       (embedding <=> %s::vector) AS distance
-                FROM "CV_CHUNKS"
-                WHERE cv_id = %s
-                ORDER BY embedding <=> %s::vector
-                LIMIT %s
-                """,
-                [context_vec, str(cv_id), context_vec, top_k_chunks],
-            )
-            ch_rows = cur.fetchall()
-
         evidence_chunks = [
             {
-                "chunk_id": r[0],
-                "content": r[1],
-                "page_number": r[2],
-                "chunk_index": r[3],
-                "distance": float(r[4]),
+                "chunk_id": r[1],
+                "content": r[2],
+                "page_number": r[3],
+                "chunk_index": r[4],
+                "distance": float(r[5]),
             }
-            for r in ch_rows
+            for r in sorted(grouped["chunk"], key=_by_distance)
         ]
         CHUNK_MAX_DISTANCE = 0.58
         QUESTION_MAX_DISTANCE = 0.60
@@ -768,9 +1067,6 @@ class SessionQuestionsView(GenericAPIView):
     serializer_class = SessionQuestionCreateSerializer
 
     def get(self, request, session_id):
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
         recruiter_id = request.query_params.get("recruiter_id", None)
 
         with connection.cursor() as cur:
@@ -819,9 +1115,6 @@ class SessionQuestionsView(GenericAPIView):
         author = serializer.validated_data.get("author", "")
         recruiter_id = request.data.get("recruiter_id", "")
 
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
         # Ricava job_description_id dalla sessione
         with connection.cursor() as cur:
             cur.execute(
@@ -837,8 +1130,7 @@ class SessionQuestionsView(GenericAPIView):
                 return Response({"error": "Session not found"}, status=404)
             jd_id = row[0]
 
-        model = get_embedding_model()
-        vec = model.encode(question_text, normalize_embeddings=True).tolist()
+        vec = encode_text(question_text)
 
         q_id = str(uuid.uuid4())
 
@@ -846,10 +1138,10 @@ class SessionQuestionsView(GenericAPIView):
             cur.execute(
                 """
                 INSERT INTO "INTERVIEW_QUESTIONS"
-                (id, session_id, job_description_id, question_text, embedding, created_at, recruiter_id)
-                VALUES (%s, %s, %s, %s, %s, now(), %s)
+                (id, session_id, job_description_id, question_text, embedding, embedding_model, created_at, recruiter_id)
+                VALUES (%s, %s, %s, %s, %s, %s, now(), %s)
                 """,
-                [q_id, str(session_id), str(jd_id), question_text, vec, recruiter_id],
+                [q_id, str(session_id), str(jd_id), question_text, vec, get_model_id(), recruiter_id],
             )
 
         return Response({
@@ -917,6 +1209,9 @@ class EndSessionView(GenericAPIView):
         if not row:
             return Response({"error": "Session not found"}, status=404)
 
+        # sessione chiusa: il recap (completion OpenAI) si prepara in background
+        submit_recap(session_id)
+
         return Response({
             "session_id": row[0],
             "status": row[1],
@@ -925,236 +1220,24 @@ class EndSessionView(GenericAPIView):
         })
 
 class SessionRecapView(GenericAPIView):
+    """
+    GET /api/sessions/<id>/recap/
+    Recap salvato in SESSION_RECAPS (generato in background a fine sessione); viene rigenerato
+    solo se note, domande o stato della sessione sono cambiati dall'ultima generazione.
+    """
     def get(self, request, session_id):
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
-        # 1) session info
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT candidate_id, job_description_id, status, started_at, ended_at
-                FROM "INTERVIEW_SESSIONS"
-                WHERE id = %s
-                """,
-                [str(session_id)],
-            )
-            sess = cur.fetchone()
-            if not sess:
-                return Response({"error": "Session not found"}, status=404)
-
-        candidate_id, jd_id, status, started_at, ended_at = sess
-        with connection.cursor() as cur:
-            cur.execute(
-                'SELECT full_name FROM "CANDIDATI" WHERE id = %s',
-                [str(candidate_id)],
-            )
-            candidate_row = cur.fetchone()
-            candidate_name = candidate_row[0] if candidate_row else "Sconosciuto"
-        # 2) CV attivo
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT id
-                FROM "CVS"
-                WHERE candidate_id = %s AND is_active = true
-                ORDER BY created_at DESC NULLS LAST
-                LIMIT 1
-                """,
-                [str(candidate_id)],
-            )
-            row = cur.fetchone()
-            if not row:
-                return Response({"error": "Active CV not found"}, status=404)
-            cv_id = row[0]
-
-        # 3) JD text + embedding
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT title, description_text
-                FROM "JOB_DESCRIPTIONS"
-                WHERE id = %s
-                """,
-                [str(jd_id)],
-            )
-            jd_row = cur.fetchone()
-            if not jd_row:
-                return Response({"error": "Job Description not found"}, status=404)
-            jd_title, jd_text = jd_row
-
-
-        # 4) Coverage (macro)
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT (c.embedding <=> jd.embedding) AS distance
-                FROM "CVS" c
-                JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
-                WHERE c.id = %s
-                """,
-                [str(jd_id), str(cv_id)],
-            )
-            row = cur.fetchone()
-            if not row or row[0] is None:
-                return Response({"error": "Missing embeddings for coverage"}, status=400)
-
-        distance = float(row[0])
-        similarity = max(0.0, 1.0 - distance)
-        coverage_score = round(similarity * 100, 2)
-
-        # 5) Coverage explain: top chunks CV vs JD
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT ch.id, ch.content, ch.page_number, ch.chunk_index,
-                       (ch.embedding <=> jd.embedding) AS distance
-                FROM "CV_CHUNKS" ch
-                JOIN "JOB_DESCRIPTIONS" jd ON jd.id = %s
-                WHERE ch.cv_id = %s
-                ORDER BY ch.embedding <=> jd.embedding
-                LIMIT 5
-                """,
-                [str(jd_id), str(cv_id)],
-            )
-            chunk_rows = cur.fetchall()
-
-
-        top_chunks = [
-            {
-                "chunk_id": r[0],
-                "content": r[1],
-                "page_number": r[2],
-                "chunk_index": r[3],
-                "distance": float(r[4]),
-            }
-            for r in chunk_rows
-        ]
-
-        # 6) Notes timeline
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT author, note_text, created_at
-                FROM "INTERVIEW_NOTES"
-                WHERE session_id = %s
-                ORDER BY created_at ASC NULLS LAST
-                """,
-                [str(session_id)],
-            )
-            note_rows = cur.fetchall()
-
-        notes = [
-            {"author": r[0], "note_text": r[1], "created_at": r[2]}
-            for r in note_rows
-        ]
-
-
-        # 7) Questions asked / unasked (session-scoped)
-        with connection.cursor() as cur:
-            cur.execute(
-                """
-                SELECT id, question_text, asked_at, asked_by, created_at
-                FROM "INTERVIEW_QUESTIONS"
-                WHERE session_id = %s
-                ORDER BY created_at ASC NULLS LAST
-                """,
-                [str(session_id)],
-            )
-            q_rows = cur.fetchall()
-
-        asked = []
-        unasked = []
-        for r in q_rows:
-            item = {
-                "question_id": r[0],
-                "question_text": r[1],
-                "asked_at": r[2],
-                "asked_by": r[3],
-                "created_at": r[4],
-            }
-            (asked if r[2] is not None else unasked).append(item)
-
-        # 8) LLM recap (strengths/gaps/summary)
-        # Costruiamo un contesto compatto
-        notes_text = "\n".join([f"- {n['note_text']}" for n in notes]) or "- (nessuna nota)"
-        asked_text = "\n".join([f"- {q['question_text']}" for q in asked]) or "- (nessuna)"
-        unasked_text = "\n".join([f"- {q['question_text']}" for q in unasked]) or "- (nessuna)"
-
-        recap_prompt = f"""
-SESSION RECAP REQUEST
-
-Job title: {jd_title}
-
-Coverage score: {coverage_score}%
-
-NOTES (timeline):
-{notes_text}
-
-QUESTIONS ASKED:
-{asked_text}
-
-QUESTIONS NOT ASKED:
-{unasked_text}
-
-Produce un recap in ITALIANO con questo formato JSON (solo JSON, niente testo extra):
-{{
-  "summary": "...",
-  "strengths": ["...", "...", "..."],
-  "gaps_or_risks": ["...", "...", "..."],
-  "recommended_next_steps": ["...", "..."]
-}}
-"""
-        # Usiamo lo stesso helper che già hai, ma qui vogliamo JSON: facciamo una funzione rapida inline
-        from openai import OpenAI
-        import os
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        model = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
-
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "Sei un recruiter tecnico senior. Rispondi sempre e solo in italiano. Output solo JSON valido."},
-                {"role": "user", "content": recap_prompt},
-            ],
-            temperature=0.3,
-        )
-        llm_json = resp.choices[0].message.content.strip()
-        import json
-
         try:
-            llm_recap = json.loads(llm_json)
-        except Exception:
-            llm_recap = {
-                "summary": llm_json,
-                "strengths": [],
-                "gaps_or_risks": [],
-                "recommended_next_steps": []
-            }
+            recap, cached = get_or_build_recap(session_id)
+        except RecapUnavailable as exc:
+            return Response(exc.body, status=exc.status)
+
         return Response({
-            "session": {
-                "session_id": str(session_id),
-                "status": status,
-                "started_at": started_at,
-                "ended_at": ended_at,
-                "candidate_id": str(candidate_id),
-                "cv_id": str(cv_id),
-                "job_description_id": str(jd_id),
-                "jd_title": jd_title,
-                "candidate_name": candidate_name,
-            },
-            "coverage": {
-                "distance": round(distance, 6),
-                "similarity": round(similarity, 6),
-                "coverage_score": coverage_score,
-                "top_chunks": top_chunks,
+            **recap.payload,
+            "recap_meta": {
+                "cached": cached,
+                "fingerprint": recap.fingerprint,
+                "generated_at": recap.updated_at,
             },
-            "notes": notes,
-            "questions": {
-                "asked": asked,
-                "unasked": unasked,
-            },
-            "llm_recap": llm_recap
         })
 
 class SessionListView(APIView):
@@ -1162,13 +1245,10 @@ class SessionListView(APIView):
     GET /api/sessions/
     Ritorna la lista di tutte le sessioni con:
     - info candidato e JD
-    - coverage score calcolato al volo (distanza coseno CV ↔ JD)
+    - coverage score precalcolato (CV_JD_COVERAGE, distanza coseno CV ↔ JD)
     - conteggio note e domande fatte
     """
     def get(self, request):
-        connection.ensure_connection()
-        register_vector(connection.connection)
-
         with connection.cursor() as cur:
             cur.execute(
                 """
@@ -1181,12 +1261,9 @@ class SessionListView(APIView):
                     c.full_name                   AS candidate_name,
                     jd.id                         AS jd_id,
                     jd.title                      AS jd_title,
-                    -- Coverage score: calcolato direttamente in SQL
-                    -- Prende il CV attivo del candidato e calcola distanza con la JD
-                    ROUND(
-                    (GREATEST(0.0, 1.0 - (cv.embedding <=> jd.embedding)) * 100)::numeric,
-                        2
-                    )                             AS coverage_score,
+                    -- Coverage score precalcolato (CV_JD_COVERAGE) per il CV attivo del candidato
+                    -- (NULL se manca o è stato calcolato con un altro modello)
+                    ROUND(cov.score::numeric, 2)  AS coverage_score,
                     -- Quante note sono state aggiunte in questa sessione
                     (
                         SELECT COUNT(*)
@@ -1207,8 +1284,13 @@ class SessionListView(APIView):
                 LEFT JOIN "CVS" cv
                     ON cv.candidate_id = s.candidate_id
                     AND cv.is_active = true
+                LEFT JOIN "CV_JD_COVERAGE" cov
+                    ON cov.cv_id = cv.id
+                    AND cov.jd_id = jd.id
+                    AND cov.model_version = %s
                 ORDER BY s.started_at DESC NULLS LAST
-                """
+                """,
+                [get_cv_model_id()],
             )
             rows = cur.fetchall()
             columns = [col[0] for col in cur.description]
@@ -1305,6 +1387,32 @@ class SessionCVView(APIView):
 
         return Response({"raw_text": row[0], "file_url": row[1]})
 
+class EmbeddingCacheStatsView(APIView):
+    """
+    GET /api/embeddings/cache/
+    Contatori hit/miss della cache embedding e del micro-batching di questo processo.
+    """
+    def get(self, request):
+        return Response({
+            "model": get_model_id(),
+            **get_embedding_cache().stats(),
+            "micro_batching": micro_batch_stats(),
+        })
+
+
+class ReadinessView(APIView):
+    """
+    GET /healthz/ready
+    200 quando il warm-up di boot (APP_PRELOAD) è concluso, 503 finché è in corso o se è fallito.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request):
+        state = readiness()
+        return Response(state, status=200 if state["ready"] else 503)
+
+
 class ParseQuestionsFromFileView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
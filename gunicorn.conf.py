@@ -0,0 +1,14 @@
+import os
+
+# Con --preload l'app Django viene importata nel master: i thread avviati in AppConfig.ready()
+# (warm-up, ripresa dei job di ingestione) non sopravvivono al fork dei worker.
+# Il master non li avvia; ogni worker li avvia dopo aver caricato l'app.
+os.environ.setdefault("APP_DEFER_STARTUP", "True")
+
+wsgi_app = "RecruitingProject.wsgi:application"
+
+
+def post_worker_init(worker):
+    from candidates.services.warmup import start_background_services
+
+    start_background_services()
@@ -5,6 +5,7 @@ import { useParams, useRouter } from "next/navigation";
 import {
   getTimeline,
   addNote,
+  watchFollowup,
   getNextQuestion,
   endSession,
   getSessionDetail,
@@ -48,6 +49,7 @@ export default function SessionPage() {
   const [error, setError] = useState<string | null>(null);
   const [leftTab, setLeftTab] = useState<"cv" | "notes">("cv");
   const bottomRef = useRef<HTMLDivElement>(null);
+  const stopFollowupRef = useRef<(() => void) | null>(null);
   const [rightTab, setRightTab] = useState<"questions" | "add">("questions");
   const [newQuestion, setNewQuestion] = useState("");
   const [addingQuestion, setAddingQuestion] = useState(false);
@@ -79,6 +81,9 @@ export default function SessionPage() {
   return () => clearInterval(interval);
 }, [id, sessionEnded]);
 
+  // Smette di seguire il follow-up quando si lascia la pagina
+  useEffect(() => () => stopFollowupRef.current?.(), []);
+
   const handleAddNote = async () => {
     if (!noteText.trim()) return;
 
@@ -109,9 +114,20 @@ export default function SessionPage() {
         )
       );
 
-      setLastSuggestion(res.generated_followup_question);
       setLastRisk(res.risk_level as "LOW" | "MEDIUM" | "HIGH");
 
+      // Follow-up della nota più recente, mostrato mentre viene generato
+      stopFollowupRef.current?.();
+      setLastSuggestion("");
+      stopFollowupRef.current = watchFollowup(id, res.note_id, {
+        onText: (text) => setLastSuggestion(text),
+        onDone: (question) => setLastSuggestion(question),
+        onError: (message) => {
+          setLastSuggestion(null);
+          setError(message);
+        },
+      });
+
       const riskValue = res.risk_level === "HIGH" ? 80 : res.risk_level === "MEDIUM" ? 50 : 20;
       setRiskPoints((prev) => [...prev, {
         time: new Date().toLocaleTimeString("it-IT", { hour: "2-digit", minute: "2-digit" }),
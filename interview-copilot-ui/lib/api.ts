@@ -132,13 +132,70 @@ export async function addNote(
   session_id: string,
   note_text: string,
   author?: string
-): Promise<{ note_id: string; risk_level: string; generated_followup_question: string }> {
+): Promise<{ note_id: string; risk_level: string; jd_similarity: number; followup_url: string }> {
   return apiFetch(`/sessions/${session_id}/notes/`, {
     method: "POST",
     body: JSON.stringify({ note_text, author: author || "" }),
   });
 }
 
+export interface NoteFollowup {
+  note_id: string;
+  status: "running" | "completed" | "failed";
+  risk_level: string;
+  question: string;
+  error: string | null;
+  updated_at: string;
+}
+
+export interface FollowupHandlers {
+  onText: (text: string) => void;
+  onDone: (question: string) => void;
+  onError: (error: string) => void;
+}
+
+const FOLLOWUP_POLL_INTERVAL_MS = 700;
+const FOLLOWUP_POLL_TIMEOUT_MS = 2 * 60 * 1000;
+
+// Domanda di follow-up della nota, generata in background e salvata man mano sul server:
+// polling finché lo stato non è completed / failed. Ritorna la funzione per interrompere.
+export function watchFollowup(session_id: string, note_id: string, handlers: FollowupHandlers): () => void {
+  let stopped = false;
+  const deadline = Date.now() + FOLLOWUP_POLL_TIMEOUT_MS;
+
+  const poll = async () => {
+    while (!stopped) {
+      let followup: NoteFollowup;
+      try {
+        followup = await apiFetch<NoteFollowup>(`/sessions/${session_id}/followups/${note_id}/`);
+      } catch (e: any) {
+        if (!stopped) handlers.onError(e.message);
+        return;
+      }
+      if (stopped) return;
+      if (followup.status === "completed") {
+        handlers.onDone(followup.question);
+        return;
+      }
+      if (followup.status === "failed") {
+        handlers.onError(followup.error || "Follow-up generation failed");
+        return;
+      }
+      handlers.onText(followup.question);
+      if (Date.now() > deadline) {
+        handlers.onError("Follow-up timed out");
+        return;
+      }
+      await new Promise((resolve) => setTimeout(resolve, FOLLOWUP_POLL_INTERVAL_MS));
+    }
+  };
+  poll();
+
+  return () => {
+    stopped = true;
+  };
+}
+
 // ─── DOMANDE ─────────────────────────────────────────────────────────────────
 
 export async function getNextQuestion(
@@ -177,6 +234,8 @@ export async function createCandidate(
   });
 }
 
+const UPLOAD_POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
 export async function uploadCV(
   candidate_id: string,
   file: File
@@ -192,7 +251,36 @@ export async function uploadCV(
   } as RequestInit);
 
   if (!res.ok) throw new Error(`Upload failed: ${res.status}`);
-  return res.json();
+  const { job_id, status, result } = await res.json();
+
+  // PDF già caricato (deduplicato): il job è già completato
+  if (status === "completed" && result) return result;
+
+  // L'ingestione gira in background: attendiamo la fine del job, al massimo UPLOAD_POLL_TIMEOUT_MS
+  const deadline = Date.now() + UPLOAD_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const job = await getCVIngestionJob(job_id);
+    if (job.status === "completed" && job.result) return job.result;
+    if (job.status === "failed") throw new Error(`Upload failed: ${job.error}`);
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+  throw new Error("Upload timed out: il CV è ancora in elaborazione, riprova più tardi");
+}
+
+export interface CVIngestionJob {
+  id: string;
+  status: "queued" | "running" | "completed" | "failed";
+  stage: string;
+  pages_total: number;
+  pages_done: number;
+  chunks_total: number;
+  chunks_done: number;
+  result: { cv_id: string; chunks: number } | null;
+  error: string | null;
+}
+
+export async function getCVIngestionJob(job_id: string): Promise<CVIngestionJob> {
+  return apiFetch(`/cvs/jobs/${job_id}/`);
 }
 
 